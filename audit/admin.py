@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import AuditEntry
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'actor_username', 'action', 'object_type', 'object_id', 'object_repr']
+    list_filter = ['action', 'object_type']
+    search_fields = ['object_id', 'actor_username', 'request_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,151 @@
+"""
+Recording audit entries.
+
+Views call ``record`` after saving a change, with a diff built from two
+``snapshot`` calls::
+
+    before = snapshot(user, USER_FIELDS)
+    ...
+    user.save()
+    record(AuditEntry.UPDATE, user, diff(before, snapshot(user, USER_FIELDS)))
+
+Inside a request (AuditMiddleware) or an ``audit_scope`` block, entries are
+buffered and written with one ``bulk_create`` when the scope ends, tagged
+with the scope's actor and request id. Outside any scope they are written
+at once. Each entry holds its whole diff, so the number of changed fields
+never adds queries.
+
+Buffering follows the transactions: an entry recorded inside an atomic
+block joins the buffer only once that block commits, so changes that were
+rolled back are never logged, and a scope that ends inside an atomic block
+writes its buffer when that block commits. A scope left by an exception,
+or a request whose view raised, writes nothing.
+"""
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+
+from .models import AuditEntry
+
+# Fields whose values are never written to the log, only the fact they changed
+REDACTED_FIELDS = {'password'}
+REDACTED = '[redacted]'
+
+_scope = ContextVar('audit_scope', default=None)
+
+
+class AuditScope:
+    def __init__(self, request_id='', actor=None):
+        self.request_id = request_id
+        # A user, or a callable returning one (request.user is resolved lazily)
+        self.actor = actor
+        self.entries = []
+        self.discarded = False
+
+    def resolve_actor(self):
+        actor = self.actor() if callable(self.actor) else self.actor
+        return actor if actor is not None and actor.is_authenticated else None
+
+    def discard(self):
+        """Drop the buffer and anything recorded later."""
+        self.discarded = True
+        self.entries = []
+
+    def flush(self):
+        """Write the buffered entries with one INSERT."""
+        entries, self.entries = self.entries, []
+        if not entries or self.discarded:
+            return []
+        actor = self.resolve_actor()
+        for entry in entries:
+            if actor is not None and entry.actor_id is None:
+                entry.actor_id = actor.pk
+                entry.actor_username = actor.get_username()
+            entry.request_id = entry.request_id or self.request_id
+        return AuditEntry.objects.bulk_create(entries)
+
+
+@contextmanager
+def audit_scope(request_id=None, actor=None):
+    """Buffer the entries recorded inside the block and write them together once it has committed."""
+    scope = AuditScope(request_id or uuid.uuid4().hex, actor)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+    transaction.on_commit(scope.flush)
+
+
+def discard_entries():
+    """Drop the current scope's entries, e.g. because its request failed."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.discard()
+
+
+def current_request_id():
+    scope = _scope.get()
+    return scope.request_id if scope else ''
+
+
+def json_value(value):
+    if isinstance(value, FieldFile):
+        return value.name or None
+    return value
+
+
+def snapshot(instance, fields=None):
+    """``{field: value}`` for the named fields, or every editable concrete field."""
+    if fields is None:
+        fields = [
+            field.name for field in instance._meta.concrete_fields
+            if field.editable and not field.primary_key
+        ]
+    values = {}
+    for name in fields:
+        field = instance._meta.get_field(name)
+        values[name] = json_value(getattr(instance, field.attname))
+    return values
+
+
+def diff(before, after):
+    """``{field: [old, new]}`` for every field whose value differs; redacted fields show no values."""
+    changes = {}
+    for name in before.keys() | after.keys():
+        old, new = before.get(name), after.get(name)
+        if old != new:
+            changes[name] = [REDACTED, REDACTED] if name in REDACTED_FIELDS else [old, new]
+    return dict(sorted(changes.items()))
+
+
+def record(action, instance, changes=None, object_id=None, object_repr=None, actor=None):
+    """Log a change to ``instance``; updates with no changes are skipped.
+
+    Pass ``object_id`` when the instance has already been deleted, and
+    ``object_repr`` when ``str(instance)`` would need fields it has not loaded.
+    """
+    changes = changes or {}
+    if action == AuditEntry.UPDATE and not changes:
+        return None
+    entry = AuditEntry(
+        action=action,
+        object_type=instance._meta.label_lower,
+        object_id=str(object_id if object_id is not None else instance.pk),
+        object_repr=(str(instance) if object_repr is None else object_repr)[:200],
+        changes=changes,
+    )
+    if actor is not None:
+        entry.actor_id = actor.pk
+        entry.actor_username = actor.get_username()
+    scope = _scope.get()
+    if scope is None:
+        entry.save()
+    else:
+        # Runs at once outside an atomic block, and not at all if the block rolls back
+        transaction.on_commit(partial(scope.entries.append, entry))
+    return entry
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from audit.partitions import drop_partitions_before, ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the audit log's monthly partitions for this month and the next few, and optionally "
+        "drop whole months before a cutoff. Only does anything on PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=2,
+            help='Months after the current one to create partitions for (default: 2).',
+        )
+        parser.add_argument(
+            '--drop-before',
+            metavar='YYYY-MM',
+            help='Drop the partitions (and entries) of every month before this one.',
+        )
+
+    def handle(self, *args, months_ahead=2, drop_before=None, **options):
+        if months_ahead < 0:
+            raise CommandError('--months-ahead must not be negative.')
+        cutoff = None
+        if drop_before:
+            try:
+                cutoff = datetime.strptime(drop_before, '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--drop-before must look like 2024-01.') from None
+
+        if not is_partitioned():
+            self.stdout.write('The audit log is only partitioned on PostgreSQL; nothing to do.')
+            return
+
+        for name in ensure_partitions(months_ahead):
+            self.stdout.write(f'Partition {name} is in place.')
+        if cutoff:
+            for name in drop_partitions_before(cutoff):
+                self.stdout.write(self.style.WARNING(f'Dropped partition {name}.'))
+        self.stdout.write(self.style.SUCCESS('Audit log partitions are up to date.'))
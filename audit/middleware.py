@@ -0,0 +1,32 @@
+import re
+
+from .log import audit_scope, discard_entries
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Incoming ids are kept only if they look like one
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class AuditMiddleware:
+    """Buffers the request's audit entries and writes them once the response is ready.
+
+    Nothing is written when the view raises. The request id comes from an
+    incoming X-Request-ID header when valid and is echoed back on the response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        with audit_scope(request_id if REQUEST_ID_RE.match(request_id) else None,
+                         actor=lambda: getattr(request, 'user', None)) as scope:
+            request.request_id = scope.request_id
+            response = self.get_response(request)
+        response[REQUEST_ID_HEADER] = scope.request_id
+        return response
+
+    def process_exception(self, request, exception):
+        # The view's changes may be half done, so none of them are logged
+        discard_entries()
+        return None
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:49
+
+from datetime import date, datetime, timezone as dt_timezone
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def partition_by_month(apps, schema_editor):
+    """Recreate the (empty) table partitioned by month of created_at, on PostgreSQL.
+
+    The SQL is inlined so the migration never changes with audit.partitions.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in [
+        # The partition key must be part of the primary key, so the old one is not copied
+        'ALTER TABLE audit_auditentry DROP CONSTRAINT audit_auditentry_pkey',
+        'CREATE TABLE audit_auditentry_partitioned '
+        '(LIKE audit_auditentry INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING INDEXES) '
+        'PARTITION BY RANGE (created_at)',
+        'ALTER TABLE audit_auditentry_partitioned ADD PRIMARY KEY (id, created_at)',
+        'DROP TABLE audit_auditentry',
+        'ALTER TABLE audit_auditentry_partitioned RENAME TO audit_auditentry',
+        'CREATE TABLE audit_auditentry_default PARTITION OF audit_auditentry DEFAULT',
+    ]:
+        schema_editor.execute(statement)
+
+    # This month and the next two; "manage.py audit_partitions" adds later ones
+    today = datetime.now(dt_timezone.utc).date()
+    index = today.year * 12 + today.month - 1
+    months = [date((index + offset) // 12, (index + offset) % 12 + 1, 1) for offset in range(4)]
+    for month, next_month in zip(months, months[1:]):
+        schema_editor.execute(
+            f'CREATE TABLE audit_auditentry_y{month:%Y}m{month:%m} PARTITION OF audit_auditentry '
+            'FOR VALUES FROM (%s) TO (%s)',
+            [datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc),
+             datetime(next_month.year, next_month.month, 1, tzinfo=dt_timezone.utc)],
+        )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('request_id', models.CharField(blank=True, default='', max_length=64)),
+                ('actor_username', models.CharField(blank=True, default='', max_length=150)),
+                ('action', models.CharField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted')], max_length=10)),
+                ('object_type', models.CharField(max_length=100)),
+                ('object_id', models.CharField(max_length=64)),
+                ('object_repr', models.CharField(blank=True, default='', max_length=200)),
+                ('changes', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'audit entries',
+            },
+        ),
+        migrations.RunPython(partition_by_month, migrations.RunPython.noop),
+        # Created on the partitioned table, so every partition gets it
+        migrations.AddIndex(
+            model_name='auditentry',
+            index=models.Index(fields=['object_type', 'object_id', '-created_at'], name='audit_object_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class AuditEntryQuerySet(models.QuerySet):
+    def for_object(self, instance):
+        """Entries about one object, newest first (served by audit_object_idx)."""
+        return self.filter(
+            object_type=instance._meta.label_lower, object_id=str(instance.pk),
+        ).order_by('-created_at', '-id')
+
+
+class AuditEntry(models.Model):
+    """One change to a sensitive record, with its field-level diff (see audit.log).
+
+    Rows are only ever added. On PostgreSQL the table is partitioned by month
+    of ``created_at`` (see audit.partitions).
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (CREATE, 'Created'),
+        (UPDATE, 'Updated'),
+        (DELETE, 'Deleted'),
+    ]
+
+    created_at = models.DateTimeField(default=timezone.now)
+    request_id = models.CharField(max_length=64, blank=True, default='')
+    # No database constraint, so entries outlive the users they mention
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+        blank=True, null=True, related_name='+',
+    )
+    actor_username = models.CharField(max_length=150, blank=True, default='')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # "app_label.model" and primary key of the changed object
+    object_type = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+    object_repr = models.CharField(max_length=200, blank=True, default='')
+    # {field: [old, new]}
+    changes = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    objects = AuditEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'audit entries'
+        indexes = [
+            models.Index(fields=['object_type', 'object_id', '-created_at'], name='audit_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.object_type} #{self.object_id} by {self.actor_username or 'system'}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Audit entries cannot be changed once written.')
+        super().save(*args, **kwargs)
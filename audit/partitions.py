@@ -0,0 +1,102 @@
+"""
+Monthly partitions of the audit log on PostgreSQL.
+
+The initial migration turns ``audit_auditentry`` into a table partitioned by
+range of ``created_at``, with a default partition for anything outside the
+monthly ones. ``ensure_partitions`` creates the partitions for the current
+and coming months ("manage.py audit_partitions", run e.g. daily), and old
+months can be dropped whole.
+
+PostgreSQL will not add a partition while the default one holds rows in its
+range (entries written after a missed run). Those rows are moved into the
+new partition before it is attached, in the same transaction, which locks
+the default partition for as long as the move takes. On other databases the log is a plain table and
+these are no-ops.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+TABLE = 'audit_auditentry'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month, table=TABLE):
+    return f'{table}_y{month:%Y}m{month:%m}'
+
+
+def month_bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def create_month_partitions(cursor, first, count, table=TABLE):
+    """Create missing partitions for ``count`` months from ``first``; return their names.
+
+    Run inside a transaction: rows the default partition holds for a new
+    month are moved into that month's partition.
+    """
+    names = []
+    for offset in range(count):
+        month = add_months(first, offset)
+        name = partition_name(month, table)
+        bounds = [month_bound(month), month_bound(add_months(month, 1))]
+        names.append(name)
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [f'"{name}"'])
+        if cursor.fetchone()[0]:
+            continue
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{table}_default" WHERE created_at >= %s AND created_at < %s)', bounds,
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', bounds)
+            continue
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{table}_default" WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            bounds,
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', bounds)
+    return names
+
+
+def is_partitioned(using=connection):
+    return using.vendor == 'postgresql'
+
+
+def ensure_partitions(months_ahead=2, using=connection):
+    """Create this month's partition and the next ``months_ahead``; return their names."""
+    if not is_partitioned(using):
+        return []
+    today = datetime.now(dt_timezone.utc).date()
+    with transaction.atomic(using=using.alias), using.cursor() as cursor:
+        return create_month_partitions(cursor, month_start(today), months_ahead + 1)
+
+
+def drop_partitions_before(month, using=connection):
+    """Drop the monthly partitions wholly before ``month``; return their names."""
+    if not is_partitioned(using):
+        return []
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [TABLE],
+        )
+        cutoff = partition_name(month_start(month))
+        prefix = f'{TABLE}_y'
+        # Names sort by month, and the default partition never matches the prefix
+        names = sorted(name for (name,) in cursor.fetchall() if name.startswith(prefix) and name < cutoff)
+        for name in names:
+            cursor.execute(f'DROP TABLE "{name}"')
+    return names
@@ -0,0 +1,161 @@
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from unittest import mock
+
+from system_admin import views as system_admin_views
+from tickets.bulk import apply_bulk_action
+from tickets.models import Ticket
+
+from .log import REDACTED, audit_scope, diff, record, snapshot
+from .middleware import AuditMiddleware
+from .models import AuditEntry
+
+User = get_user_model()
+
+
+class AuditLogTests(TestCase):
+    """Tests for the buffered audit log"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        self.tickets = [
+            Ticket.objects.create(
+                user=self.department_user,
+                name='John',
+                last_name='Doe',
+                email='john@example.com',
+                department='hr',
+                nature_of_engagement='for_copy'
+            )
+            for _ in range(3)
+        ]
+
+    def test_diff_holds_only_changed_fields(self):
+        """Test the diff lists changed fields and hides password values"""
+        before = snapshot(self.department_user)
+        self.department_user.role = 'admin'
+        self.department_user.set_password('another-pass')
+        self.assertEqual(diff(before, snapshot(self.department_user)), {
+            'password': [REDACTED, REDACTED],
+            'role': ['user', 'admin'],
+        })
+        self.assertIsNone(record(AuditEntry.UPDATE, self.department_user, {}))
+
+    def test_request_writes_entries_once(self):
+        """Test a ticket update is logged with its actor, diff and request id"""
+        self.client.login(username='admin', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('tickets:admin_ticket_detail', args=[self.tickets[0].id]),
+                {'status': 'in_progress', 'priority': 'high', 'admin_comments': 'On it'},
+                HTTP_X_REQUEST_ID='req-123',
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['X-Request-ID'], 'req-123')
+
+        entry = AuditEntry.objects.for_object(self.tickets[0]).get()
+        self.assertEqual(entry.action, AuditEntry.UPDATE)
+        self.assertEqual(entry.actor, self.admin_user)
+        self.assertEqual(entry.request_id, 'req-123')
+        self.assertEqual(entry.changes, {
+            'admin_comments': [None, 'On it'],
+            'priority': ['medium', 'high'],
+            'status': ['pending', 'in_progress'],
+        })
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_bulk_changes_are_one_insert(self):
+        """Test a scope buffers one entry per ticket and writes them with one query once committed"""
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            with audit_scope(actor=self.admin_user) as scope:
+                apply_bulk_action([ticket.id for ticket in self.tickets], 'priority', 'high', actor=self.admin_user)
+                self.assertEqual(scope.entries, [])
+            self.assertEqual(AuditEntry.objects.count(), 0)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "audit_auditentry"')]
+        self.assertEqual(len(inserts), 1)
+
+        entries = AuditEntry.objects.filter(object_type='tickets.ticket')
+        self.assertEqual(entries.count(), 3)
+        self.assertEqual({entry.request_id for entry in entries}, {scope.request_id})
+        self.assertEqual(entries.first().changes, {'priority': ['medium', 'high']})
+
+    def test_failed_changes_are_not_logged(self):
+        """Test entries from a failed request or a rolled back block are never written"""
+        def failing_view(request):
+            record(AuditEntry.UPDATE, self.tickets[0], {'priority': ['medium', 'high']})
+            raise RuntimeError
+
+        with self.captureOnCommitCallbacks(execute=True):
+            middleware = AuditMiddleware(failing_view)
+            with self.assertRaises(RuntimeError):
+                middleware(RequestFactory().get('/'))
+            # Django calls process_exception before turning the view's error into a response
+            with audit_scope():
+                record(AuditEntry.UPDATE, self.tickets[0], {'priority': ['medium', 'low']})
+                middleware.process_exception(None, RuntimeError())
+
+            with audit_scope():
+                try:
+                    with transaction.atomic():
+                        record(AuditEntry.UPDATE, self.tickets[1], {'priority': ['medium', 'high']})
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                record(AuditEntry.UPDATE, self.tickets[2], {'priority': ['medium', 'low']})
+
+        self.assertEqual(list(AuditEntry.objects.values_list('object_id', flat=True)), [str(self.tickets[2].pk)])
+
+    def test_user_views_are_logged(self):
+        """Test the system admin user views log create, update and delete"""
+        superuser = User.objects.create_superuser(username='root', email='root@example.com', password='testpass123')
+        factory = RequestFactory()
+
+        def post(view, data, *args):
+            request = factory.post('/', data)
+            request.user = superuser
+            request._messages = mock.MagicMock()
+            # The system admin URLs are not mounted, so nothing can be reversed
+            with mock.patch.object(system_admin_views, 'render', return_value=HttpResponse()), \
+                    mock.patch.object(system_admin_views, 'redirect', return_value=HttpResponse()):
+                view(request, *args)
+
+        post(system_admin_views.user_create, {
+            'username': 'newuser', 'email': 'new@example.com', 'password': 'testpass123',
+            'first_name': 'New', 'last_name': 'User', 'role': 'user',
+        })
+        user = User.objects.get(username='newuser')
+        post(system_admin_views.user_edit, {
+            'username': 'newuser', 'email': 'new@example.com', 'first_name': 'New', 'last_name': 'User',
+            'role': 'admin', 'is_active': 'on',
+        }, user.id)
+        post(system_admin_views.user_delete, {}, user.id)
+
+        entries = list(AuditEntry.objects.for_object(user).order_by('id'))
+        self.assertEqual([entry.action for entry in entries], ['create', 'update', 'delete'])
+        self.assertEqual(entries[0].changes['password'], [REDACTED, REDACTED])
+        self.assertEqual(entries[1].changes, {'role': ['user', 'admin']})
+        self.assertEqual(entries[2].changes['username'], ['newuser', None])
+        self.assertEqual(entries[2].object_id, str(user.id))
+
+    def test_object_history_uses_index(self):
+        """Test per-object history can be served by audit_object_idx"""
+        plan = AuditEntry.objects.for_object(self.tickets[0]).explain()
+        self.assertIn('audit_object_idx', plan)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+    
+    def ready(self):
+        # Cache invalidation for request principals, and the check that the cache is shared
+        from . import checks, principal  # noqa: F401
@@ -0,0 +1,10 @@
+from django.contrib.auth.backends import ModelBackend
+
+
+class CachedPrincipalBackend(ModelBackend):
+    """The backend sessions log in with; their request users come from session principals.
+
+    PrincipalAuthenticationMiddleware builds the user from the principal kept
+    in the session (authentication.principal) and only falls back to
+    ``get_user()``, one query, when that principal is missing or stale.
+    """
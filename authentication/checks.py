@@ -0,0 +1,33 @@
+"""
+System check that the default cache is shared by every worker process.
+
+Session principals (authentication.principal) are checked against a version
+in the cache that changes with their user, and cached dashboards (tickets.dashboard_cache) are
+superseded by a new generation when their tickets change. With a
+per-process cache only the process that made the change would see it, and
+each process would keep its own dashboard hit and miss counts, so such a
+cache is refused. Only an in-memory SQLite database, as the test runner
+uses, is certain to belong to a single process.
+"""
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    connection = connections['default']
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return []
+    if not isinstance(caches['default'], (LocMemCache, DummyCache)):
+        return []
+    return [
+        checks.Error(
+            'The default cache is local to each process, so session principals and cached dashboards would go stale '
+            'in other workers.',
+            hint='Set REDIS_URL, or use the database cache ("manage.py createcachetable").',
+            id='authentication.E001',
+        )
+    ]
@@ -0,0 +1,35 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from .principal import get_request_user
+
+# Sessions logged in before CachedPrincipalBackend existed name this backend
+LEGACY_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+PRINCIPAL_BACKEND = 'authentication.backends.CachedPrincipalBackend'
+
+
+def get_user(request):
+    # Both backends check the same users the same way, so an older session
+    # stays valid; it just stops loading the user row on every request
+    if request.session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND:
+        request.session[BACKEND_SESSION_KEY] = PRINCIPAL_BACKEND
+    return get_request_user(request)
+
+
+async def auser(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_user)(request)
+    return request._acached_user
+
+
+class PrincipalAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that serves request.user from session principals (authentication.principal)."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(auser, request)
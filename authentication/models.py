@@ -22,6 +22,20 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     department = models.CharField(max_length=20, choices=DEPARTMENT_CHOICES, blank=True, null=True)
     
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # A user built from a session principal (authentication.principal) loads
+        # all of its deferred fields at the first read of any of them
+        deferred = self.get_deferred_fields()
+        if fields is not None and set(fields) <= deferred:
+            fields = list(deferred)
+        super().refresh_from_db(using, fields, **kwargs)
+    
+    def get_session_auth_hash(self):
+        cached = getattr(self, 'cached_session_auth_hash', None)
+        if cached and 'password' in self.get_deferred_fields():
+            return cached
+        return super().get_session_auth_hash()
+    
     def is_legal_admin(self):
         return self.role == 'admin'
     
@@ -0,0 +1,158 @@
+"""
+Session principals.
+
+Most requests only need to know who the user is and what they may do, yet
+AuthenticationMiddleware loads the whole user row for each of them. A
+principal is the few columns that authorization and the page header read,
+plus the session verification hash, kept in the session itself; the session
+engine (authentication.sessions) serves recent sessions from memory.
+``get_request_user`` builds the request user from it: a real ``User`` whose
+other fields are deferred, so checks such as ``is_legal_admin()`` or
+``is_superuser`` cost no query and the first read of any other field loads
+the rest of the row in one.
+
+A principal is stamped with the user's principal version, a value in the
+default cache that saving or deleting the user replaces, and is used only
+while that version is current. Each process remembers the versions it has
+read for SESSION_LOCAL_CACHE_TTL seconds, so a warm request costs no query
+on any cache backend, and a change made in another process takes effect
+within that TTL, the same bound the session engine puts on logouts.
+PRINCIPAL_TIMEOUT bounds how long writes that skip model signals, such as
+``update()``, can leave a stale principal.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .sessions import local_cache_size, local_cache_ttl
+
+# Columns held in a principal
+PRINCIPAL_FIELDS = ['id', 'username', 'first_name', 'role', 'department', 'is_superuser', 'is_active']
+
+PRINCIPAL_TIMEOUT = 5 * 60
+
+PRINCIPAL_SESSION_KEY = '_auth_principal'
+
+
+def principal_version_key(user_id):
+    return f'auth:principal_version:{user_id}'
+
+
+class LocalVersions:
+    """A thread-safe LRU of principal versions read from the cache, trusted for a TTL."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < local_cache_ttl():
+                self.entries.move_to_end(user_id)
+                return entry[0]
+        # A time-based value is never reused, even after the key is evicted
+        version = cache.get_or_set(principal_version_key(user_id), time.time_ns, None)
+        with self.lock:
+            self.entries[user_id] = (version, time.monotonic())
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > local_cache_size():
+                self.entries.popitem(last=False)
+        return version
+
+    def delete(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_versions = LocalVersions()
+
+
+def principal_data(user, version):
+    return {
+        **{field: getattr(user, field) for field in PRINCIPAL_FIELDS},
+        'session_auth_hash': user.get_session_auth_hash(),
+        'version': version,
+        'loaded_at': time.time(),
+    }
+
+
+def bump_principal_version(user_id):
+    """Start a new principal version for the user, now and again on commit."""
+    def bump():
+        cache.set(principal_version_key(user_id), time.time_ns(), None)
+        local_versions.delete(user_id)
+
+    bump()
+    if connection.in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def user_from_principal(data):
+    """A User with only the principal's fields loaded."""
+    User = get_user_model()
+    attnames = [field.attname for field in User._meta.concrete_fields]
+    user = User.from_db(DEFAULT_DB_ALIAS, attnames, [data.get(attname, DEFERRED) for attname in attnames])
+    user.cached_session_auth_hash = data['session_auth_hash']
+    return user
+
+
+def session_principal(session):
+    """The session's principal, if it is still current for the session's user."""
+    data = session.get(PRINCIPAL_SESSION_KEY)
+    user_id = session.get(SESSION_KEY)
+    if data is None or user_id is None or str(data['id']) != str(user_id):
+        return None
+    if session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    if time.time() - data['loaded_at'] >= PRINCIPAL_TIMEOUT:
+        return None
+    if data['version'] != local_versions.get(data['id']):
+        return None
+    return data
+
+
+def get_request_user(request):
+    """The request's user, from its session principal, loading and storing one when it is missing or stale."""
+    data = session_principal(request.session)
+    if data is not None:
+        return user_from_principal(data)
+    user_id = request.session.get(SESSION_KEY)
+    # Read before the row, so a change committed in between leaves this principal stale
+    version = local_versions.get(get_user_model()._meta.pk.to_python(user_id)) if user_id is not None else None
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        request.session[PRINCIPAL_SESSION_KEY] = principal_data(user, version)
+    return user
+
+
+@receiver(user_logged_in)
+def store_principal_on_login(sender, request, user, **kwargs):
+    request.session[PRINCIPAL_SESSION_KEY] = principal_data(user, local_versions.get(user.pk))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_principal_on_save(sender, instance, update_fields=None, **kwargs):
+    # Recording a login changes nothing a principal holds
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_principal_version(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def bump_principal_on_delete(sender, instance, **kwargs):
+    bump_principal_version(instance.pk)
@@ -0,0 +1,147 @@
+"""
+Two-tier session engine (SESSION_ENGINE = 'authentication.sessions').
+
+Sessions live in the ``django_session`` table as usual, with a per-process
+LRU of recently used rows in front of it:
+
+* Loads within SESSION_LOCAL_CACHE_TTL seconds of the last read or write in
+  this process come from memory. Changes made by other processes (such as
+  a logout) therefore show up here within that TTL.
+* Saves that change the session data are written through to the table.
+* Saves that would only push the expiry date forward are written only when
+  they move it by more than SESSION_EXPIRY_WRITE_INTERVAL seconds. This
+  keeps SESSION_SAVE_EVERY_REQUEST sessions from writing on every request.
+  The stored expiry lags by at most that interval.
+* ``clear_expired`` (and so ``manage.py clearsessions``) deletes expired
+  rows SESSION_CLEAR_BATCH_SIZE at a time instead of in one statement.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.db import transaction
+from django.utils import timezone
+
+CachedSession = namedtuple('CachedSession', ['session_data', 'expire_date', 'cached_at'])
+
+
+def local_cache_size():
+    return getattr(settings, 'SESSION_LOCAL_CACHE_SIZE', 10000)
+
+
+def local_cache_ttl():
+    return getattr(settings, 'SESSION_LOCAL_CACHE_TTL', 30)
+
+
+def expiry_write_interval():
+    return timedelta(seconds=getattr(settings, 'SESSION_EXPIRY_WRITE_INTERVAL', 60 * 60))
+
+
+def clear_batch_size():
+    return getattr(settings, 'SESSION_CLEAR_BATCH_SIZE', 1000)
+
+
+class LocalSessionCache:
+    """A thread-safe LRU of session rows whose entries go stale after a TTL."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_key):
+        with self.lock:
+            entry = self.entries.get(session_key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.cached_at >= local_cache_ttl() or entry.expire_date <= timezone.now():
+                del self.entries[session_key]
+                return None
+            self.entries.move_to_end(session_key)
+            return entry
+
+    def set(self, session_key, session_data, expire_date):
+        with self.lock:
+            self.entries[session_key] = CachedSession(session_data, expire_date, time.monotonic())
+            self.entries.move_to_end(session_key)
+            while len(self.entries) > local_cache_size():
+                self.entries.popitem(last=False)
+
+    def delete(self, session_key):
+        with self.lock:
+            self.entries.pop(session_key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_sessions = LocalSessionCache()
+
+
+class SessionStore(DBStore):
+    # The stored row as last read or written: (decoded data, expire_date)
+    _stored = None
+
+    def load(self):
+        cached = local_sessions.get(self.session_key) if self.session_key else None
+        if cached is not None:
+            data = self.decode(cached.session_data)
+            self._stored = (copy.deepcopy(data), cached.expire_date)
+            return data
+        session = self._get_session_from_db()
+        if session is None:
+            return {}
+        local_sessions.set(session.session_key, session.session_data, session.expire_date)
+        data = self.decode(session.session_data)
+        self._stored = (copy.deepcopy(data), session.expire_date)
+        return data
+
+    def exists(self, session_key):
+        return local_sessions.get(session_key) is not None or super().exists(session_key)
+
+    def create_model_instance(self, data):
+        # Kept so save() can cache exactly what it wrote
+        self._written = super().create_model_instance(data)
+        return self._written
+
+    def save(self, must_create=False):
+        if self.session_key is not None and not must_create and self._stored is not None:
+            data = self._get_session()
+            stored_data, stored_expiry = self._stored
+            if data == stored_data and self.get_expiry_date() - stored_expiry < expiry_write_interval():
+                # Only the expiry would move, and not far enough to be worth a write
+                return
+        super().save(must_create=must_create)
+        written = self._written
+        local_sessions.set(written.session_key, written.session_data, written.expire_date)
+        self._stored = (copy.deepcopy(self._get_session()), written.expire_date)
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        if session_key is not None:
+            local_sessions.delete(session_key)
+        super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls, batch_size=None):
+        """Delete expired sessions in batches; return how many were deleted."""
+        batch_size = batch_size or clear_batch_size()
+        model = cls.get_model_class()
+        deleted = 0
+        while True:
+            now = timezone.now()
+            keys = list(
+                model.objects.filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                return deleted
+            with transaction.atomic():
+                # A session refreshed since it was selected is no longer expired and stays
+                deleted += model.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
+            for key in keys:
+                local_sessions.delete(key)
@@ -1,8 +1,22 @@
-from django.test import TestCase, Client
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.contrib.auth import get_user_model
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
 from tickets.models import Ticket, TicketMessage
+from .checks import check_shared_cache
+from .principal import (
+    PRINCIPAL_SESSION_KEY, local_versions, principal_data, principal_version_key, user_from_principal,
+)
+from .sessions import SessionStore, local_sessions
 
 User = get_user_model()
 
@@ -179,3 +193,193 @@ class AuthenticationFunctionalTests(TestCase):
         """Test home page redirect for unauthenticated users"""
         response = self.client.get(reverse('tickets:home'))
         self.assertRedirects(response, reverse('auth:login'))
+
+
+class CachedPrincipalTests(TestCase):
+    """Tests for request users served from cached principals"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        cache.clear()
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            first_name='Admin',
+            last_name='User',
+            role='admin'
+        )
+    
+    def test_authorization_skips_user_query(self):
+        """Test role checks on a logged-in request need no queries, even with the database cache"""
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache',
+        }}):
+            call_command('createcachetable', verbosity=0)
+            local_versions.clear()
+            self.client.login(username='admin', password='testpass123')
+            self.assertEqual(self.client.session[PRINCIPAL_SESSION_KEY]['role'], 'admin')
+            
+            # The session comes from the local tier (authentication.sessions) and
+            # the principal version from the one this process read at login
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('tickets:home'))
+            self.assertRedirects(response, reverse('tickets:admin_dashboard'), fetch_redirect_response=False)
+    
+    def test_deferred_fields_load_together(self):
+        """Test the first read of a field outside the principal loads the rest of the row at once"""
+        data = principal_data(self.admin_user, version=1)
+        with self.assertNumQueries(0):
+            user = user_from_principal(data)
+            self.assertTrue(user.is_legal_admin())
+            self.assertEqual(user.first_name, 'Admin')
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'admin@example.com')
+            self.assertEqual(user.last_name, 'User')
+            self.assertTrue(user.check_password('testpass123'))
+        self.assertEqual(user, self.admin_user)
+    
+    def test_user_changes_invalidate_principal(self):
+        """Test saving the user makes the session principal stale"""
+        self.client.login(username='admin', password='testpass123')
+        self.admin_user.role = 'user'
+        self.admin_user.save()
+        self.assertNotEqual(
+            self.client.session[PRINCIPAL_SESSION_KEY]['version'], local_versions.get(self.admin_user.pk)
+        )
+        response = self.client.get(reverse('tickets:home'))
+        self.assertRedirects(response, reverse('tickets:user_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session[PRINCIPAL_SESSION_KEY]['role'], 'user')
+        
+        # A password change elsewhere ends the session
+        self.admin_user.set_password('another-pass123')
+        self.admin_user.save()
+        response = self.client.get(reverse('tickets:home'))
+        self.assertRedirects(response, reverse('auth:login'), fetch_redirect_response=False)
+    
+    def test_changes_in_other_processes_apply_within_ttl(self):
+        """Test a version replaced by another process is picked up once the local TTL passes"""
+        self.client.login(username='admin', password='testpass123')
+        User.objects.filter(pk=self.admin_user.pk).update(role='user')
+        # As another worker's save would leave it
+        cache.set(principal_version_key(self.admin_user.pk), 1, None)
+        
+        response = self.client.get(reverse('tickets:home'))
+        self.assertRedirects(response, reverse('tickets:admin_dashboard'), fetch_redirect_response=False)
+        with override_settings(SESSION_LOCAL_CACHE_TTL=0):
+            response = self.client.get(reverse('tickets:home'))
+        self.assertRedirects(response, reverse('tickets:user_dashboard'), fetch_redirect_response=False)
+    
+    def test_server_database_needs_shared_cache(self):
+        """Test a per-process cache is refused unless the database is in-memory SQLite"""
+        self.assertEqual(check_shared_cache(None), [])
+        with mock.patch.object(connection, 'is_in_memory_db', return_value=False):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['authentication.E001'])
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['authentication.E001'])
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache',
+            }}):
+                self.assertEqual(check_shared_cache(None), [])
+    
+    def test_legacy_session_is_upgraded(self):
+        """Test sessions logged in with ModelBackend keep working"""
+        self.client.force_login(self.admin_user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('tickets:home'))
+        self.assertRedirects(response, reverse('tickets:admin_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(
+            self.client.session[BACKEND_SESSION_KEY], 'authentication.backends.CachedPrincipalBackend'
+        )
+
+
+class SessionEngineTests(TestCase):
+    """Tests for the two-tier session engine"""
+    
+    def setUp(self):
+        """Set up test data"""
+        local_sessions.clear()
+        self.store = SessionStore()
+        self.store['step'] = 1
+        self.store.create()
+        self.key = self.store.session_key
+    
+    def test_loads_come_from_local_tier(self):
+        """Test a session saved in this process loads without a query"""
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(self.key)['step'], 1)
+        
+        local_sessions.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(SessionStore(self.key)['step'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(self.key)['step'], 1)
+    
+    @override_settings(SESSION_LOCAL_CACHE_TTL=0)
+    def test_stale_entries_are_reloaded(self):
+        """Test entries older than the TTL are read from the database again"""
+        with self.assertNumQueries(1):
+            self.assertEqual(SessionStore(self.key)['step'], 1)
+    
+    @override_settings(SESSION_LOCAL_CACHE_SIZE=2)
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test the local tier keeps only the most recently used sessions"""
+        for _ in range(2):
+            SessionStore().create()
+        with self.assertNumQueries(1):
+            self.assertEqual(SessionStore(self.key)['step'], 1)
+    
+    def test_expiry_refresh_is_written_behind(self):
+        """Test saving an unchanged session only writes once the expiry moves far enough"""
+        store = SessionStore(self.key)
+        store['step']
+        stored_expiry = Session.objects.get(pk=self.key).expire_date
+        with self.assertNumQueries(0):
+            store.save()
+        
+        with override_settings(SESSION_EXPIRY_WRITE_INTERVAL=0):
+            store.save()
+        self.assertGreater(Session.objects.get(pk=self.key).expire_date, stored_expiry)
+    
+    def test_data_changes_are_written_through(self):
+        """Test changed session data reaches the database and the local tier"""
+        store = SessionStore(self.key)
+        store['step'] = 2
+        store.save()
+        self.assertEqual(Session.objects.get(pk=self.key).get_decoded()['step'], 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(self.key)['step'], 2)
+    
+    def test_delete_removes_both_tiers(self):
+        """Test a deleted session is gone from memory and the database"""
+        SessionStore(self.key).delete()
+        self.assertFalse(Session.objects.filter(pk=self.key).exists())
+        self.assertFalse(SessionStore().exists(self.key))
+        self.assertEqual(SessionStore(self.key).load(), {})
+    
+    @override_settings(SESSION_CLEAR_BATCH_SIZE=2)
+    def test_clearsessions_deletes_in_batches(self):
+        """Test clearsessions removes expired rows a batch at a time"""
+        for _ in range(4):
+            SessionStore().create()
+        Session.objects.exclude(pk=self.key).update(expire_date=timezone.now() - timedelta(days=1))
+        
+        with CaptureQueriesContext(connection) as context:
+            call_command('clearsessions')
+        deletes = [query for query in context.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 2)
+        self.assertEqual(list(Session.objects.values_list('pk', flat=True)), [self.key])
+    
+    def test_clearsessions_keeps_refreshed_sessions(self):
+        """Test a session refreshed between the select and the delete is kept"""
+        Session.objects.filter(pk=self.key).update(expire_date=timezone.now() - timedelta(days=1))
+        atomic = transaction.atomic
+        
+        def refresh_then_atomic(*args, **kwargs):
+            Session.objects.filter(pk=self.key).update(expire_date=timezone.now() + timedelta(days=1))
+            return atomic(*args, **kwargs)
+        
+        with mock.patch('authentication.sessions.transaction.atomic', side_effect=refresh_then_atomic):
+            self.assertEqual(SessionStore.clear_expired(), 0)
+        self.assertTrue(Session.objects.filter(pk=self.key).exists())
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'status', 'priority', 'attempts', 'run_after', 'created_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'idempotency_key']
+    readonly_fields = ['locked_by', 'locked_until', 'last_error', 'created_at', 'finished_at']
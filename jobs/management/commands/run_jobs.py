@@ -0,0 +1,47 @@
+import signal
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of jobs this worker runs at once (default: 1).',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no jobs are due instead of waiting for more.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between checks when the queue is empty (default: 1).',
+        )
+        parser.add_argument(
+            '--lease',
+            type=int,
+            default=300,
+            help='Seconds a job stays leased without a heartbeat before another worker may take it over (default: 300).',
+        )
+
+    def handle(self, *args, concurrency=1, burst=False, poll_interval=1.0, lease=300, **options):
+        if concurrency < 1:
+            raise CommandError('--concurrency must be at least 1.')
+        worker = Worker(concurrency=concurrency, lease=timedelta(seconds=lease), poll_interval=poll_interval)
+
+        if not burst:
+            # Finish running jobs, then exit
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: worker.stop())
+            self.stdout.write(f'Worker {worker.name} running {concurrency} job(s) at a time.')
+        worker.run(burst=burst)
@@ -0,0 +1,78 @@
+from django.db import models
+from django.utils import timezone
+
+
+class JobQuerySet(models.QuerySet):
+    def ready(self, now=None):
+        """Jobs a worker may start now: pending and due, or running with an expired lease."""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(status=Job.PENDING, run_after__lte=now)
+            | models.Q(status=Job.RUNNING, locked_until__lt=now)
+        )
+
+    def running_counts(self, now=None):
+        """Number of jobs per task currently held by a live worker."""
+        now = now or timezone.now()
+        return dict(
+            self.filter(status=Job.RUNNING, locked_until__gte=now)
+            .order_by().values('task').annotate(count=models.Count('id')).values_list('task', 'count')
+        )
+
+
+class Job(models.Model):
+    """A unit of background work, run by the run_jobs worker (see jobs.queue)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict, blank=True)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Enqueueing again with a key already in the table returns the existing job
+    idempotency_key = models.CharField(max_length=200, blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Claim order over the (small) set of pending jobs
+            models.Index(
+                fields=['-priority', 'run_after', 'id'],
+                condition=models.Q(status='pending'),
+                name='job_ready_idx',
+            ),
+            # Lease expiry and per-task concurrency checks
+            models.Index(
+                fields=['task', 'locked_until'],
+                condition=models.Q(status='running'),
+                name='job_running_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=~models.Q(idempotency_key=''),
+                name='unique_job_idempotency_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.task} ({self.status})"
@@ -0,0 +1,95 @@
+"""
+A small database-backed job queue.
+
+Apps register functions in their ``tasks`` module with ``@task`` and views
+hand work to them with ``enqueue_on_commit`` instead of running it inline::
+
+    @task(max_attempts=5, concurrency=2)
+    def scan_document(ticket_id):
+        ...
+
+    enqueue_on_commit(scan_document, ticket_id=ticket.pk, idempotency_key=f'scan:{ticket.pk}')
+
+Jobs are rows in ``jobs.Job`` and are run by ``manage.py run_jobs``. Keyword
+arguments must be JSON-serializable.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Job
+
+_registry = {}
+
+
+class UnknownTask(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Task:
+    func: object
+    name: str
+    max_attempts: int = 3
+    priority: int = 0
+    # Most jobs of this task allowed to run at once across all workers
+    concurrency: int = None
+    # Seconds before the first retry; doubled on each further attempt
+    retry_delay: float = 10
+    max_retry_delay: float = 3600
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def backoff(self, attempts):
+        return timedelta(seconds=min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay))
+
+
+def task(func=None, *, name=None, **options):
+    """Register a function as a task; usable bare or with options."""
+    def register(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__qualname__}', **options)
+        _registry[registered.name] = registered
+        return registered
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise UnknownTask(f'No task registered as {name!r}.') from None
+
+
+def enqueue(task, *, priority=None, idempotency_key='', delay=None, **kwargs):
+    """Add a job for a registered task and return it.
+
+    A job whose ``idempotency_key`` is already queued is not added again; the
+    existing job is returned instead.
+    """
+    if not isinstance(task, Task):
+        task = get_task(task)
+    job = Job(
+        task=task.name,
+        kwargs=kwargs,
+        priority=task.priority if priority is None else priority,
+        idempotency_key=idempotency_key,
+        max_attempts=task.max_attempts,
+        run_after=timezone.now() + delay if delay else timezone.now(),
+    )
+    if not idempotency_key:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=idempotency_key)
+    return job
+
+
+def enqueue_on_commit(task, **options):
+    """Enqueue once the current transaction commits, so workers never see uncommitted rows."""
+    transaction.on_commit(lambda: enqueue(task, **options))
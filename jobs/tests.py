@@ -0,0 +1,181 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Job
+from .queue import enqueue, enqueue_on_commit, task
+from .worker import Worker
+
+calls = []
+
+
+@task(name='jobs.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='jobs.tests.flaky', max_attempts=3, retry_delay=30)
+def flaky(fail_times):
+    calls.append('attempt')
+    if calls.count('attempt') <= fail_times:
+        raise RuntimeError('Temporary failure')
+
+
+@task(name='jobs.tests.slow')
+def slow(seconds):
+    time.sleep(seconds)
+    calls.append('slow')
+
+
+@task(name='jobs.tests.limited', concurrency=1)
+def limited():
+    calls.append('limited')
+
+
+class JobQueueTests(TestCase):
+    """Tests for the database-backed job queue"""
+
+    def setUp(self):
+        """Reset recorded task calls"""
+        calls.clear()
+
+    def test_jobs_run_by_priority(self):
+        """Test the worker runs due jobs highest priority first, oldest first"""
+        enqueue(record, value='low')
+        enqueue(record, value='high', priority=10)
+        enqueue(record, value='low again')
+        enqueue(record, value='later', delay=timedelta(hours=1))
+
+        call_command('run_jobs', '--burst', stdout=StringIO())
+
+        self.assertEqual(calls, ['high', 'low', 'low again'])
+        self.assertEqual(Job.objects.filter(status=Job.SUCCEEDED).count(), 3)
+        self.assertEqual(Job.objects.get(status=Job.PENDING).kwargs, {'value': 'later'})
+
+    def test_idempotency_key(self):
+        """Test enqueueing the same key twice yields one job"""
+        first = enqueue(record, value='a', idempotency_key='record:a')
+        second = enqueue(record, value='a', idempotency_key='record:a')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+        # Unkeyed jobs are never merged
+        enqueue(record, value='b')
+        enqueue(record, value='b')
+        self.assertEqual(Job.objects.count(), 3)
+
+    def test_retries_with_backoff(self):
+        """Test a failing job is retried after a growing delay, then fails for good"""
+        job = enqueue(flaky, fail_times=5)
+        worker = Worker()
+
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            worker.run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('Temporary failure', job.last_error)
+        self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 30, delta=5)
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            worker.run(burst=True)
+        job.refresh_from_db()
+        self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 60, delta=5)
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            worker.run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertEqual(calls.count('attempt'), 3)
+
+    def test_retry_succeeds(self):
+        """Test a job that recovers is marked succeeded"""
+        job = enqueue(flaky, fail_times=1)
+        worker = Worker()
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            worker.run(burst=True)
+        Job.objects.update(run_after=timezone.now())
+        worker.run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.last_error, '')
+
+    def test_concurrency_limit(self):
+        """Test a task at its concurrency limit is skipped while other work proceeds"""
+        running = enqueue(limited)
+        Job.objects.filter(pk=running.pk).update(
+            status=Job.RUNNING, locked_by='other', locked_until=timezone.now() + timedelta(minutes=5),
+        )
+        enqueue(limited)
+        enqueue(record, value='other work')
+
+        Worker().run(burst=True)
+        self.assertEqual(calls, ['other work'])
+        self.assertEqual(Job.objects.filter(task='jobs.tests.limited', status=Job.PENDING).count(), 1)
+
+    def test_expired_lease_is_taken_over(self):
+        """Test a job whose worker died is run again once its lease expires"""
+        job = enqueue(record, value='recovered')
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, locked_by='dead', attempts=1, locked_until=timezone.now() - timedelta(seconds=1),
+        )
+
+        Worker().run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(calls, ['recovered'])
+
+    def test_heartbeat_extends_lease(self):
+        """Test a running job's lease is extended until the job ends"""
+        enqueue(slow, seconds=0.3)
+        worker = Worker(lease=timedelta(seconds=0.15))
+        with mock.patch.object(Worker, 'extend_lease', return_value=True) as extend_lease:
+            worker.run(burst=True)
+        self.assertEqual(calls, ['slow'])
+        self.assertGreaterEqual(extend_lease.call_count, 3)
+
+        job = enqueue(record, value='leased')
+        claimed = worker.claim()
+        before = Job.objects.get(pk=job.pk).locked_until
+        self.assertTrue(worker.extend_lease(claimed))
+        self.assertGreater(Job.objects.get(pk=job.pk).locked_until, before)
+
+    def test_lost_lease_is_not_finished(self):
+        """Test a worker whose lease was taken over does not record the outcome"""
+        enqueue(record, value='first')
+        worker = Worker()
+        job = worker.claim()
+        # The lease expired and another claim took the job
+        Job.objects.filter(pk=job.pk).update(locked_by='other', attempts=2)
+
+        self.assertFalse(worker.extend_lease(job))
+        worker.finish(job, Job.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.locked_by, 'other')
+
+    def test_unknown_task_fails(self):
+        """Test jobs naming an unregistered task are failed rather than retried"""
+        job = Job.objects.create(task='jobs.tests.missing')
+        Worker().run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('No task registered', job.last_error)
+
+    def test_enqueue_on_commit(self):
+        """Test jobs enqueued in a transaction only exist once it commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                enqueue_on_commit(record, value='committed')
+                self.assertFalse(Job.objects.exists())
+        self.assertEqual(Job.objects.get().kwargs, {'value': 'committed'})
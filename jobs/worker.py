@@ -0,0 +1,191 @@
+"""
+Job worker.
+
+Workers claim due jobs in priority order under a lease, so a job whose worker
+dies is picked up again once the lease expires. While a job runs, a heartbeat
+thread extends its lease every third of the lease, so long jobs are not
+claimed a second time. A worker only records the outcome of a job it still
+holds: same worker, same attempt. Claims use ``SELECT ... FOR
+UPDATE SKIP LOCKED`` where the database supports it and a conditional UPDATE
+in every case, so any number of workers can share the table.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, connections, models, transaction
+from django.utils import timezone
+
+from .models import Job
+from .queue import UnknownTask, _registry, get_task
+
+logger = logging.getLogger(__name__)
+
+# Due jobs examined per claim attempt
+CLAIM_BATCH = 10
+
+
+class Worker:
+    def __init__(self, concurrency=1, lease=timedelta(minutes=5), poll_interval=1.0, name=None):
+        self.concurrency = max(int(concurrency), 1)
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.heartbeat_interval = lease / 3
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def saturated_tasks(self, now):
+        """Tasks already running at their concurrency limit."""
+        return [
+            name for name, count in Job.objects.running_counts(now).items()
+            if name in _registry and _registry[name].concurrency and count >= _registry[name].concurrency
+        ]
+
+    def claim(self):
+        """Lease the next due job to this worker, or return None."""
+        now = timezone.now()
+        with transaction.atomic():
+            candidates = (
+                Job.objects.ready(now).exclude(task__in=self.saturated_tasks(now))
+                .order_by('-priority', 'run_after', 'id')
+            )
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            for job in candidates[:CLAIM_BATCH]:
+                claimed = Job.objects.filter(
+                    pk=job.pk, status=job.status, locked_until=job.locked_until,
+                ).update(
+                    status=Job.RUNNING, locked_by=self.name, locked_until=now + self.lease,
+                    attempts=models.F('attempts') + 1,
+                )
+                if not claimed:
+                    continue
+                job.refresh_from_db()
+                if self.over_limit(job, now):
+                    # Another worker filled the last slot first; put the job back
+                    Job.objects.filter(pk=job.pk).update(
+                        status=Job.PENDING, locked_by='', locked_until=None, attempts=models.F('attempts') - 1,
+                    )
+                    continue
+                return job
+        return None
+
+    def over_limit(self, job, now):
+        limit = _registry[job.task].concurrency if job.task in _registry else None
+        if not limit:
+            return False
+        return Job.objects.running_counts(now).get(job.task, 0) > limit
+
+    def run_job(self, job):
+        """Run a claimed job and record the outcome."""
+        try:
+            task = get_task(job.task)
+        except UnknownTask as e:
+            self.finish(job, Job.FAILED, error=str(e))
+            return
+
+        if job.attempts > job.max_attempts:
+            # A worker died while running the final attempt
+            self.finish(job, Job.FAILED, error=job.last_error or 'Lease expired on the final attempt.')
+            return
+
+        try:
+            with self.heartbeat(job):
+                task.func(**job.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+            if job.attempts >= job.max_attempts:
+                self.finish(job, Job.FAILED, error=error)
+            else:
+                self.held(job).update(
+                    status=Job.PENDING, locked_by='', locked_until=None, last_error=error,
+                    run_after=timezone.now() + task.backoff(job.attempts),
+                )
+        else:
+            self.finish(job, Job.SUCCEEDED)
+
+    def held(self, job):
+        """The job's row, as long as this claim of it still holds the lease."""
+        return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=self.name, attempts=job.attempts)
+
+    def extend_lease(self, job):
+        """Push the job's lease forward; return whether this worker still holds it."""
+        return bool(self.held(job).update(locked_until=timezone.now() + self.lease))
+
+    @contextmanager
+    def heartbeat(self, job):
+        """Keep extending the job's lease while the block runs."""
+        done = threading.Event()
+
+        def beat():
+            try:
+                while not done.wait(self.heartbeat_interval.total_seconds()):
+                    if not self.extend_lease(job):
+                        logger.warning('Job %s (%s) lost its lease while running', job.pk, job.task)
+                        return
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def finish(self, job, status, error=''):
+        self.held(job).update(
+            status=status, locked_by='', locked_until=None, last_error=error, finished_at=timezone.now(),
+        )
+
+    def run_in_thread(self, job):
+        try:
+            self.run_job(job)
+        finally:
+            connections.close_all()
+
+    def run(self, burst=False):
+        """Process jobs until stopped, or until none are due when ``burst`` is set."""
+        if self.concurrency == 1:
+            return self._run_inline(burst)
+
+        active = set()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix='job') as pool:
+            while not self.stopping.is_set():
+                active = {future for future in active if not future.done()}
+                claimed = False
+                while len(active) < self.concurrency:
+                    job = self.claim()
+                    if job is None:
+                        break
+                    active.add(pool.submit(self.run_in_thread, job))
+                    claimed = True
+                if burst and not claimed and not active:
+                    break
+                if not claimed:
+                    close_old_connections()
+                    if active:
+                        wait(active, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    else:
+                        self.stopping.wait(self.poll_interval)
+
+    def _run_inline(self, burst):
+        while not self.stopping.is_set():
+            job = self.claim()
+            if job is not None:
+                self.run_job(job)
+            elif burst:
+                break
+            else:
+                close_old_connections()
+                self.stopping.wait(self.poll_interval)
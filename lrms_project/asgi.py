@@ -3,6 +3,11 @@ ASGI config for lrms_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Production serves this application with gunicorn's uvicorn worker (see
+start.sh), which enables the live ticket event stream at
+``/ticket/<id>/events/``; under WSGI that endpoint answers 501 and
+conversations fall back to page reloads.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
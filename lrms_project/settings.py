@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -137,6 +138,8 @@ INSTALLED_APPS = [
     'tickets',
     'system_admin',
     'api',  # REST API app
+    'jobs',  # Background job queue
+    'audit',  # Audit log of changes to users and tickets
 ]
 
 MIDDLEWARE = [
@@ -146,7 +149,8 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'authentication.middleware.PrincipalAuthenticationMiddleware',  # request.user from cached principals
+    'audit.middleware.AuditMiddleware',  # Buffers audit entries per request (after auth)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -164,6 +168,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'tickets.context_processors.unread_messages',
             ],
         },
     },
@@ -254,6 +259,35 @@ else:
         }
     }
 
+# Cache shared by every worker process. Principal versions (authentication.principal)
+# and dashboard generations and counters (tickets.dashboard_cache) are invalidated
+# and counted through it, so a per-process cache would leave other workers stale.
+# REDIS_URL selects Redis; otherwise the database cache table is used, on SQLite
+# too, since the server runs several workers ("manage.py createcachetable").
+# authentication.checks refuses a per-process cache.
+REDIS_URL = config('REDIS_URL', default='').strip()
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif 'test' in sys.argv:
+    # The test runner is one process on an in-memory database
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -295,24 +329,72 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Use different storage for testing
-import sys
 if 'test' in sys.argv:
-    STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    STATICFILES_BACKEND = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 else:
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+    STATICFILES_BACKEND = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    # Uploads are stored once per distinct content (tickets.storage);
+    # run "manage.py sweep_blobs" periodically to remove unreferenced ones
+    'default': {'BACKEND': 'tickets.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': STATICFILES_BACKEND},
+}
+
 # Custom User Model
 AUTH_USER_MODEL = 'authentication.User'
 
+# ModelBackend, but request users come from session principals (authentication.principal)
+AUTHENTICATION_BACKENDS = ['authentication.backends.CachedPrincipalBackend']
+
+# Database sessions behind a per-process LRU (authentication.sessions).
+# Other processes see a logout within SESSION_LOCAL_CACHE_TTL seconds.
+SESSION_ENGINE = 'authentication.sessions'
+SESSION_LOCAL_CACHE_SIZE = 10000
+SESSION_LOCAL_CACHE_TTL = 30
+# Expiry-only refreshes are written once they move the expiry this many seconds
+SESSION_EXPIRY_WRITE_INTERVAL = 60 * 60
+# Rows deleted per statement by "manage.py clearsessions"
+SESSION_CLEAR_BATCH_SIZE = 1000
+
 # Login/Logout URLs
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/auth/login/'
 
+# Live ticket updates (tickets.events). On PostgreSQL events go through
+# LISTEN/NOTIFY and reach every worker; the in-process broker only reaches
+# clients connected to the same worker.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    TICKET_EVENT_BROKER = 'tickets.events.PostgresBroker'
+else:
+    TICKET_EVENT_BROKER = 'tickets.events.InMemoryBroker'
+
+# Document downloads (tickets.downloads). Set to 'x-accel-redirect' behind
+# nginx, with an internal location aliased to MEDIA_ROOT at the prefix below,
+# or to 'x-sendfile' behind Apache/lighttpd; empty streams through Django.
+TICKET_DOWNLOAD_OFFLOAD = config('TICKET_DOWNLOAD_OFFLOAD', default='')
+TICKET_DOWNLOAD_ACCEL_PREFIX = config('TICKET_DOWNLOAD_ACCEL_PREFIX', default='/protected-media/')
+
+# Chunked uploads (tickets.uploads): partial files live outside MEDIA_ROOT
+# until attached; "manage.py clear_upload_sessions" removes abandoned ones.
+TICKET_UPLOAD_TEMP_DIR = config('TICKET_UPLOAD_TEMP_DIR', default=str(BASE_DIR / 'partial_uploads'))
+TICKET_UPLOAD_MAX_SIZE = config('TICKET_UPLOAD_MAX_SIZE', default=100 * 1024 * 1024, cast=int)
+
+# Email. Ticket notifications (tickets.notifications) are batched into
+# digests and sent by the run_jobs worker over one SMTP connection per batch.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='legal-tickets@localhost')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
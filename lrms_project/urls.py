@@ -22,6 +22,7 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('authentication.urls')),
+    path('system-admin/', include('system_admin.urls')),
     path('', include('tickets.urls')),
 ]
 
@@ -39,15 +39,15 @@ print('Django settings loaded OK')
     exit 1
 }
 
-# Test WSGI import
-echo "Testing WSGI application..."
+# Test ASGI import
+echo "Testing ASGI application..."
 python -c "
 import os
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lrms_project.settings')
-from lrms_project.wsgi import application
-print('WSGI application imported OK')
+from lrms_project.asgi import application
+print('ASGI application imported OK')
 " || {
-    echo "ERROR: Failed to import WSGI application"
+    echo "ERROR: Failed to import ASGI application"
     echo "This is the actual error - check above for details"
     exit 1
 }
@@ -64,6 +64,13 @@ else
     exit 1
 fi
 
+# Table for the shared cache when Redis is not configured (a no-op otherwise)
+echo "Creating cache table..."
+python manage.py createcachetable || {
+    echo "ERROR: Failed to create the cache table"
+    exit 1
+}
+
 # Start Gunicorn
 echo ""
 echo "=========================================="
@@ -74,4 +81,5 @@ echo ""
 
 # Use PORT if set, otherwise default to 8000
 PORT=${PORT:-8000}
-exec gunicorn lrms_project.wsgi:application --bind 0.0.0.0:$PORT --workers 2 --timeout 120 --log-level info --access-logfile - --error-logfile -
+# ASGI (uvicorn worker) so live ticket updates can stream (tickets.streams)
+exec gunicorn lrms_project.asgi:application --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT --workers 2 --timeout 120 --log-level info --access-logfile - --error-logfile -
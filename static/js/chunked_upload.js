@@ -0,0 +1,107 @@
+// Legal Request Management System - Chunked, resumable file uploads
+//
+// File inputs marked with data-chunked-upload are sent to the upload
+// endpoints in chunks before the form is submitted; the form then carries
+// only the upload id in the hidden field named by data-upload-field.
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('form').forEach(function(form) {
+        const inputs = form.querySelectorAll('input[type="file"][data-chunked-upload]');
+        if (inputs.length) {
+            form.addEventListener('submit', function(event) {
+                uploadBeforeSubmit(event, form, inputs);
+            });
+        }
+    });
+});
+
+function uploadBeforeSubmit(event, form, inputs) {
+    const pending = Array.from(inputs).filter(function(input) {
+        return input.files.length;
+    });
+    if (!pending.length || !window.crypto || !window.crypto.subtle) {
+        return;  // Nothing to send, or fall back to a regular multipart POST
+    }
+    event.preventDefault();
+
+    const submitButton = form.querySelector('[type="submit"]');
+    if (submitButton) {
+        submitButton.disabled = true;
+    }
+
+    Promise.all(pending.map(function(input) {
+        return uploadFile(form, input).then(function(uploadId) {
+            form.querySelector('input[name="' + input.dataset.uploadField + '"]').value = uploadId;
+            input.value = '';
+        });
+    })).then(function() {
+        form.submit();
+    }).catch(function(error) {
+        if (submitButton) {
+            submitButton.disabled = false;
+        }
+        alert('The file could not be uploaded: ' + error.message);
+    });
+}
+
+async function uploadFile(form, input) {
+    const file = input.files[0];
+    const csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+    const headers = {'X-CSRFToken': csrfToken};
+    const resumeKey = 'chunked-upload:' + [file.name, file.size, file.lastModified].join(':');
+
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    const sha256 = Array.from(new Uint8Array(digest)).map(function(byte) {
+        return byte.toString(16).padStart(2, '0');
+    }).join('');
+
+    // Resume a previous attempt at the same file if the server still has it
+    let session = null;
+    const previousUrl = localStorage.getItem(resumeKey);
+    if (previousUrl) {
+        const response = await fetch(previousUrl, {headers: headers});
+        session = response.ok ? await response.json() : null;
+    }
+    if (!session) {
+        const body = new FormData();
+        body.append('filename', file.name);
+        body.append('size', file.size);
+        body.append('sha256', sha256);
+        session = await expectJson(fetch(input.dataset.chunkedUpload, {method: 'POST', headers: headers, body: body}));
+        localStorage.setItem(resumeKey, session.url);
+    }
+
+    while (session.status === 'open' && session.offset < session.size) {
+        const end = Math.min(session.offset + session.chunk_size, session.size);
+        const response = await fetch(session.url, {
+            method: 'PUT',
+            headers: Object.assign({
+                'Content-Type': 'application/octet-stream',
+                'Content-Range': 'bytes ' + session.offset + '-' + (end - 1) + '/' + session.size,
+            }, headers),
+            body: file.slice(session.offset, end),
+        });
+        const data = await response.json();
+        if (response.status === 409 && data.offset !== undefined) {
+            session.offset = data.offset;  // Realign with what the server stored
+            continue;
+        }
+        if (!response.ok) {
+            throw new Error(data.error);
+        }
+        session = data;
+    }
+
+    const complete = await expectJson(fetch(session.url + 'complete/', {method: 'POST', headers: headers}));
+    localStorage.removeItem(resumeKey);
+    return complete.id;
+}
+
+async function expectJson(request) {
+    const response = await request;
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error);
+    }
+    return data;
+}
@@ -0,0 +1,98 @@
+// Legal Request Management System - Live conversation updates
+
+document.addEventListener('DOMContentLoaded', function() {
+    const messagesContainer = document.querySelector('.conversation-messages');
+    if (!messagesContainer || !messagesContainer.dataset.eventsUrl || !window.EventSource) {
+        return;
+    }
+
+    const source = new EventSource(messagesContainer.dataset.eventsUrl);
+
+    // Streaming is only available on the ASGI server; stop retrying elsewhere
+    source.onerror = function() {
+        if (source.readyState === EventSource.CLOSED) {
+            source.close();
+        }
+    };
+
+    source.addEventListener('message', function(event) {
+        const data = JSON.parse(event.data);
+        if (messagesContainer.querySelector('[data-message-id="' + data.id + '"]')) {
+            return;
+        }
+        // Messages too long to send live are shown by reloading the page
+        if (data.truncated) {
+            window.location.reload();
+            return;
+        }
+        const placeholder = messagesContainer.querySelector('.conversation-empty');
+        if (placeholder) {
+            placeholder.remove();
+        }
+        messagesContainer.appendChild(buildMessage(data));
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    });
+
+    source.addEventListener('status', function(event) {
+        const data = JSON.parse(event.data);
+        const status = document.getElementById('ticket-status');
+        if (status) {
+            status.textContent = data.status_display;
+        }
+    });
+});
+
+function buildMessage(data) {
+    const isAdmin = data.is_admin_message;
+
+    const wrapper = document.createElement('div');
+    wrapper.className = 'message mb-3';
+    wrapper.dataset.messageId = data.id;
+
+    const row = document.createElement('div');
+    row.className = 'd-flex ' + (isAdmin ? 'justify-content-start' : 'justify-content-end');
+
+    const bubble = document.createElement('div');
+    bubble.style.cssText = 'max-width: 70%; padding: 0.75rem; border-radius: 0.25rem;';
+    bubble.style.backgroundColor = isAdmin ? '#e9ecef' : '#2c3e50';
+    bubble.style.color = isAdmin ? '#212529' : '#ffffff';
+
+    const header = document.createElement('div');
+    header.className = 'd-flex justify-content-between align-items-center mb-1';
+    header.style.fontSize = '0.875rem';
+    const sender = document.createElement('span');
+    sender.textContent = data.sender;
+    const sent = document.createElement('span');
+    sent.style.opacity = '0.7';
+    sent.textContent = new Date(data.created_at).toLocaleString();
+    header.appendChild(sender);
+    header.appendChild(sent);
+
+    const body = document.createElement('div');
+    data.message.split(/\n{2,}/).forEach(function(paragraph) {
+        const p = document.createElement('p');
+        paragraph.split('\n').forEach(function(line, index) {
+            if (index > 0) {
+                p.appendChild(document.createElement('br'));
+            }
+            p.appendChild(document.createTextNode(line));
+        });
+        body.appendChild(p);
+    });
+
+    bubble.appendChild(header);
+    bubble.appendChild(body);
+    if (data.attachment) {
+        const attachment = document.createElement('a');
+        attachment.href = data.attachment.url;
+        attachment.style.color = 'inherit';
+        attachment.textContent = data.attachment.name;
+        const icon = document.createElement('i');
+        icon.className = 'bi bi-paperclip me-1';
+        attachment.prepend(icon);
+        bubble.appendChild(attachment);
+    }
+    row.appendChild(bubble);
+    wrapper.appendChild(row);
+    return wrapper;
+}
@@ -0,0 +1,370 @@
+"""
+Bulk imports of users and tickets.
+
+Rows are read from CSV or JSON in a single streaming pass, validated as they
+arrive and written in batches with ``bulk_create``. Each batch commits
+together with its tickets' opening status events, its statistics rollup
+changes (tickets.stats) and the counters on its ``ImportRun``, and those
+counters are the checkpoint: a run that stops part-way resumes after its
+last committed batch. An importer claims its run under a lease that every
+batch renews, so a run is resumed only once it has failed or its importer
+has stopped renewing, and a checkpoint commits only while its importer
+still holds the run. Invalid rows
+are skipped and reported by row number. User passwords are hashed in a
+process pool, because hashing is by far the slowest step. Its processes are
+spawned rather than forked, since imports also run inside the threaded job
+worker.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from itertools import chain, islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+
+from tickets.dashboard_cache import bump_tickets_generation
+from tickets.models import Ticket, UserDailyStats
+from tickets.stats import count_deltas
+from tickets.tracking import record_created
+from .models import ImportRun
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 1000
+
+# How long a run stays claimed by an importer that has not committed a batch
+IMPORT_LEASE = timedelta(minutes=10)
+
+# Row errors kept on the run; later ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.jsonl': 'json',
+    '.ndjson': 'json',
+}
+
+
+class ImportFailed(Exception):
+    pass
+
+
+class RowError(Exception):
+    pass
+
+
+def detect_format(filename):
+    """The import format implied by a file name, or None."""
+    return FORMAT_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def read_rows(fileobj, format):
+    """Yield ``(row number, row)`` for each data row of a binary file, numbering from 1.
+
+    JSON may be a top-level array (read whole) or JSON Lines (streamed). A row
+    that cannot be parsed is yielded as a RowError.
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        if format == 'csv':
+            yield from enumerate(csv.DictReader(text), start=1)
+        elif format == 'json':
+            yield from read_json_rows(text)
+        else:
+            raise ImportFailed(f'Unsupported format {format!r}.')
+    finally:
+        text.detach()
+
+
+def read_json_rows(text):
+    first = text.read(1)
+    while first and first.isspace():
+        first = text.read(1)
+    if first == '[':
+        try:
+            rows = json.loads(first + text.read())
+        except ValueError as e:
+            raise ImportFailed(f'Invalid JSON: {e}') from None
+        for number, row in enumerate(rows, start=1):
+            yield number, row if isinstance(row, dict) else RowError('Each row must be a JSON object.')
+        return
+
+    if not first:
+        return
+    lines = (line for line in chain([first + text.readline()], text) if line.strip())
+    for number, line in enumerate(lines, start=1):
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, RowError(f'Invalid JSON: {e}')
+            continue
+        yield number, row if isinstance(row, dict) else RowError('Each row must be a JSON object.')
+
+
+def clean_fields(model, row, names, defaults=None):
+    """Validate and convert raw row values with the model's own field rules."""
+    defaults = defaults or {}
+    data = {}
+    errors = []
+    for name in names:
+        field = model._meta.get_field(name)
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            if name in defaults:
+                value = defaults[name]
+            elif field.has_default():
+                value = field.get_default()
+            else:
+                value = None if field.null else ''
+        try:
+            value = field.clean(value, None)
+        except ValidationError as e:
+            errors.extend(f'{name}: {message}' for message in e.messages)
+            continue
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        data[name] = value
+    if errors:
+        raise RowError(*errors)
+    return data
+
+
+def row_messages(error):
+    return [str(message) for message in error.args] or ['Invalid row.']
+
+
+class UserImporter:
+    """Creates users; columns are the fields below, with ``password`` in plain text."""
+    fields = ['username', 'email', 'first_name', 'last_name', 'role', 'department']
+
+    def __init__(self, workers=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def hash_passwords(self, passwords):
+        if self.pool is None:
+            return [make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self.pool.map(make_password, passwords, chunksize=chunksize))
+
+    def prepare(self, rows):
+        """Validate a batch and return ``(unsaved users, row errors)``."""
+        errors = []
+        cleaned = []
+        for number, row in rows:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                data = clean_fields(User, row, self.fields)
+            except RowError as e:
+                errors.append({'row': number, 'errors': row_messages(e)})
+                continue
+            cleaned.append((number, data, str(row.get('password') or '').strip() or None))
+
+        # Uniqueness against the database, one query per column, then within the batch
+        taken_usernames = set(User.objects.filter(
+            username__in=[data['username'] for _, data, _ in cleaned]
+        ).values_list('username', flat=True))
+        taken_emails = {email.lower() for email in User.objects.filter(
+            email__in=[data['email'] for _, data, _ in cleaned]
+        ).values_list('email', flat=True)}
+        valid = []
+        for number, data, password in cleaned:
+            messages = []
+            if data['username'] in taken_usernames:
+                messages.append(f"username: {data['username']} already exists.")
+            if data['email'].lower() in taken_emails:
+                messages.append(f"email: {data['email']} already exists.")
+            if messages:
+                errors.append({'row': number, 'errors': messages})
+                continue
+            taken_usernames.add(data['username'])
+            taken_emails.add(data['email'].lower())
+            valid.append((data, password))
+
+        hashes = self.hash_passwords([password for _, password in valid])
+        users = [User(password=hashed, **data) for (data, _), hashed in zip(valid, hashes)]
+        return users, sorted(errors, key=lambda error: error['row'])
+
+    def save(self, users):
+        User.objects.bulk_create(users)
+        UserDailyStats.objects.apply_deltas(count_deltas(UserDailyStats, users))
+        return len(users)
+
+
+class TicketImporter:
+    """Creates tickets for existing users.
+
+    ``user`` names the requester by username or email; the requester's own
+    details fill in blank name, last_name, email and department columns.
+    ``assigned_to`` is the username of a legal admin.
+    """
+    fields = [
+        'name', 'last_name', 'email', 'department', 'company', 'contact_number', 'date_created', 'due_date',
+        'nature_of_engagement', 'details_of_contracting_party', 'remarks', 'status', 'priority', 'admin_comments',
+    ]
+
+    def prepare(self, rows):
+        """Validate a batch and return ``(unsaved tickets, row errors)``."""
+        parsed = [(number, row) for number, row in rows if not isinstance(row, RowError)]
+        requester_keys = {str(row.get('user') or '').strip() for _, row in parsed} - {''}
+        assignee_keys = {str(row.get('assigned_to') or '').strip() for _, row in parsed} - {''}
+        requesters = {}
+        for user in User.objects.filter(models.Q(username__in=requester_keys) | models.Q(email__in=requester_keys)):
+            requesters[user.username] = requesters[user.email] = user
+        assignees = {user.username: user for user in User.objects.filter(username__in=assignee_keys, role='admin')}
+
+        tickets = []
+        errors = []
+        for number, row in rows:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                tickets.append(self.build(row, requesters, assignees))
+            except RowError as e:
+                errors.append({'row': number, 'errors': row_messages(e)})
+        return tickets, errors
+
+    def build(self, row, requesters, assignees):
+        key = str(row.get('user') or '').strip()
+        if key not in requesters:
+            raise RowError(f'user: no user {key!r}.' if key else 'user: This field cannot be blank.')
+        requester = requesters[key]
+        assignee_key = str(row.get('assigned_to') or '').strip()
+        if assignee_key and assignee_key not in assignees:
+            raise RowError(f'assigned_to: no legal admin {assignee_key!r}.')
+
+        data = clean_fields(Ticket, row, self.fields, defaults={
+            'name': requester.first_name,
+            'last_name': requester.last_name,
+            'email': requester.email,
+            'department': requester.department or 'other',
+        })
+        ticket = Ticket(user=requester, assigned_to=assignees.get(assignee_key), **data)
+        # Fields Ticket.save() would have filled in
+        ticket.last_activity_at = ticket.date_created
+        ticket.search_document = ticket.build_search_document()
+        return ticket
+
+    def save(self, tickets):
+        Ticket.objects.bulk_create(tickets)
+        record_created(tickets)
+        bump_tickets_generation(ticket.user_id for ticket in tickets)
+        return len(tickets)
+
+
+IMPORTERS = {
+    'users': UserImporter,
+    'tickets': TicketImporter,
+}
+
+
+def open_importer(kind, workers=None):
+    """The importer for ``kind``, as a context manager releasing whatever it holds."""
+    if kind == 'users':
+        return UserImporter(workers)
+    return nullcontext(IMPORTERS[kind]())
+
+
+def resumable(now=None):
+    """Runs that stopped part-way: failed, or running under an expired lease."""
+    return models.Q(status='failed') | models.Q(status='running', locked_until__lt=now or timezone.now())
+
+
+def unfinished_run(kind, source_sha256):
+    """The latest run of the same file that has not completed, if any."""
+    return ImportRun.objects.filter(
+        kind=kind, source_sha256=source_sha256, status__in=['pending', 'running', 'failed'],
+    ).order_by('-created_at').first()
+
+
+def claim_run(run, lease=IMPORT_LEASE):
+    """Take ``run`` for this importer and return the claim's token.
+
+    Only a pending run, or one that stopped part-way, can be claimed.
+    """
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    claimed = ImportRun.objects.filter(models.Q(status='pending') | resumable(now), pk=run.pk).update(
+        status='running', last_error='', locked_by=token, locked_until=now + lease, updated_at=now,
+    )
+    if not claimed:
+        raise ImportFailed(f'Import #{run.pk} is already running or finished.')
+    run.refresh_from_db()
+    return token
+
+
+def released():
+    return {'locked_by': '', 'locked_until': None, 'updated_at': timezone.now()}
+
+
+def run_import(run, fileobj, batch_size=DEFAULT_BATCH_SIZE, workers=None, progress=None, lease=IMPORT_LEASE):
+    """Import ``fileobj`` for ``run``, starting after its checkpoint.
+
+    ``progress`` is called with the run after each committed batch.
+    """
+    token = claim_run(run, lease)
+    held = ImportRun.objects.filter(pk=run.pk, locked_by=token)
+    reader = read_rows(fileobj, run.format)
+    rows = islice(reader, run.rows_processed, None)
+    try:
+        with open_importer(run.kind, workers) as importer:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                objects, errors = importer.prepare(batch)
+                with transaction.atomic():
+                    # The checkpoint commits with the rows it covers, and only
+                    # while this importer still holds the run; updating it
+                    # first locks the row against a takeover until commit
+                    checkpointed = held.update(
+                        rows_processed=run.rows_processed + len(batch),
+                        created_count=run.created_count + len(objects),
+                        error_count=run.error_count + len(errors),
+                        errors=run.errors + errors[:max(MAX_REPORTED_ERRORS - len(run.errors), 0)],
+                        locked_until=timezone.now() + lease,
+                        updated_at=timezone.now(),
+                    )
+                    if not checkpointed:
+                        raise ImportFailed(f'Import #{run.pk} was taken over by another importer.')
+                    importer.save(objects)
+                run.refresh_from_db()
+                if progress:
+                    progress(run)
+    except BaseException as e:
+        # Also on Ctrl-C, so an interrupted command can be resumed at once
+        held.update(status='failed', last_error=str(e), **released())
+        run.refresh_from_db()
+        raise
+    finally:
+        # Release the file from the reader before the caller closes it
+        reader.close()
+    held.update(status='completed', finished_at=timezone.now(), **released())
+    run.refresh_from_db()
+    return run
@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from system_admin.imports import (
+    DEFAULT_BATCH_SIZE, IMPORTERS, ImportFailed, detect_format, run_import, unfinished_run,
+)
+from system_admin.models import ImportRun
+
+
+def path_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users or tickets from a CSV or JSON file in batches. An interrupted import of the same "
+        "file resumes from its last committed batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS), help='What the file contains.')
+        parser.add_argument('path', help='CSV, JSON array or JSON Lines file.')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            help='File format (default: from the file extension).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows validated and inserted per transaction (default: {DEFAULT_BATCH_SIZE}).',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Processes hashing user passwords (default: one per CPU; 0 or 1 hashes inline).',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Start from the first row even if an earlier import of this file was interrupted or finished.',
+        )
+
+    def handle(self, *args, kind, path, format=None, batch_size=DEFAULT_BATCH_SIZE, workers=None,
+               restart=False, **options):
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+        format = format or detect_format(path)
+        if format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format.')
+
+        sha256 = path_sha256(path)
+        run = None if restart else unfinished_run(kind, sha256)
+        if run is not None and not run.is_resumable():
+            raise CommandError(f'Import #{run.pk} of this file is already queued or running.')
+        elif run is not None:
+            self.stdout.write(f'Resuming import #{run.pk} after row {run.rows_processed}.')
+        elif not restart and ImportRun.objects.filter(kind=kind, source_sha256=sha256, status='completed').exists():
+            raise CommandError('This file has already been imported; pass --restart to import it again.')
+        else:
+            run = ImportRun.objects.create(
+                kind=kind, format=format, source_name=os.path.basename(path), source_sha256=sha256,
+            )
+
+        def progress(run):
+            self.stdout.write(f'{run.rows_processed} rows read, {run.created_count} created, {run.error_count} rejected')
+
+        try:
+            with open(path, 'rb') as source:
+                run_import(run, source, batch_size=batch_size, workers=workers, progress=progress)
+        except ImportFailed as e:
+            raise CommandError(str(e))
+
+        for error in run.errors:
+            self.stderr.write(f"Row {error['row']}: {' '.join(error['errors'])}")
+        if run.error_count > len(run.errors):
+            self.stderr.write(f'... and {run.error_count - len(run.errors)} more rejected rows.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {run.created_count} {kind} from {run.rows_processed} rows ({run.error_count} rejected).'
+        ))
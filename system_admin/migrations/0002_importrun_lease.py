@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_admin', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='locked_by',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='importrun',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
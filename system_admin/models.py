@@ -1,3 +1,62 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class ImportRun(models.Model):
+    """One bulk import of users or tickets; its counters double as the resume checkpoint."""
+    KIND_CHOICES = [
+        ('users', 'Users'),
+        ('tickets', 'Tickets'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('json', 'JSON / JSON Lines'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    # Uploaded through the admin page; command-line imports read a local path instead
+    source = models.FileField(upload_to='imports/', max_length=255, blank=True)
+    source_name = models.CharField(max_length=255)
+    source_sha256 = models.CharField(max_length=64)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Data rows read and committed so far; a resumed run skips this many
+    rows_processed = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    # The first row errors, as {"row": n, "errors": [...]}
+    errors = models.JSONField(default=list, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    # The importer holding the run, until its lease runs out without a committed batch
+    locked_by = models.CharField(max_length=64, blank=True, default='')
+    locked_until = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['kind', 'source_sha256'], name='importrun_source_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} import of {self.source_name} ({self.status})"
+    
+    def is_resumable(self, now=None):
+        """Whether the run stopped part-way: it failed, or its importer's lease ran out."""
+        if self.status == 'failed':
+            return True
+        if self.status != 'running' or self.locked_until is None:
+            return False
+        return self.locked_until < (now or timezone.now())
@@ -0,0 +1,14 @@
+from jobs.queue import task
+
+from .imports import run_import
+from .models import ImportRun
+
+
+@task(name='system_admin.run_import', max_attempts=3, retry_delay=60)
+def run_import_job(run_id):
+    """Run an uploaded import; a retry resumes from the last committed batch."""
+    run = ImportRun.objects.get(pk=run_id)
+    if run.status == 'completed':
+        return
+    with run.source.open('rb') as source:
+        run_import(run, source)
@@ -1,3 +1,318 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import global_settings
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.utils import timezone
+from jobs.models import Job
+from jobs.worker import Worker
+from tickets.models import Ticket
+from tickets.storage import hash_content
+from tickets.tracking import record_created
+from . import views
+from .imports import TicketImporter, UserImporter
+from .models import ImportRun
+
+User = get_user_model()
+
+
+class SystemStatisticsQueryTests(TestCase):
+    """Tests for the system statistics page queries"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.factory = RequestFactory()
+        
+        self.superuser = User.objects.create_superuser(
+            username='root',
+            email='root@example.com',
+            password='testpass123'
+        )
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user',
+            department='hr'
+        )
+        
+        record_created([
+            Ticket.objects.create(
+                user=self.department_user,
+                name=f'User{i}',
+                last_name='Test',
+                email=f'user{i}@example.com',
+                department='hr',
+                nature_of_engagement='for_copy',
+                status=status
+            )
+            for i, status in enumerate(['pending', 'pending', 'completed'])
+        ])
+    
+    def render_view(self, view):
+        """Call a view and return the context it passes to render()"""
+        request = self.factory.get('/')
+        request.user = self.superuser
+        with mock.patch.object(views, 'render', return_value=HttpResponse()) as render:
+            view(request)
+        return render.call_args[0][2]
+    
+    def test_system_statistics_query_count(self):
+        """Test each figure is one aggregate over the daily rollups"""
+        with self.assertNumQueries(5):
+            context = self.render_view(views.system_statistics)
+            stats = context['stats']
+            # Evaluate the lazy GROUP BY querysets inside the assertion
+            list(stats['tickets_by_department'])
+            list(stats['tickets_by_nature'])
+            list(stats['users_by_department'])
+        
+        self.assertEqual(stats['total_tickets'], 3)
+        self.assertEqual(stats['tickets_by_status'], [
+            {'status': 'pending', 'count': 2},
+            {'status': 'completed', 'count': 1},
+        ])
+    
+    def test_system_dashboard_keyset_pagination(self):
+        """Test the user list pages by cursor on (date_joined, id)"""
+        for i in range(30):
+            User.objects.create(username=f'user{i}', email=f'user{i}@example.com')
+        
+        context = self.render_view(views.system_dashboard)
+        first = context['users']
+        self.assertEqual(len(first), 25)
+        self.assertTrue(first.has_next())
+        
+        request = self.factory.get('/', {'after': first.next_cursor})
+        request.user = self.superuser
+        with mock.patch.object(views, 'render', return_value=HttpResponse()) as render:
+            views.system_dashboard(request)
+        second = render.call_args[0][2]['users']
+        
+        self.assertEqual(len(second), 7)
+        self.assertFalse(second.has_next())
+        self.assertFalse({user.pk for user in first} & {user.pk for user in second})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkImportTests(TestCase):
+    """Tests for the batched user and ticket import pipeline"""
+    
+    def setUp(self):
+        """Set up a scratch directory for import files"""
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+    
+    def write_file(self, name, content):
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+    
+    def import_records(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_records', *args, '--workers', '0', stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+    
+    def test_user_csv_import_reports_bad_rows(self):
+        """Test valid users are created in batches and invalid rows are reported by number"""
+        path = self.write_file('users.csv', (
+            'username,email,password,first_name,role,department\n'
+            'alice,alice@example.com,secret-1,Alice,user,hr\n'
+            'bob,not-an-email,secret-2,Bob,user,it\n'
+            'carol,carol@example.com,,Carol,auditor,\n'
+            'admin,new@example.com,secret-3,,user,\n'
+            'dave,dave@example.com,secret-4,Dave,admin,legal\n'
+            'alice,alice2@example.com,secret-5,,user,\n'
+        ))
+        stdout, stderr = self.import_records('users', path, '--batch-size', '4')
+        
+        self.assertIn('Imported 2 users from 6 rows (4 rejected).', stdout)
+        self.assertIn('Row 2: email: Enter a valid email address.', stderr)
+        self.assertIn('Row 3: role:', stderr)
+        self.assertIn('Row 4: username: admin already exists.', stderr)
+        self.assertIn('Row 6: username: alice already exists.', stderr)
+        
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('secret-1'))
+        self.assertEqual((alice.first_name, alice.department), ('Alice', 'hr'))
+        self.assertTrue(User.objects.get(username='dave').is_legal_admin())
+        
+        run = ImportRun.objects.get()
+        self.assertEqual((run.status, run.rows_processed, run.created_count, run.error_count), ('completed', 6, 2, 4))
+    
+    def test_ticket_json_lines_import(self):
+        """Test tickets resolve their requester and assignee and fill derived fields"""
+        requester = User.objects.create_user(
+            username='requester', email='req@example.com', first_name='Rita', last_name='Quinn',
+            department='finance', role='user'
+        )
+        rows = [
+            {'user': 'req@example.com', 'nature_of_engagement': 'for_review', 'status': 'completed',
+             'date_created': '2023-02-01 09:30', 'remarks': 'Supplier agreement', 'assigned_to': 'admin'},
+            {'user': 'requester', 'nature_of_engagement': 'for_copy', 'priority': 'urgent'},
+            {'user': 'nobody', 'nature_of_engagement': 'for_copy'},
+        ]
+        path = self.write_file('tickets.jsonl', '\n'.join(json.dumps(row) for row in rows) + '\n\n{broken\n')
+        stdout, stderr = self.import_records('tickets', path)
+        
+        self.assertIn('Imported 1 tickets from 4 rows (3 rejected).', stdout)
+        self.assertIn('Row 2: priority:', stderr)
+        self.assertIn("Row 3: user: no user 'nobody'.", stderr)
+        self.assertIn('Row 4: Invalid JSON', stderr)
+        
+        ticket = Ticket.objects.get()
+        self.assertEqual(ticket.user, requester)
+        self.assertEqual(ticket.assigned_to, self.admin_user)
+        self.assertEqual((ticket.name, ticket.last_name, ticket.department), ('Rita', 'Quinn', 'finance'))
+        self.assertEqual(ticket.date_created.year, 2023)
+        self.assertEqual(ticket.last_activity_at, ticket.date_created)
+        self.assertIn('supplier agreement', ticket.search_document.lower())
+    
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        """Test a failed import continues after its last committed batch"""
+        User.objects.create_user(
+            username='requester', email='req@example.com', first_name='Rita', last_name='Quinn', role='user'
+        )
+        path = self.write_file('tickets.csv', 'user,nature_of_engagement,remarks\n' + ''.join(
+            f'requester,for_copy,Legacy ticket {i}\n' for i in range(5)
+        ))
+        
+        original_save = TicketImporter.save
+        calls = []
+        
+        def failing_save(importer, tickets):
+            calls.append(len(tickets))
+            if len(calls) == 2:
+                raise RuntimeError('Connection lost')
+            return original_save(importer, tickets)
+        
+        with mock.patch.object(TicketImporter, 'save', failing_save):
+            with self.assertRaises(RuntimeError):
+                self.import_records('tickets', path, '--batch-size', '2')
+        run = ImportRun.objects.get()
+        self.assertEqual((run.status, run.rows_processed, run.last_error), ('failed', 2, 'Connection lost'))
+        self.assertEqual(Ticket.objects.count(), 2)
+        
+        stdout, _ = self.import_records('tickets', path, '--batch-size', '2')
+        self.assertIn(f'Resuming import #{run.pk} after row 2.', stdout)
+        self.assertEqual(
+            sorted(Ticket.objects.values_list('remarks', flat=True)),
+            [f'Legacy ticket {i}' for i in range(5)]
+        )
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.rows_processed, run.created_count), ('completed', 5, 5))
+        
+        # A finished file is not imported twice by accident
+        with self.assertRaises(CommandError):
+            self.import_records('tickets', path)
+    
+    def test_running_import_is_resumed_only_after_its_lease(self):
+        """Test a run another importer holds is neither resumed nor started again"""
+        User.objects.create_superuser(username='root', email='root@example.com', password='testpass123')
+        self.client.login(username='root', password='testpass123')
+        User.objects.create_user(
+            username='requester', email='req@example.com', first_name='Rita', last_name='Quinn', role='user'
+        )
+        path = self.write_file('tickets.csv', 'user,nature_of_engagement\nrequester,for_copy\n')
+        with open(path, 'rb') as source:
+            sha256 = hash_content(File(source))[0]
+        run = ImportRun.objects.create(
+            kind='tickets', format='csv', source_name='tickets.csv', source_sha256=sha256, status='running',
+            locked_by='other', locked_until=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertFalse(run.is_resumable())
+        
+        with self.assertRaisesMessage(CommandError, f'Import #{run.pk} of this file is already queued or running.'):
+            self.import_records('tickets', path)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('system_admin:data_import'), {'resume': run.pk})
+        self.assertFalse(Job.objects.exists())
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.locked_by), ('running', 'other'))
+        
+        # Once the lease runs out, the run is resumed and the old importer fenced off
+        ImportRun.objects.filter(pk=run.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        stdout, _ = self.import_records('tickets', path)
+        self.assertIn(f'Resuming import #{run.pk} after row 0.', stdout)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.created_count, run.locked_by), ('completed', 1, ''))
+    
+    def test_taken_over_import_stops_without_writing(self):
+        """Test an importer that lost its run commits no further batches and leaves the run alone"""
+        User.objects.create_user(
+            username='requester', email='req@example.com', first_name='Rita', last_name='Quinn', role='user'
+        )
+        path = self.write_file('tickets.csv', 'user,nature_of_engagement\n' + 'requester,for_copy\n' * 4)
+        original_prepare = TicketImporter.prepare
+        calls = []
+        
+        def prepare_then_lose_lease(importer, rows):
+            calls.append(len(rows))
+            if len(calls) == 2:
+                ImportRun.objects.update(locked_by='newer')
+            return original_prepare(importer, rows)
+        
+        with mock.patch.object(TicketImporter, 'prepare', prepare_then_lose_lease):
+            with self.assertRaisesMessage(CommandError, 'was taken over by another importer'):
+                self.import_records('tickets', path, '--batch-size', '2')
+        self.assertEqual(Ticket.objects.count(), 2)
+        run = ImportRun.objects.get()
+        self.assertEqual((run.status, run.rows_processed, run.locked_by), ('running', 2, 'newer'))
+    
+    def test_upload_page_queues_import(self):
+        """Test a superuser can upload a file from the mounted import page"""
+        User.objects.create_superuser(username='root', email='root@example.com', password='testpass123')
+        self.client.login(username='root', password='testpass123')
+        url = reverse('system_admin:data_import')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        
+        upload = SimpleUploadedFile('users.csv', b'username,email,password\nerin,erin@example.com,pw-erin\n')
+        with override_settings(MEDIA_ROOT=self.tempdir):
+            read_upload = InMemoryUploadedFile.chunks
+            with mock.patch.object(InMemoryUploadedFile, 'chunks', autospec=True, side_effect=read_upload) as chunks:
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(url, {'kind': 'users', 'file': upload})
+            # Read once to hash it, for both the resume lookup and the storage, and once to store it
+            self.assertEqual(chunks.call_count, 2)
+            self.assertRedirects(response, url)
+            Worker().run(burst=True)
+        
+        run = ImportRun.objects.get()
+        self.assertEqual((run.status, run.created_count), ('completed', 1))
+        self.assertTrue(User.objects.filter(username='erin').exists())
+    
+    # Spawned workers load the settings module, so they hash with its hashers
+    @override_settings(PASSWORD_HASHERS=global_settings.PASSWORD_HASHERS)
+    def test_passwords_hashed_in_process_pool(self):
+        """Test password hashing is spread over worker processes"""
+        with UserImporter(workers=2) as importer:
+            # Never forked from a threaded worker process
+            self.assertEqual(importer.pool._mp_context.get_start_method(), 'spawn')
+            users, errors = importer.prepare([
+                (1, {'username': 'erin', 'email': 'erin@example.com', 'password': 'pw-erin'}),
+                (2, {'username': 'frank', 'email': 'frank@example.com', 'password': 'pw-frank'}),
+            ])
+        self.assertEqual(errors, [])
+        self.assertTrue(users[0].check_password('pw-erin'))
+        self.assertTrue(users[1].check_password('pw-frank'))
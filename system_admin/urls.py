@@ -10,6 +10,7 @@ urlpatterns = [
     path('users/<int:user_id>/edit/', views.user_edit, name='user_edit'),
     path('users/<int:user_id>/delete/', views.user_delete, name='user_delete'),
     path('users/create/', views.user_create, name='user_create'),
+    path('import/', views.data_import, name='data_import'),
     path('settings/', views.system_settings, name='settings'),
     path('statistics/', views.system_statistics, name='statistics'),
 ]
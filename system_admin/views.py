@@ -1,11 +1,19 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 from authentication.models import User
-from tickets.models import Ticket, TicketMessage
+from tickets.models import Ticket, TicketDailyStats, TicketMessage, UserDailyStats
+from tickets.dashboard_cache import dashboard_cache_stats
+from tickets.pagination import KeysetPaginator, base_querystring
+from tickets.storage import hash_content
+from jobs.queue import enqueue_on_commit
+from audit.log import diff, record, snapshot
+from audit.models import AuditEntry
+from .imports import IMPORTERS, detect_format, released, resumable, unfinished_run
+from .models import ImportRun
+from .tasks import run_import_job
 
 User = get_user_model()
 
@@ -13,6 +21,14 @@ def is_superuser(user):
     """Check if user is superuser"""
     return user.is_authenticated and user.is_superuser
 
+def tickets_by_status_rows(ticket_counts):
+    """Turn Ticket.objects.status_counts() into the status/count rows the templates iterate"""
+    return [
+        {'status': status, 'count': ticket_counts[status]}
+        for status, _label in Ticket.STATUS_CHOICES
+        if ticket_counts[status]
+    ]
+
 @login_required
 def system_dashboard(request):
     """Main system admin dashboard - shows all user credentials/profiles"""
@@ -39,24 +55,25 @@ def system_dashboard(request):
     if role_filter:
         users = users.filter(role=role_filter)
     
-    # Statistics
-    total_users = User.objects.count()
-    total_tickets = Ticket.objects.count()
+    # Statistics, from the daily rollups (tickets.stats)
+    total_users = UserDailyStats.objects.total()
+    ticket_counts = TicketDailyStats.objects.status_counts()
+    total_tickets = ticket_counts['total']
     total_messages = TicketMessage.objects.count()
     
     # User statistics by role
-    users_by_role = User.objects.values('role').annotate(count=Count('id'))
+    users_by_role = UserDailyStats.objects.breakdown('role')
     
     # Tickets by status
-    tickets_by_status = Ticket.objects.values('status').annotate(count=Count('id'))
+    tickets_by_status = tickets_by_status_rows(ticket_counts)
     
-    # Pagination
-    paginator = Paginator(users, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the filtered count is only shown, so an estimate will do
+    paginator = KeysetPaginator(users, 25, ordering=('-date_joined', '-id'), approximate=True)
+    page_obj = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
     
     context = {
         'users': page_obj,
+        'page_query': base_querystring(request),
         'total_users': total_users,
         'total_tickets': total_tickets,
         'total_messages': total_messages,
@@ -91,13 +108,13 @@ def user_management(request):
     if role_filter:
         users = users.filter(role=role_filter)
     
-    # Pagination
-    paginator = Paginator(users, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination
+    paginator = KeysetPaginator(users, 20, ordering=('-date_joined', '-id'), approximate=True)
+    page_obj = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
     
     context = {
         'users': page_obj,
+        'page_query': base_querystring(request),
         'search': search,
         'role_filter': role_filter,
         'total_users': User.objects.count(),
@@ -132,6 +149,7 @@ def user_edit(request, user_id):
     user = get_object_or_404(User, id=user_id)
     
     if request.method == 'POST':
+        before = snapshot(user)
         user.username = request.POST.get('username')
         user.email = request.POST.get('email')
         user.first_name = request.POST.get('first_name')
@@ -148,6 +166,7 @@ def user_edit(request, user_id):
             user.set_password(new_password)
         
         user.save()
+        record(AuditEntry.UPDATE, user, diff(before, snapshot(user)))
         
         messages.success(request, f'User {user.username} updated successfully.')
         return redirect('system_admin:user_detail', user_id=user.id)
@@ -171,7 +190,10 @@ def user_delete(request, user_id):
     
     if request.method == 'POST':
         username = user.username
+        user_pk = user.pk
+        before = snapshot(user)
         user.delete()
+        record(AuditEntry.DELETE, user, diff(before, {}), object_id=user_pk)
         messages.success(request, f'User {username} deleted successfully.')
         return redirect('system_admin:user_management')
     
@@ -208,6 +230,7 @@ def user_create(request):
                 is_staff=is_staff,
                 is_superuser=is_superuser
             )
+            record(AuditEntry.CREATE, user, diff({}, snapshot(user)))
             messages.success(request, f'User {username} created successfully.')
             return redirect('system_admin:user_detail', user_id=user.id)
         except Exception as e:
@@ -215,6 +238,57 @@ def user_create(request):
     
     return render(request, 'system_admin/user_create.html')
 
+@login_required
+def data_import(request):
+    """Upload CSV/JSON files of users or tickets to import in the background"""
+    if not request.user.is_superuser:
+        messages.error(request, 'Access denied.')
+        return redirect('tickets:home')
+    
+    if request.method == 'POST':
+        resume_id = request.POST.get('resume')
+        if resume_id:
+            # Only a run that stopped part-way; clearing its lock fences off
+            # an importer that outlived its lease
+            resumed = ImportRun.objects.filter(resumable(), pk=resume_id).update(status='pending', **released())
+            if not resumed:
+                messages.error(request, f'Import #{resume_id} is not interrupted and cannot be resumed.')
+                return redirect('system_admin:data_import')
+            run = ImportRun.objects.get(pk=resume_id)
+            enqueue_on_commit(run_import_job, run_id=run.pk)
+            messages.success(request, f'Import #{run.pk} will resume after row {run.rows_processed}.')
+            return redirect('system_admin:data_import')
+        
+        kind = request.POST.get('kind')
+        upload = request.FILES.get('file')
+        import_format = detect_format(upload.name) if upload else None
+        if kind not in IMPORTERS:
+            messages.error(request, 'Choose whether the file contains users or tickets.')
+        elif upload is None or import_format is None:
+            messages.error(request, 'Upload a .csv, .json, .jsonl or .ndjson file.')
+        else:
+            # Remembered on the upload, so storing it does not hash it again
+            sha256, _size = hash_content(upload)
+            run = unfinished_run(kind, sha256)
+            if run is not None and run.is_resumable():
+                messages.info(request, f'This file matches interrupted import #{run.pk}; resume it below.')
+            elif run is not None:
+                messages.info(request, f'This file is already being imported as import #{run.pk}.')
+            else:
+                run = ImportRun.objects.create(
+                    kind=kind, format=import_format, source=upload, source_name=upload.name,
+                    source_sha256=sha256, created_by=request.user,
+                )
+                enqueue_on_commit(run_import_job, run_id=run.pk, idempotency_key=f'import:{run.pk}')
+                messages.success(request, f'Import #{run.pk} queued.')
+            return redirect('system_admin:data_import')
+    
+    context = {
+        'kind_choices': ImportRun.KIND_CHOICES,
+        'runs': ImportRun.objects.select_related('created_by')[:20],
+    }
+    return render(request, 'system_admin/data_import.html', context)
+
 @login_required
 def system_settings(request):
     """System settings page"""
@@ -231,17 +305,20 @@ def system_statistics(request):
         messages.error(request, 'Access denied.')
         return redirect('tickets:home')
     
-    # Detailed statistics
+    # Detailed statistics, summed from the daily rollups (tickets.stats)
+    ticket_counts = TicketDailyStats.objects.status_counts()
+    user_counts = UserDailyStats.objects.user_counts()
     stats = {
-        'total_users': User.objects.count(),
-        'admin_users': User.objects.filter(role='admin').count(),
-        'regular_users': User.objects.filter(role='user').count(),
-        'superusers': User.objects.filter(is_superuser=True).count(),
-        'total_tickets': Ticket.objects.count(),
-        'tickets_by_status': Ticket.objects.values('status').annotate(count=Count('id')),
-        'tickets_by_department': Ticket.objects.values('department').annotate(count=Count('id')),
-        'tickets_by_nature': Ticket.objects.values('nature_of_engagement').annotate(count=Count('id')),
-        'users_by_department': User.objects.values('department').annotate(count=Count('id')),
+        'total_users': user_counts['total'],
+        'admin_users': user_counts['admin'],
+        'regular_users': user_counts['user'],
+        'superusers': user_counts['superuser'],
+        'total_tickets': ticket_counts['total'],
+        'tickets_by_status': tickets_by_status_rows(ticket_counts),
+        'tickets_by_department': TicketDailyStats.objects.breakdown('department'),
+        'tickets_by_nature': TicketDailyStats.objects.breakdown('nature_of_engagement'),
+        'users_by_department': UserDailyStats.objects.breakdown('department'),
+        'dashboard_cache': dashboard_cache_stats(),
     }
     
     context = {'stats': stats}
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tickets'
+    
+    def ready(self):
+        # Rollup maintenance for deletions and users (tickets.stats)
+        from . import stats  # noqa: F401
+        # Dashboard cache invalidation (tickets.dashboard_cache)
+        from . import dashboard_cache  # noqa: F401
@@ -0,0 +1,136 @@
+"""
+Bulk ticket actions for the legal team.
+
+An action locks the selected tickets, works out which of them it would
+actually change and applies the change to those with one UPDATE, all in a
+single transaction. Only the changed column (and ``date_updated``) is
+written. Status changes are logged (TicketStatusEvent) and moved between
+daily statistics rows (tickets.stats) in the same transaction, then
+announced in bulk: one INSERT of notifications (tickets.notifications) and
+one live event per ticket once the transaction commits. Audit entries go
+into the request's buffer (audit.log), written with one INSERT at the end.
+The owners' cached dashboards are invalidated (tickets.dashboard_cache).
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from audit.log import record
+from audit.models import AuditEntry
+from .dashboard_cache import bump_tickets_generation
+from .events import publish_status
+from .models import STATS_FIELDS, Ticket, TicketDailyStats, TicketStatusEvent
+from .notifications import notify_status_changes
+from .search import SEARCH_FIELDS
+from .stats import count_deltas
+
+User = get_user_model()
+
+ACTION_CHOICES = [
+    ('status', 'Change status'),
+    ('assign', 'Reassign'),
+    ('priority', 'Change priority'),
+    ('close', 'Close'),
+]
+
+# Status set by the "close" action
+CLOSED_STATUS = 'completed'
+
+# Most tickets accepted by one bulk request
+MAX_BULK_TICKETS = 500
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+
+
+class BulkActionError(ValueError):
+    pass
+
+
+def resolve_change(action, value=None):
+    """The column and value an action writes, validated."""
+    if action == 'close':
+        return 'status', CLOSED_STATUS
+    if action == 'status':
+        if value not in dict(Ticket.STATUS_CHOICES):
+            raise BulkActionError('Invalid status.')
+        return 'status', value
+    if action == 'priority':
+        if value not in dict(Ticket._meta.get_field('priority').choices):
+            raise BulkActionError('Invalid priority.')
+        return 'priority', value
+    if action == 'assign':
+        if value in (None, ''):
+            return 'assigned_to_id', None
+        try:
+            assignee = User.objects.get(pk=int(value), role='admin')
+        except (TypeError, ValueError, User.DoesNotExist):
+            raise BulkActionError('Tickets can only be assigned to a legal admin.') from None
+        return 'assigned_to_id', assignee.pk
+    raise BulkActionError('Invalid action.')
+
+
+def apply_bulk_action(ticket_ids, action, value=None, actor=None):
+    """Apply an action to the given tickets and return a result per ticket id.
+
+    Results are ``updated``, ``unchanged`` (already had the value) or
+    ``not_found``, in the order the ids were given.
+    """
+    column, new_value = resolve_change(action, value)
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in ticket_ids))
+    except (TypeError, ValueError):
+        raise BulkActionError('Ticket ids must be integers.') from None
+    if not ids:
+        raise BulkActionError('Select at least one ticket.')
+    if len(ids) > MAX_BULK_TICKETS:
+        raise BulkActionError(f'At most {MAX_BULK_TICKETS} tickets can be changed at once.')
+
+    with transaction.atomic():
+        locked = Ticket.objects.select_for_update().filter(pk__in=ids).order_by()
+        if column == 'status':
+            # Also load the columns the daily rollup counts by
+            locked = locked.only(column, 'user', 'date_created', *STATS_FIELDS)
+            current = {ticket.pk: ticket for ticket in locked}
+            owners = {pk: ticket.user_id for pk, ticket in current.items()}
+            changed = [pk for pk in ids if pk in current and current[pk].status != new_value]
+        else:
+            rows = list(locked.values_list('pk', column, 'user'))
+            current = {pk: value for pk, value, _ in rows}
+            owners = {pk: user_id for pk, _, user_id in rows}
+            changed = [pk for pk in ids if pk in current and current[pk] != new_value]
+        if changed:
+            now = timezone.now()
+            Ticket.objects.filter(pk__in=changed).update(**{column: new_value, 'date_updated': now})
+            bump_tickets_generation(owners[pk] for pk in changed)
+            field = Ticket._meta.get_field(column).name
+            if field in SEARCH_FIELDS:
+                # The UPDATE skipped Ticket.save(), which keeps the search document current
+                Ticket.objects.filter(pk__in=changed).rebuild_search_documents()
+            for pk in changed:
+                old_value = current[pk].status if column == 'status' else current[pk]
+                record(AuditEntry.UPDATE, Ticket(pk=pk), {field: [old_value, new_value]},
+                       object_repr=f'Ticket #{pk}', actor=actor)
+            if column == 'status':
+                before = [current[pk] for pk in changed]
+                TicketStatusEvent.objects.bulk_create([
+                    TicketStatusEvent(ticket_id=ticket.pk, from_status=ticket.status, to_status=new_value,
+                                      changed_by=actor, created_at=now)
+                    for ticket in before
+                ])
+                deltas = count_deltas(TicketDailyStats, before, sign=-1)
+                for ticket in before:
+                    ticket.status = new_value
+                deltas.update(count_deltas(TicketDailyStats, before))
+                TicketDailyStats.objects.apply_deltas(deltas)
+                tickets = list(Ticket.objects.filter(pk__in=changed).select_related('user'))
+                notify_status_changes(tickets, actor)
+                for ticket in tickets:
+                    publish_status(ticket)
+
+    changed = set(changed)
+    return {
+        pk: UPDATED if pk in changed else UNCHANGED if pk in current else NOT_FOUND
+        for pk in ids
+    }
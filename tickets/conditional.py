@@ -0,0 +1,62 @@
+"""
+Conditional GET for ticket pages.
+
+A ticket's validators come from ``date_updated`` (every save and bulk
+action sets it) together with its latest message id and message count,
+which change with every new or deleted message. ``ticket`` must come from
+``Ticket.objects.with_latest_message_id()``.
+
+Pages also depend on who is looking. They mix in the user, the CSRF
+secret their forms are signed with and the navbar unread total, and they
+are never answered with 304 while flash messages are waiting to be shown.
+Their ETags are weak, because masked CSRF tokens make each rendering
+differ byte for byte.
+
+A 304 is decided before any template is rendered.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .conversations import unread_total
+
+
+def make_etag(*parts, weak=False):
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return f'W/{quote_etag(digest)}' if weak else quote_etag(digest)
+
+
+def ticket_validators(ticket, *vary, weak=False):
+    """``(etag, last_modified)`` for one ticket; ``vary`` adds anything else the response depends on."""
+    etag = make_etag(ticket.pk, ticket.date_updated, ticket.latest_message_id, ticket.message_count, *vary, weak=weak)
+    last_modified = max(filter(None, [ticket.date_updated, ticket.last_message_at]))
+    return etag, last_modified
+
+
+def page_vary(request):
+    """What else an HTML page depends on besides the ticket."""
+    csrf_secret = request.META.get('CSRF_COOKIE', '')
+    return request.user.pk, hashlib.sha256(csrf_secret.encode()).hexdigest(), unread_total(request.user)
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 response when the client's copy is current, else None."""
+    if request.method not in ('GET', 'HEAD') or get_messages(request):
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified and int(last_modified.timestamp()),
+    )
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified):
+    """Set ETag and Last-Modified, and make clients revalidate before reusing the response."""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,9 @@
+from django.utils.functional import SimpleLazyObject
+from .conversations import unread_total
+
+
+def unread_messages(request):
+    """Expose the navbar unread message total, computed only if a template uses it."""
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_message_total': SimpleLazyObject(lambda: unread_total(request.user))}
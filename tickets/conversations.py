@@ -0,0 +1,116 @@
+"""
+Conversation loading.
+
+A thread is read newest-first through a keyset window so long conversations
+render the latest messages only and older ones are fetched on demand. Senders
+are joined in the same query, so a window costs one query however many
+messages it holds.
+
+Read state is a single cursor per (ticket, participant): messages from the
+other side with a higher id are unread. Messages the cursor moves past also
+get ``is_read`` set, so the old flag stays current.
+"""
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .dashboard_cache import bump_tickets_generation
+from .models import TicketMessage, TicketReadState
+from .pagination import KeysetPaginator
+
+# Number of messages shown per window
+CONVERSATION_WINDOW = 50
+
+# Seconds the navbar unread total may lag behind new messages
+UNREAD_TOTAL_TIMEOUT = 30
+
+
+class Conversation:
+    """A window of a ticket's messages in chronological order."""
+
+    def __init__(self, ticket, messages, older_cursor, is_latest=True):
+        self.ticket = ticket
+        self.messages = messages
+        self.older_cursor = older_cursor
+        self.is_latest = is_latest
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+    @property
+    def has_older(self):
+        return self.older_cursor is not None
+
+
+def load_conversation(ticket, limit=CONVERSATION_WINDOW, older_than=None):
+    """Load the newest ``limit`` messages of a ticket, or those before cursor ``older_than``."""
+    messages = ticket.messages.select_related('sender')
+    paginator = KeysetPaginator(messages, limit, ordering=('-created_at', '-id'))
+    page = paginator.get_page(after=older_than)
+    return Conversation(ticket, list(reversed(page)), page.next_cursor, is_latest=not page.has_previous())
+
+
+def unread_messages(ticket, user):
+    """Messages on a ticket from the other side that the user has not read yet.
+
+    ``ticket`` must come from ``Ticket.objects.with_read_cursor(user)``.
+    """
+    return ticket.messages.filter(
+        id__gt=ticket.last_read_message_id,
+        is_admin_message=not user.is_legal_admin(),
+    )
+
+
+def mark_conversation_read(ticket, user, conversation):
+    """Advance the user's read cursor to the newest message shown.
+
+    ``ticket`` must come from ``Ticket.objects.with_read_cursor(user)``. Writes
+    an upsert and one UPDATE of the newly read messages, and nothing at all
+    when there is nothing new to read.
+    """
+    if not conversation.is_latest or not conversation.messages:
+        return False
+    # Unread is judged by id, which need not follow created_at order
+    newest = max(message.pk for message in conversation.messages)
+    if newest <= ticket.last_read_message_id:
+        return False
+
+    TicketReadState.objects.bulk_create(
+        [TicketReadState(ticket=ticket, user=user, last_read_message_id=newest, last_read_at=timezone.now())],
+        update_conflicts=True,
+        unique_fields=['ticket', 'user'],
+        update_fields=['last_read_message_id', 'last_read_at'],
+    )
+    ticket.messages.filter(
+        id__gt=ticket.last_read_message_id,
+        id__lte=newest,
+        is_admin_message=not user.is_legal_admin(),
+    ).update(is_read=True)
+    ticket.last_read_message_id = newest
+    cache.delete(unread_total_cache_key(user.pk))
+    bump_tickets_generation([user.pk])
+    return True
+
+
+def unread_total_cache_key(user_id):
+    return f'tickets:unread_total:{user_id}'
+
+
+def count_unread_total(user):
+    """Count unread messages across every ticket the user takes part in, in one query."""
+    messages = TicketMessage.objects.filter(is_admin_message=not user.is_legal_admin())
+    if not user.is_legal_admin():
+        messages = messages.filter(ticket__user=user)
+    cursor = TicketReadState.objects.filter(ticket=OuterRef('ticket'), user=user).values('last_read_message_id')[:1]
+    return messages.filter(id__gt=Coalesce(Subquery(cursor), 0)).count()
+
+
+def unread_total(user):
+    """The user's unread message total, cached briefly per user."""
+    return cache.get_or_set(
+        unread_total_cache_key(user.pk), lambda: count_unread_total(user), UNREAD_TOTAL_TIMEOUT
+    )
@@ -0,0 +1,138 @@
+"""
+Per-user dashboard cache.
+
+A department user's dashboard (counts and page of tickets) is cached under
+the user's "tickets generation", a value in the cache that is replaced
+whenever one of the user's tickets, their messages or the user's read
+cursors change. A new generation makes every older entry unreachable, so
+nothing has to be deleted; those entries simply expire.
+
+The generation is replaced both when the write happens and when its
+transaction commits, so a dashboard computed from the data before the
+commit is never cached under the final generation. Write paths that skip
+model signals (bulk actions, imports, read cursors) call
+``bump_tickets_generation`` themselves.
+
+Generations live in the default cache, which is shared by every worker
+process (authentication.checks refuses a per-process one), so a bump in one
+worker reaches all of them. On the database cache, reading a generation and
+an entry costs as many queries as computing the dashboard, so dashboards
+are not cached there at all (``dashboard_cache_enabled``); use Redis
+(REDIS_URL) to cache them. Hit and miss counts (``dashboard_cache_stats``)
+are kept in memory by each process, so counting costs no cache write.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Ticket, TicketMessage
+
+# Seconds a cached dashboard is kept; bounds staleness from writes that bypass the hooks
+DASHBOARD_CACHE_TIMEOUT = 10 * 60
+
+# This process's hits and misses
+stats = Counter()
+stats_lock = threading.Lock()
+
+
+def dashboard_cache_enabled():
+    """Whether dashboards are cached: not on the database cache, where it saves nothing."""
+    return not isinstance(caches['default'], DatabaseCache)
+
+
+def generation_key(user_id):
+    return f'tickets:generation:{user_id}'
+
+
+def tickets_generation(user_id):
+    """The user's current tickets generation, starting a new one if there is none."""
+    # A time-based value is never reused, even after the key is evicted
+    return cache.get_or_set(generation_key(user_id), time.time_ns, None)
+
+
+def bump_tickets_generation(user_ids):
+    """Start a new tickets generation for each user, now and again on commit."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids or not dashboard_cache_enabled():
+        return
+
+    def bump():
+        generation = time.time_ns()
+        cache.set_many({generation_key(user_id): generation for user_id in user_ids}, None)
+
+    bump()
+    if connection.in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def dashboard_cache_key(user_id, generation, params):
+    digest = hashlib.md5(repr(params).encode(), usedforsecurity=False).hexdigest()
+    return f'tickets:dashboard:{user_id}:{generation}:{digest}'
+
+
+def count(outcome):
+    with stats_lock:
+        stats[outcome] += 1
+
+
+def cached_dashboard(user_id, params, compute):
+    """``compute()``, cached for the user's current tickets generation and ``params``."""
+    if not dashboard_cache_enabled():
+        return compute()
+    key = dashboard_cache_key(user_id, tickets_generation(user_id), params)
+    data = cache.get(key)
+    if data is not None:
+        count('hits')
+        return data
+    count('misses')
+    data = compute()
+    cache.set(key, data, DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def dashboard_cache_stats():
+    """This process's dashboard cache hits and misses since it started or they were reset."""
+    with stats_lock:
+        hits, misses = stats['hits'], stats['misses']
+    return {
+        'enabled': dashboard_cache_enabled(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+    }
+
+
+def reset_dashboard_cache_stats():
+    with stats_lock:
+        stats.clear()
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_tickets_generation([instance.user_id])
+
+
+@receiver(post_save, sender=TicketMessage)
+@receiver(post_delete, sender=TicketMessage)
+def message_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Messages change the ticket's activity columns and unread counts. A
+    # cascade from a ticket or user is covered by the ticket's own signal.
+    if not raw and (origin is None or isinstance(origin, TicketMessage)):
+        bump_tickets_generation([instance.ticket.user_id])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_created(sender, instance, created=False, raw=False, **kwargs):
+    # A new user whose id was used before must not see the old user's entries
+    if created and not raw:
+        bump_tickets_generation([instance.pk])
@@ -0,0 +1,185 @@
+"""
+Document downloads.
+
+Files are served after the view's permission check with a strong ETag taken
+from the content hash stored on the ticket, honouring If-None-Match and
+single byte ranges. Behind nginx (``X-Accel-Redirect``) or Apache/lighttpd
+(``X-Sendfile``) the response only names the file and the proxy streams it,
+so no application worker is held for the transfer. Otherwise the file is
+streamed in 64 KiB blocks; under ASGI they are read from a worker thread
+(tickets.streaming), so a download never sits in memory whole.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header
+
+from .streaming import is_asgi, iterate_in_thread
+
+# Values of settings.TICKET_DOWNLOAD_OFFLOAD
+ACCEL_REDIRECT = 'x-accel-redirect'
+SENDFILE = 'x-sendfile'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_sha256(field_file):
+    """Hex SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    for chunk in field_file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def display_filename(field_file):
+    """The filename a user uploaded, without any storage-specific decoration."""
+    original_filename = getattr(field_file.storage, 'original_filename', None)
+    if original_filename:
+        return original_filename(field_file.name)
+    return os.path.basename(field_file.name)
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` (inclusive) for a single byte range, or None to send the whole file.
+
+    Raises ValueError when the range cannot be satisfied. Multiple ranges are
+    answered with the whole file, which RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range.')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Range not satisfiable.')
+    return start, end
+
+
+class RangeFile:
+    """A window of ``length`` bytes of an open file, starting at ``start``."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class DocumentResponse(FileResponse):
+    """A FileResponse that, with ``asynchronous=True``, reads its blocks from a worker thread."""
+    # Fewer, larger reads for contract-sized files
+    block_size = 64 * 1024
+
+    def __init__(self, *args, asynchronous=False, **kwargs):
+        self.asynchronous = asynchronous
+        super().__init__(*args, **kwargs)
+
+    def _set_streaming_content(self, value):
+        super()._set_streaming_content(value)
+        if self.asynchronous and not self.is_async:
+            # File reads need no database connection, so any worker thread will do
+            self._iterator = iterate_in_thread(self._iterator, thread_sensitive=False)
+            self.is_async = True
+
+
+def offload_response(field_file, filename, content_type):
+    """Hand the transfer to the front proxy, or return None when not configured."""
+    offload = getattr(settings, 'TICKET_DOWNLOAD_OFFLOAD', '')
+    if not offload:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if offload == ACCEL_REDIRECT:
+        prefix = getattr(settings, 'TICKET_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        # Content-addressed names are resolved to the blob holding the bytes
+        blob_name = getattr(field_file.storage, 'blob_name', None)
+        name = blob_name(field_file.name) if blob_name else field_file.name
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name)
+    elif offload == SENDFILE:
+        response['X-Sendfile'] = field_file.path
+    else:
+        raise ValueError(f'Unknown TICKET_DOWNLOAD_OFFLOAD {offload!r}.')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def serve_document(request, field_file, content_hash=''):
+    """Serve a stored file as an attachment.
+
+    ``content_hash`` is the file's stored SHA-256, taken from a content-addressed
+    name when not given; without one the response carries no ETag and
+    conditional requests are ignored.
+    """
+    if not content_hash and hasattr(field_file.storage, 'content_hash'):
+        content_hash = field_file.storage.content_hash(field_file.name)
+    etag = f'"{content_hash}"' if content_hash else None
+    if etag:
+        conditional = get_conditional_response(request, etag=etag)
+        if conditional is not None:
+            conditional['ETag'] = etag
+            return conditional
+
+    filename = display_filename(field_file)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = offload_response(field_file, filename, content_type)
+    if response is None:
+        response = stream_document(request, field_file, filename, content_type, etag)
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def stream_document(request, field_file, filename, content_type, etag):
+    size = field_file.size
+    byte_range = None
+    # A stale If-Range validator means the client's partial copy is outdated
+    if_range = request.headers.get('If-Range')
+    if request.method == 'GET' and (not if_range or (etag and if_range == etag)):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    field_file.open('rb')
+    options = {
+        'as_attachment': True, 'filename': filename, 'content_type': content_type, 'asynchronous': is_asgi(request),
+    }
+    if byte_range is None:
+        response = DocumentResponse(field_file.file, **options)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = DocumentResponse(RangeFile(field_file.file, start, length), status=206, **options)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
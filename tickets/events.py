@@ -0,0 +1,200 @@
+"""
+Ticket event publishing.
+
+Views publish new messages and status changes to a per-ticket channel once
+their transaction commits; the ASGI event stream (tickets.streams) relays
+them to subscribed browsers. The default broker fans events out inside the
+current process; with several worker processes on PostgreSQL,
+``PostgresBroker`` relays every event through LISTEN/NOTIFY so it reaches
+subscribers in all of them.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .downloads import display_filename
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROKER = 'tickets.events.InMemoryBroker'
+
+# Seconds the PostgreSQL listener waits before reconnecting after an error
+RECONNECT_SECONDS = 5
+
+
+class Subscription:
+    """Events published to one channel, queued for a single consumer."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def put(self, event):
+        # Publishers run in sync worker threads; hand the event to the consumer's loop
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """Fan events out to subscribers in this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, event):
+        """Deliver an event to every current subscriber and return how many there were."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        delivered = 0
+        for subscription in subscriptions:
+            try:
+                subscription.put(event)
+            except RuntimeError:
+                # The consumer's event loop has shut down
+                self.unsubscribe(subscription)
+            else:
+                delivered += 1
+        return delivered
+
+
+class PostgresBroker(InMemoryBroker):
+    """Fan events out to subscribers in every process through PostgreSQL LISTEN/NOTIFY.
+
+    Each process listens on one extra connection, opened by a background
+    thread when its first subscriber arrives, and hands what it hears to its
+    own subscribers.
+    """
+    notify_channel = 'ticket_events'
+    # NOTIFY payloads must stay under 8000 bytes
+    max_payload = 7900
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self.listen, name='ticket-events', daemon=True)
+                self._listener.start()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        payload = json.dumps({'channel': channel, 'event': event})
+        if len(payload.encode()) > self.max_payload:
+            # Too long to send whole; subscribers reload the conversation instead
+            event = {**{key: value for key, value in event.items() if key != 'message'}, 'truncated': True}
+            payload = json.dumps({'channel': channel, 'event': event})
+        try:
+            with connections['default'].cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', [self.notify_channel, payload])
+        except DatabaseError:
+            # The change is committed; only the live update is lost
+            logger.exception('Could not publish a ticket event')
+
+    def listen(self):
+        while True:
+            try:
+                self.relay()
+            except Exception:
+                logger.exception('Ticket event listener failed; reconnecting')
+                time.sleep(RECONNECT_SECONDS)
+
+    def relay(self):
+        """Deliver notifications to this process's subscribers until the connection fails."""
+        wrapper = connections['default']
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.notify_channel}')
+            while True:
+                if not select.select([connection], [], [], 60)[0]:
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    data = json.loads(connection.notifies.pop(0).payload)
+                    super().publish(data['channel'], data['event'])
+        finally:
+            connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'TICKET_EVENT_BROKER', DEFAULT_BROKER))()
+
+
+def ticket_channel(ticket_id):
+    return f'ticket:{ticket_id}'
+
+
+def publish_ticket_event(ticket_id, event):
+    """Publish an event for a ticket after the current transaction commits."""
+    transaction.on_commit(lambda: get_broker().publish(ticket_channel(ticket_id), event))
+
+
+def publish_message(message):
+    """Announce a new conversation message to the ticket's subscribers."""
+    sender = message.sender
+    publish_ticket_event(message.ticket_id, {
+        'type': 'message',
+        'id': message.pk,
+        'ticket': message.ticket_id,
+        'is_admin_message': message.is_admin_message,
+        'sender': 'Legal Team' if message.is_admin_message else (sender.first_name or sender.username),
+        'message': message.message,
+        'attachment': {
+            'name': display_filename(message.attachment),
+            # The permission-checked view; media URLs are not served in production
+            'url': reverse('tickets:download_message_attachment', args=[message.ticket_id, message.pk]),
+        } if message.attachment else None,
+        'created_at': message.created_at.isoformat(),
+    })
+
+
+def publish_status(ticket):
+    """Announce a ticket's current status to its subscribers."""
+    publish_ticket_event(ticket.pk, {
+        'type': 'status',
+        'ticket': ticket.pk,
+        'status': ticket.status,
+        'status_display': ticket.get_status_display(),
+    })
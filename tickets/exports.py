@@ -0,0 +1,188 @@
+"""
+Ticket exports.
+
+The admin export takes the dashboard's filters and streams every matching
+ticket as CSV or NDJSON. Rows are read with ``.iterator(chunk_size=...)``
+(a server-side cursor on PostgreSQL) as flat value tuples and written out
+in small buffers, so memory stays flat however many tickets match. Under
+ASGI each buffer is produced in the sync thread and handed over through an
+asynchronous iterator (tickets.streaming), since Django would otherwise
+read a synchronous one to the end before sending anything.
+
+XLSX is available when XlsxWriter is installed. Its constant-memory mode
+flushes each row to a temporary file as it is written; the finished file is
+then streamed from disk like a document download.
+
+Text that a spreadsheet would read as a formula is prefixed with ``'`` in
+the CSV and XLSX files, since requesters write most of the free-text columns.
+"""
+import csv
+import io
+import json
+import tempfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .downloads import DocumentResponse
+from .models import Ticket
+from .streaming import is_asgi, streaming_content
+
+# Rows fetched per database round trip
+CHUNK_SIZE = 2000
+
+# Bytes of CSV/NDJSON buffered before a chunk is sent
+FLUSH_SIZE = 64 * 1024
+
+# (header, field path) for each exported column
+COLUMNS = [
+    ('Ticket #', 'id'),
+    ('Status', 'status'),
+    ('Priority', 'priority'),
+    ('Type', 'nature_of_engagement'),
+    ('First Name', 'name'),
+    ('Last Name', 'last_name'),
+    ('Email', 'email'),
+    ('Department', 'department'),
+    ('Company', 'company'),
+    ('Contact Number', 'contact_number'),
+    ('Assigned To', 'assigned_to__username'),
+    ('Created', 'date_created'),
+    ('Due Date', 'due_date'),
+    ('Updated', 'date_updated'),
+    ('Messages', 'message_count'),
+    ('Last Activity', 'last_activity_at'),
+    ('Remarks', 'remarks'),
+    ('Admin Comments', 'admin_comments'),
+]
+
+# Leading characters that make a spreadsheet evaluate a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def display_maps():
+    """Choice labels for the coded columns, keyed by field path."""
+    return {
+        path: dict(Ticket._meta.get_field(path).choices)
+        for _, path in COLUMNS if '__' not in path and Ticket._meta.get_field(path).choices
+    }
+
+
+def export_rows(tickets):
+    """Yield one tuple of display values per ticket, streamed from the database."""
+    paths = [path for _, path in COLUMNS]
+    labels = display_maps()
+    decoders = [labels.get(path) for path in paths]
+    for row in tickets.values_list(*paths).iterator(chunk_size=CHUNK_SIZE):
+        yield tuple(
+            decoder.get(value, value) if decoder and value is not None else value
+            for decoder, value in zip(decoders, row)
+        )
+
+
+def spreadsheet_safe(value):
+    """``value``, prefixed so spreadsheets show it as text rather than run it as a formula."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def buffered(lines):
+    """Join small strings into chunks of roughly FLUSH_SIZE bytes."""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_lines(tickets):
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def line(values):
+        writer.writerow(values)
+        value = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return value
+
+    yield line([header for header, _ in COLUMNS])
+    for row in export_rows(tickets):
+        yield line(['' if value is None else spreadsheet_safe(value) for value in row])
+
+
+def ndjson_lines(tickets):
+    keys = [path.replace('__', '_') for _, path in COLUMNS]
+    encoder = DjangoJSONEncoder()
+    for row in export_rows(tickets):
+        yield encoder.encode(dict(zip(keys, row))) + '\n'
+
+
+def write_xlsx(tickets, fileobj):
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise ExportUnavailable('XLSX export requires the XlsxWriter package.') from None
+
+    workbook = xlsxwriter.Workbook(fileobj, {'constant_memory': True, 'remove_timezone': True})
+    sheet = workbook.add_worksheet('Tickets')
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm'})
+    sheet.write_row(0, 0, [header for header, _ in COLUMNS])
+    for row_number, row in enumerate(export_rows(tickets), start=1):
+        for column, value in enumerate(row):
+            if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+                sheet.write_datetime(row_number, column, timezone.make_naive(value), date_format)
+            elif isinstance(value, str):
+                sheet.write_string(row_number, column, spreadsheet_safe(value))
+            elif value is not None:
+                sheet.write(row_number, column, value)
+    workbook.close()
+
+
+def export_filename(extension):
+    return f"tickets-{timezone.localtime():%Y%m%d-%H%M}.{extension}"
+
+
+def export_response(request, tickets, export_format):
+    """A response streaming ``tickets`` in the given format, suited to the server handling ``request``.
+
+    Raises ExportUnavailable when the format's optional dependency is missing.
+    """
+    content_type, extension = FORMATS[export_format]
+    filename = export_filename(extension)
+    if export_format == 'xlsx':
+        fileobj = tempfile.TemporaryFile()
+        try:
+            write_xlsx(tickets, fileobj)
+        except BaseException:
+            fileobj.close()
+            raise
+        fileobj.seek(0)
+        return DocumentResponse(
+            fileobj, as_attachment=True, filename=filename, content_type=content_type, asynchronous=is_asgi(request),
+        )
+
+    lines = csv_lines(tickets) if export_format == 'csv' else ndjson_lines(tickets)
+    response = StreamingHttpResponse(
+        streaming_content(request, buffered(lines)), content_type=f'{content_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
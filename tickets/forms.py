@@ -1,11 +1,72 @@
 from django import forms
 from django.contrib.auth import get_user_model
-from .models import Ticket, TicketMessage
+from django.urls import reverse
+from .bulk import ACTION_CHOICES
+from .models import NotificationPreference, Ticket, TicketMessage, UploadSession
+from .reports import INTERVALS
+from .search import search_tickets
+from .uploads import discard_upload, open_upload
 
 User = get_user_model()
 
 
-class TicketForm(forms.ModelForm):
+class ChunkedUploadMixin:
+    """Let a form take a completed chunked upload (tickets.uploads) in place of a file field.
+
+    ``upload_fields`` maps each hidden upload-id field to the file field it fills.
+    """
+    upload_fields = {}
+    
+    def __init__(self, *args, user=None, **kwargs):
+        self.upload_user = user
+        self.upload_sessions = []
+        super().__init__(*args, **kwargs)
+        for upload_field, file_field in self.upload_fields.items():
+            self.fields[upload_field] = forms.UUIDField(required=False, widget=forms.HiddenInput)
+            # static/js/chunked_upload.js sends files from these inputs in chunks
+            self.fields[file_field].widget.attrs.update({
+                'data-chunked-upload': reverse('tickets:create_upload'),
+                'data-upload-field': upload_field,
+            })
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        for upload_field, file_field in self.upload_fields.items():
+            upload_id = cleaned_data.get(upload_field)
+            if not upload_id or cleaned_data.get(file_field):
+                continue
+            session = UploadSession.objects.filter(pk=upload_id, user=self.upload_user, status='complete').first()
+            if session is None:
+                self.add_error(upload_field, 'The uploaded file is incomplete or has expired. Please upload it again.')
+                continue
+            cleaned_data[file_field] = upload = open_upload(session)
+            self.upload_sessions.append((session, upload))
+        return cleaned_data
+    
+    def full_clean(self):
+        super().full_clean()
+        if self._errors:
+            # Nothing will be saved; the sessions stay for the next submission
+            self.close_uploads()
+    
+    def close_uploads(self):
+        """Close the files opened for attached uploads, keeping their sessions."""
+        for _session, upload in self.upload_sessions:
+            upload.close()
+    
+    def discard_uploads(self):
+        """Remove the temporary files of uploads attached by this form; call after saving."""
+        try:
+            self.close_uploads()
+        finally:
+            for session, _upload in self.upload_sessions:
+                discard_upload(session)
+            self.upload_sessions = []
+
+
+class TicketForm(ChunkedUploadMixin, forms.ModelForm):
+    upload_fields = {'document_upload': 'document_attached'}
+    
     class Meta:
         model = Ticket
         fields = [
@@ -29,7 +90,7 @@ class TicketForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
-        super().__init__(*args, **kwargs)
+        super().__init__(*args, user=user, **kwargs)
         
         # Auto-fill and disable user information if available
         if user:
@@ -81,7 +142,9 @@ class TicketForm(forms.ModelForm):
         return cleaned_data
 
 
-class TicketUpdateForm(forms.ModelForm):
+class TicketUpdateForm(ChunkedUploadMixin, forms.ModelForm):
+    upload_fields = {'reviewed_document_upload': 'reviewed_document'}
+    
     class Meta:
         model = Ticket
         fields = ['status', 'admin_comments', 'reviewed_document', 'assigned_to', 'priority']
@@ -122,18 +185,110 @@ class TicketFilterForm(forms.Form):
     )
     search = forms.CharField(
         required=False,
-        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search by ticket ID or user name'})
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search by ticket ID, name, email or message'})
+    )
+    sort = forms.ChoiceField(
+        choices=[('', 'Newest'), ('activity', 'Recent activity')],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    
+    def filter_queryset(self, tickets):
+        """Apply the submitted filters to a Ticket queryset (call after is_valid())."""
+        for field, lookup in [('status', 'status'), ('department', 'department'), ('company', 'company'),
+                              ('nature_of_engagement', 'nature_of_engagement')]:
+            value = self.cleaned_data.get(field)
+            if value:
+                tickets = tickets.filter(**{lookup: value})
+        search = self.cleaned_data.get('search')
+        if search:
+            tickets = search_tickets(tickets, search)
+        return tickets
+
+
+class TicketBulkActionForm(forms.Form):
+    action = forms.ChoiceField(
+        choices=[('', 'Bulk action...')] + ACTION_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    status = forms.ChoiceField(
+        choices=[('', 'Status...')] + Ticket.STATUS_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
     )
+    priority = forms.ChoiceField(
+        choices=[('', 'Priority...')] + Ticket._meta.get_field('priority').choices,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    assigned_to = forms.ModelChoiceField(
+        queryset=User.objects.filter(role='admin'),
+        required=False,
+        empty_label='Unassigned',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+        if action in ('status', 'priority') and not cleaned_data.get(action):
+            self.add_error(action, f'Choose a {action} to apply.')
+        return cleaned_data
+    
+    def action_value(self):
+        """The value the chosen action applies, as accepted by tickets.bulk."""
+        action = self.cleaned_data['action']
+        if action == 'assign':
+            assignee = self.cleaned_data.get('assigned_to')
+            return assignee.pk if assignee else None
+        return self.cleaned_data.get(action)
 
 
-class TicketMessageForm(forms.ModelForm):
+class TicketMessageForm(ChunkedUploadMixin, forms.ModelForm):
+    upload_fields = {'attachment_upload': 'attachment'}
+    
     class Meta:
         model = TicketMessage
-        fields = ['message']
+        fields = ['message', 'attachment']
         widgets = {
             'message': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 3,
                 'placeholder': 'Type your message here...'
-            })
-        }
\ No newline at end of file
+            }),
+            'attachment': forms.FileInput(attrs={'class': 'form-control'}),
+        }
+
+
+class NotificationPreferenceForm(forms.ModelForm):
+    class Meta:
+        model = NotificationPreference
+        fields = ['email_status_changes', 'email_messages', 'digest_minutes']
+        labels = {
+            'email_status_changes': 'Email me when a ticket changes status',
+            'email_messages': 'Email me about new messages',
+            'digest_minutes': 'Send updates',
+        }
+        widgets = {
+            'email_status_changes': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'email_messages': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'digest_minutes': forms.Select(attrs={'class': 'form-control'}),
+        }
+
+
+class TicketReportForm(forms.Form):
+    interval = forms.ChoiceField(choices=[(interval, interval.title()) for interval in INTERVALS], required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    department = forms.ChoiceField(choices=[('', 'All Departments')] + Ticket.DEPARTMENT_CHOICES, required=False)
+    nature_of_engagement = forms.ChoiceField(choices=[('', 'All Types')] + Ticket.NATURE_CHOICES, required=False)
+    
+    def report_options(self):
+        """Keyword arguments for reports.build_report (call after is_valid())."""
+        data = self.cleaned_data
+        return {
+            'interval': data.get('interval') or 'week',
+            'start': data.get('start'),
+            'end': data.get('end'),
+            'filters': {field: data.get(field) for field in ('department', 'nature_of_engagement')},
+        }
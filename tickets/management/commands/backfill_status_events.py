@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tickets.models import Ticket, TicketStatusEvent
+from tickets.reports import bump_report_generation
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed one status event for each ticket that has none, from the ticket's current status. "
+        "Safe to run again; tickets that already have events are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Tickets seeded per INSERT (default: 1000).',
+        )
+
+    def handle(self, *args, batch_size=1000, **options):
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        default_status = Ticket._meta.get_field('status').get_default()
+        seeded = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                Ticket.objects.filter(pk__gt=last_pk, status_events__isnull=True).order_by('pk')
+                .values_list('pk', 'status', 'date_created', 'date_updated')[:batch_size]
+            )
+            if not rows:
+                break
+            # Tickets still in their first status have been in it since creation; for the
+            # rest the last update is the best available guess at when they reached it
+            with transaction.atomic():
+                TicketStatusEvent.objects.bulk_create(
+                    TicketStatusEvent(
+                        ticket_id=pk, to_status=status,
+                        created_at=date_created if status == default_status else date_updated,
+                    )
+                    for pk, status, date_created, date_updated in rows
+                )
+            seeded += len(rows)
+            last_pk = rows[-1][0]
+
+        if seeded:
+            # The seeded events are dated in the past, in report buckets that may be cached
+            bump_report_generation()
+        self.stdout.write(self.style.SUCCESS(f'Seeded status events for {seeded} ticket(s).'))
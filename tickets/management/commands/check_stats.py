@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.stats import ROLLUPS, differences, rebuild
+
+
+class Command(BaseCommand):
+    help = "Verify the daily statistics rollups against the tickets and users tables, or rebuild them with --repair."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Rebuild every rollup that disagrees with its table.',
+        )
+        parser.add_argument(
+            '--rollup',
+            choices=sorted(ROLLUPS),
+            action='append',
+            help='Only check this rollup (repeatable; default: all).',
+        )
+
+    def handle(self, *args, repair=False, rollup=None, **options):
+        failed = []
+        for name in rollup or sorted(ROLLUPS):
+            model, source = ROLLUPS[name]
+            mismatches = differences(model, source)
+            if not mismatches:
+                self.stdout.write(f'{name}: rollup matches the live data.')
+                continue
+
+            for key, stored, live in mismatches[:20]:
+                day, *dimensions = key
+                self.stdout.write(f"{name}: {day} {' / '.join(str(value) or '-' for value in dimensions)}: "
+                                  f"rollup {stored}, live {live}")
+            if len(mismatches) > 20:
+                self.stdout.write(f'{name}: ... and {len(mismatches) - 20} more.')
+            if repair:
+                rows = rebuild(model, source)
+                self.stdout.write(self.style.WARNING(f'{name}: rebuilt rollup ({rows} rows).'))
+            else:
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f"Rollups out of date: {', '.join(failed)}. Run with --repair to rebuild them.")
+        self.stdout.write(self.style.SUCCESS('Statistics rollups are consistent.'))
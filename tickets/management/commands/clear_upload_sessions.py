@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.uploads import clear_expired_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete chunked upload sessions, and their partial files, that have not been touched recently."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age-hours',
+            type=float,
+            default=24,
+            help='Discard sessions idle for longer than this (default: 24).',
+        )
+
+    def handle(self, *args, max_age_hours=24, **options):
+        if max_age_hours < 0:
+            raise CommandError('--max-age-hours must not be negative.')
+        cleared = clear_expired_uploads(max_age=timedelta(hours=max_age_hours))
+        self.stdout.write(self.style.SUCCESS(f'Cleared {cleared} upload session(s).'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized message counters on tickets, or verify them with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report tickets whose counters are out of date; exit with an error if any are.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of tickets recomputed per UPDATE (default: 1000).',
+        )
+
+    def handle(self, *args, check=False, batch_size=1000, **options):
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        if check:
+            stale = list(Ticket.objects.with_stale_activity().order_by('pk').values_list('pk', flat=True))
+            if stale:
+                shown = ', '.join(f'#{pk}' for pk in stale[:20])
+                more = f' and {len(stale) - 20} more' if len(stale) > 20 else ''
+                raise CommandError(f'{len(stale)} ticket(s) have stale activity counters: {shown}{more}.')
+            self.stdout.write(self.style.SUCCESS('All ticket activity counters are up to date.'))
+            return
+
+        # Walk the primary key in ranges so each UPDATE locks a bounded set of rows
+        updated = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                Ticket.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += Ticket.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).refresh_activity()
+            last_pk = pks[-1]
+
+        stale = Ticket.objects.with_stale_activity().count()
+        if stale:
+            raise CommandError(f'Recomputed {updated} ticket(s) but {stale} changed meanwhile; run the command again.')
+        self.stdout.write(self.style.SUCCESS(f'Recomputed activity counters for {updated} ticket(s).'))
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from tickets.storage import ContentAddressedStorage, reconcile_ref_counts, sweep_blobs
+
+
+class Command(BaseCommand):
+    help = "Reconcile stored file reference counts and delete blobs no upload references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Keep unreferenced blobs this long before deleting them (default: 24).',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing or deleting anything.',
+        )
+
+    def handle(self, *args, grace_hours=24, dry_run=False, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not a ContentAddressedStorage.')
+        if grace_hours < 0:
+            raise CommandError('--grace-hours must not be negative.')
+
+        fixed = reconcile_ref_counts(dry_run=dry_run)
+        freed = sweep_blobs(default_storage, grace=timedelta(hours=grace_hours), dry_run=dry_run)
+
+        prefix = 'Would correct' if dry_run else 'Corrected'
+        self.stdout.write(f'{prefix} {fixed} reference count(s).')
+        verb = 'Would free' if dry_run else 'Freed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {filesizeformat(freed)}.'))
@@ -0,0 +1,77 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:35
+
+from django.db import migrations, models
+
+SEARCH_INDEX_NAME = 'ticket_search_gin_idx'
+
+# Frozen copies of tickets.search as of this migration
+SEARCH_FIELDS = ['name', 'last_name', 'email', 'remarks', 'details_of_contracting_party']
+SEARCH_CONFIG = 'english'
+
+# Tickets whose documents are built and written together
+BATCH_SIZE = 500
+
+
+def build_search_document(ticket, message_bodies=()):
+    parts = [getattr(ticket, field) or '' for field in SEARCH_FIELDS]
+    parts.extend(message_bodies)
+    return ' '.join(part for part in parts if part)
+
+
+def search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    return GinIndex(SearchVector('search_document', config=SEARCH_CONFIG), name=SEARCH_INDEX_NAME)
+
+
+def backfill_search_document(apps, schema_editor):
+    """Fill in the documents BATCH_SIZE tickets at a time, reading only those tickets' messages."""
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketMessage = apps.get_model('tickets', 'TicketMessage')
+
+    last_pk = 0
+    while True:
+        batch = list(Ticket.objects.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        bodies = {}
+        messages = (
+            TicketMessage.objects.filter(ticket_id__in=[ticket.pk for ticket in batch])
+            .order_by('ticket_id', 'created_at').values_list('ticket_id', 'message')
+        )
+        for ticket_id, body in messages.iterator(chunk_size=BATCH_SIZE):
+            bodies.setdefault(ticket_id, []).append(body)
+        for ticket in batch:
+            ticket.search_document = build_search_document(ticket, bodies.get(ticket.pk, ()))
+        Ticket.objects.bulk_update(batch, ['search_document'])
+
+
+def create_search_index(apps, schema_editor):
+    # GIN indexes on tsvector only exist on PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('tickets', 'Ticket'), search_index())
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('tickets', 'Ticket'), search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_ticket_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_read_states(apps, schema_editor):
+    """Seed read cursors from the old per-message is_read flags.
+
+    Requesters read admin messages; user messages were marked read by whichever
+    legal admin opened the thread, so every admin inherits that cursor.
+    """
+    TicketMessage = apps.get_model('tickets', 'TicketMessage')
+    TicketReadState = apps.get_model('tickets', 'TicketReadState')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    now = django.utils.timezone.now()
+
+    read_messages = TicketMessage.objects.filter(is_read=True).order_by()
+
+    states = [
+        TicketReadState(ticket_id=row['ticket'], user_id=row['ticket__user'],
+                        last_read_message_id=row['last'], last_read_at=now)
+        for row in read_messages.filter(is_admin_message=True)
+        .values('ticket', 'ticket__user').annotate(last=models.Max('id'))
+    ]
+
+    admin_ids = list(User.objects.filter(role='admin').values_list('id', flat=True))
+    for row in read_messages.filter(is_admin_message=False).values('ticket').annotate(last=models.Max('id')):
+        states.extend(
+            TicketReadState(ticket_id=row['ticket'], user_id=admin_id,
+                            last_read_message_id=row['last'], last_read_at=now)
+            for admin_id in admin_ids
+        )
+
+    TicketReadState.objects.bulk_create(states, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_ticketmessage_window_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.PositiveBigIntegerField(default=0)),
+                ('last_read_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='tickets.ticket')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ticketreadstate',
+            constraint=models.UniqueConstraint(fields=('ticket', 'user'), name='unique_ticket_read_state'),
+        ),
+        migrations.RunPython(backfill_read_states, migrations.RunPython.noop),
+    ]
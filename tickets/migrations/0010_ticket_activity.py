@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:52
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_activity(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketMessage = apps.get_model('tickets', 'TicketMessage')
+
+    messages = TicketMessage.objects.filter(ticket=models.OuterRef('pk')).order_by()
+    latest = messages.order_by('-created_at', '-id')
+    Ticket.objects.update(
+        message_count=Coalesce(
+            models.Subquery(messages.values('ticket').annotate(count=models.Count('id')).values('count')), 0
+        ),
+        last_message_at=models.Subquery(latest.values('created_at')[:1]),
+        last_message_by_admin=models.Subquery(latest.values('is_admin_message')[:1]),
+        last_activity_at=Coalesce(models.Subquery(latest.values('created_at')[:1]), 'date_created'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_ticketreadstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='last_message_by_admin',
+            field=models.BooleanField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['-last_activity_at', '-id'], name='ticket_activity_idx'),
+        ),
+        migrations.RunPython(backfill_activity, migrations.RunPython.noop),
+    ]
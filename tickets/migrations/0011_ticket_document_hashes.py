@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+from tickets.downloads import file_sha256
+
+
+def backfill_document_hashes(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+
+    tickets = Ticket.objects.filter(models.Q(document_attached__gt='') | models.Q(reviewed_document__gt=''))
+    for ticket in tickets.order_by('pk').iterator(chunk_size=200):
+        for file_field, hash_field in (('document_attached', 'document_attached_sha256'),
+                                       ('reviewed_document', 'reviewed_document_sha256')):
+            field_file = getattr(ticket, file_field)
+            if not field_file:
+                continue
+            try:
+                setattr(ticket, hash_field, file_sha256(field_file))
+            except FileNotFoundError:
+                # Served without an ETag until the file is uploaded again
+                continue
+        Ticket.objects.filter(pk=ticket.pk).update(
+            document_attached_sha256=ticket.document_attached_sha256,
+            reviewed_document_sha256=ticket.reviewed_document_sha256,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0010_ticket_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='document_attached_sha256',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='reviewed_document_sha256',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_document_hashes, migrations.RunPython.noop),
+    ]
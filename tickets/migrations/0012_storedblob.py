@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0011_ticket_document_hashes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='document_attached',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to='documents/'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='reviewed_document',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to='reviewed_documents/'),
+        ),
+        migrations.AlterField(
+            model_name='ticketmessage',
+            name='attachment',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to='message_attachments/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('ref_count', 0)), fields=['released_at'], name='blob_unreferenced_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollup(source, rollup, date_field, dimensions):
+    rows = (
+        source.objects.order_by().annotate(day=TruncDate(date_field))
+        .values('day', *dimensions).annotate(count=models.Count('pk'))
+    )
+    counts = {}
+    for row in rows.iterator():
+        key = (row['day'], *('' if row[field] is None else row[field] for field in dimensions))
+        counts[key] = counts.get(key, 0) + row['count']
+    rollup.objects.bulk_create(
+        rollup(count=count, **dict(zip(['day', *dimensions], key))) for key, count in counts.items()
+    )
+
+
+def backfill_daily_stats(apps, schema_editor):
+    backfill_rollup(
+        apps.get_model('tickets', 'Ticket'), apps.get_model('tickets', 'TicketDailyStats'),
+        'date_created', ['status', 'department', 'company', 'nature_of_engagement'],
+    )
+    backfill_rollup(
+        apps.get_model(settings.AUTH_USER_MODEL), apps.get_model('tickets', 'UserDailyStats'),
+        'date_joined', ['role', 'department', 'is_superuser'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0014_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('status', models.CharField(max_length=20)),
+                ('department', models.CharField(max_length=20)),
+                ('company', models.CharField(blank=True, default='', max_length=20)),
+                ('nature_of_engagement', models.CharField(max_length=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('role', models.CharField(max_length=10)),
+                ('department', models.CharField(blank=True, default='', max_length=20)),
+                ('is_superuser', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ticketdailystats',
+            constraint=models.UniqueConstraint(fields=('day', 'status', 'department', 'company', 'nature_of_engagement'), name='unique_ticket_daily_stats'),
+        ),
+        migrations.AddConstraint(
+            model_name='userdailystats',
+            constraint=models.UniqueConstraint(fields=('day', 'role', 'department', 'is_superuser'), name='unique_user_daily_stats'),
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
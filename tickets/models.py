@@ -1,9 +1,115 @@
-from django.db import models
+import uuid
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce, Concat, Lead
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from .downloads import display_filename
+from .search import SEARCH_FIELDS, build_search_document
+from .storage import hash_content, release_file
 
 User = get_user_model()
 
+# Statuses that still need work from the legal team
+OPEN_STATUSES = ['pending', 'in_progress']
+
+# File fields and the columns storing their SHA-256, used as download ETags
+HASHED_FILE_FIELDS = {
+    'document_attached': 'document_attached_sha256',
+    'reviewed_document': 'reviewed_document_sha256',
+}
+
+# Ticket columns kept in step with its messages (see TicketMessage.save)
+ACTIVITY_FIELDS = ['message_count', 'last_message_at', 'last_message_by_admin', 'last_activity_at']
+
+# Ticket columns counted per creation day by TicketDailyStats
+STATS_FIELDS = ['status', 'department', 'company', 'nature_of_engagement']
+
+
+class TicketQuerySet(models.QuerySet):
+    def status_counts(self):
+        """Return the total and per-status counts for this queryset in a single query."""
+        aggregates = {'total': models.Count('id')}
+        for status, _label in self.model.STATUS_CHOICES:
+            aggregates[status] = models.Count('id', filter=models.Q(status=status))
+        return self.order_by().aggregate(**aggregates)
+    
+    def with_read_cursor(self, user):
+        """Annotate each ticket with ``last_read_message_id`` for the given user (0 if never read)."""
+        return self.annotate(last_read_message_id=Coalesce(
+            models.Subquery(
+                TicketReadState.objects.filter(ticket=models.OuterRef('pk'), user=user)
+                .values('last_read_message_id')[:1]
+            ),
+            0,
+        ))
+    
+    def with_unread_count(self, user):
+        """Annotate each ticket with ``unread_count``: messages from the other side past the user's read cursor."""
+        unread = (
+            TicketMessage.objects.filter(
+                ticket=models.OuterRef('pk'),
+                is_admin_message=not user.is_legal_admin(),
+                id__gt=models.OuterRef('last_read_message_id'),
+            )
+            .order_by().values('ticket')
+            .annotate(count=models.Count('id')).values('count')
+        )
+        return self.with_read_cursor(user).annotate(
+            unread_count=Coalesce(models.Subquery(unread), 0)
+        )
+    
+    def with_latest_message_id(self):
+        """Annotate each ticket with ``latest_message_id`` (None without messages)."""
+        return self.annotate(latest_message_id=models.Subquery(
+            TicketMessage.objects.filter(ticket=models.OuterRef('pk')).order_by('-id').values('id')[:1]
+        ))
+    
+    def rebuild_search_documents(self):
+        """Rebuild the stored search document of every ticket in this queryset.
+        
+        For writes that bypass Ticket.save(), such as ``QuerySet.update()``.
+        """
+        tickets = list(self.order_by().only('pk', *SEARCH_FIELDS))
+        bodies = {}
+        messages = TicketMessage.objects.filter(ticket__in=[ticket.pk for ticket in tickets])
+        for ticket_id, body in messages.order_by('created_at', 'id').values_list('ticket_id', 'message'):
+            bodies.setdefault(ticket_id, []).append(body)
+        for ticket in tickets:
+            ticket.search_document = build_search_document(ticket, bodies.get(ticket.pk, ()))
+        Ticket.objects.bulk_update(tickets, ['search_document'], batch_size=500)
+        return len(tickets)
+    
+    def computed_activity(self):
+        """Expressions recomputing the denormalized activity fields from ``TicketMessage``."""
+        messages = TicketMessage.objects.filter(ticket=models.OuterRef('pk')).order_by()
+        latest = messages.order_by('-created_at', '-id')
+        return {
+            'message_count': Coalesce(
+                models.Subquery(messages.values('ticket').annotate(count=models.Count('id')).values('count')), 0
+            ),
+            'last_message_at': models.Subquery(latest.values('created_at')[:1]),
+            'last_message_by_admin': models.Subquery(latest.values('is_admin_message')[:1]),
+            'last_activity_at': Coalesce(models.Subquery(latest.values('created_at')[:1]), 'date_created'),
+        }
+    
+    def refresh_activity(self):
+        """Recompute the activity fields of every ticket in this queryset with a single UPDATE."""
+        return self.order_by().update(**self.computed_activity())
+    
+    def with_stale_activity(self):
+        """Tickets whose stored activity fields disagree with their messages."""
+        computed = {f'computed_{name}': value for name, value in self.computed_activity().items()}
+        matches = models.Q()
+        for name in ACTIVITY_FIELDS:
+            same = models.Q(**{name: models.F(f'computed_{name}')})
+            if Ticket._meta.get_field(name).null:
+                same |= models.Q(**{f'{name}__isnull': True, f'computed_{name}__isnull': True})
+            matches &= same
+        return self.annotate(**computed).annotate(activity_matches=models.Case(
+            models.When(matches, then=True), default=False, output_field=models.BooleanField(),
+        )).filter(activity_matches=False)
+
 
 class Ticket(models.Model):
     STATUS_CHOICES = [
@@ -56,14 +162,16 @@ class Ticket(models.Model):
     
     # Request details
     nature_of_engagement = models.CharField(max_length=20, choices=NATURE_CHOICES)
-    document_attached = models.FileField(upload_to='documents/', blank=True, null=True)
+    document_attached = models.FileField(upload_to='documents/', max_length=255, blank=True, null=True)
     details_of_contracting_party = models.TextField(blank=True, null=True)
     remarks = models.TextField(blank=True, null=True)
     
     # Admin fields
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     admin_comments = models.TextField(blank=True, null=True)
-    reviewed_document = models.FileField(upload_to='reviewed_documents/', blank=True, null=True)
+    reviewed_document = models.FileField(upload_to='reviewed_documents/', max_length=255, blank=True, null=True)
+    document_attached_sha256 = models.CharField(max_length=64, blank=True, default='', editable=False)
+    reviewed_document_sha256 = models.CharField(max_length=64, blank=True, default='', editable=False)
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, 
                                    related_name='assigned_tickets', limit_choices_to={'role': 'admin'})
     priority = models.CharField(max_length=10, choices=[
@@ -76,12 +184,125 @@ class Ticket(models.Model):
     # Timestamps
     date_updated = models.DateTimeField(auto_now=True)
     
+    # Denormalized text of the requester fields and message bodies (see tickets.search)
+    search_document = models.TextField(blank=True, default='', editable=False)
+    
+    # Denormalized conversation activity, maintained by TicketMessage and
+    # rebuilt by the recompute_ticket_activity command
+    message_count = models.PositiveIntegerField(default=0, editable=False)
+    last_message_at = models.DateTimeField(blank=True, null=True, editable=False)
+    last_message_by_admin = models.BooleanField(blank=True, null=True, editable=False)
+    # Latest message time, or creation time for tickets without messages
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
+    
+    objects = TicketQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-date_created']
+        indexes = [
+            # Default dashboard listing and keyset ordering
+            models.Index(fields=['-date_created', '-id'], name='ticket_created_idx'),
+            # User dashboard: a requester's own tickets, newest first
+            models.Index(fields=['user', '-date_created'], name='ticket_user_created_idx'),
+            # Admin dashboard filters, newest first
+            models.Index(fields=['status', '-date_created'], name='ticket_status_created_idx'),
+            models.Index(fields=['department', '-date_created'], name='ticket_dept_created_idx'),
+            models.Index(fields=['company', '-date_created'], name='ticket_company_created_idx'),
+            models.Index(fields=['nature_of_engagement', '-date_created'], name='ticket_nature_created_idx'),
+            # Workload per legal admin
+            models.Index(fields=['assigned_to', 'status'], name='ticket_assignee_status_idx'),
+            # "Recent activity" sort and keyset ordering
+            models.Index(fields=['-last_activity_at', '-id'], name='ticket_activity_idx'),
+            # Partial indexes over the (small) open backlog
+            models.Index(
+                fields=['-date_created'],
+                condition=models.Q(status__in=OPEN_STATUSES),
+                name='ticket_open_created_idx',
+            ),
+            models.Index(
+                fields=['assigned_to', '-date_created'],
+                condition=models.Q(status__in=OPEN_STATUSES),
+                name='ticket_open_assignee_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Ticket #{self.id} - {self.nature_of_engagement} by {self.name} {self.last_name}"
     
+    def stored_stats_key(self):
+        """The rollup row the saved ticket is counted in, locking the row."""
+        stored = Ticket.objects.select_for_update().filter(pk=self.pk).only('date_created', *STATS_FIELDS).first()
+        return stored and TicketDailyStats.key_for(stored)
+    
+    def save(self, *args, **kwargs):
+        # Rollup counts and status events are recorded by the write paths (tickets.tracking)
+        if self._state.adding:
+            self.last_activity_at = self.date_created
+        update_fields = kwargs.get('update_fields')
+        extra_fields = set()
+        if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+            self.search_document = self.build_search_document()
+            extra_fields.add('search_document')
+        replaced = []
+        for file_field, hash_field in HASHED_FILE_FIELDS.items():
+            if update_fields is None or file_field in update_fields:
+                if self.update_file_hash(file_field, hash_field):
+                    extra_fields.add(hash_field)
+                    replaced.append(file_field)
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *extra_fields}
+        
+        with transaction.atomic():
+            previous = {}
+            if replaced and not self._state.adding:
+                previous = Ticket.objects.filter(pk=self.pk).values(*replaced).first() or {}
+            super().save(*args, **kwargs)
+            # Release the files the new uploads replaced
+            for file_field, old_name in previous.items():
+                if old_name and old_name != getattr(self, file_field).name:
+                    release_file(getattr(self, file_field).storage, old_name)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Uncounted from the row as stored (see tickets.stats)
+            self._stats_key = self.stored_stats_key()
+            result = super().delete(*args, **kwargs)
+            for file_field in HASHED_FILE_FIELDS:
+                field_file = getattr(self, file_field)
+                if field_file:
+                    release_file(field_file.storage, field_file.name)
+        return result
+    
+    def update_file_hash(self, file_field, hash_field):
+        """Hash a newly assigned upload before it is stored; return whether the hash changed."""
+        field_file = getattr(self, file_field)
+        if not field_file:
+            content_hash = ''
+        elif not field_file._committed:
+            # Remembered on the upload, so storage does not read it again
+            content_hash, _size = hash_content(field_file.file)
+        else:
+            return False
+        changed = getattr(self, hash_field) != content_hash
+        setattr(self, hash_field, content_hash)
+        return changed
+    
+    def build_search_document(self):
+        message_bodies = ()
+        if self.pk:
+            message_bodies = self.messages.values_list('message', flat=True)
+        return build_search_document(self, message_bodies)
+    
+    def update_search_document(self):
+        """Rebuild the stored search document without touching other columns."""
+        Ticket.objects.filter(pk=self.pk).update(search_document=self.build_search_document())
+    
+    def get_document_filename(self):
+        return display_filename(self.document_attached) if self.document_attached else ''
+    
+    def get_reviewed_document_filename(self):
+        return display_filename(self.reviewed_document) if self.reviewed_document else ''
+    
     def get_status_badge_class(self):
         status_classes = {
             'pending': 'warning',
@@ -107,12 +328,346 @@ class TicketMessage(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
     is_admin_message = models.BooleanField(default=False)
-    attachment = models.FileField(upload_to='message_attachments/', blank=True, null=True)
+    attachment = models.FileField(upload_to='message_attachments/', max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Newest-first conversation windows (tickets.conversations)
+            models.Index(fields=['ticket', '-created_at', '-id'], name='message_ticket_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Message from {self.sender.username} on Ticket #{self.ticket.id}"
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                # Append the new body and bump the counters instead of recomputing
+                is_latest = models.Q(last_message_at__isnull=True) | models.Q(last_message_at__lte=self.created_at)
+                Ticket.objects.filter(pk=self.ticket_id).update(
+                    search_document=Concat(
+                        'search_document', models.Value(' '), models.Value(self.message),
+                        output_field=models.TextField(),
+                    ),
+                    message_count=models.F('message_count') + 1,
+                    last_message_at=models.Case(
+                        models.When(is_latest, then=models.Value(self.created_at)),
+                        default='last_message_at',
+                    ),
+                    last_message_by_admin=models.Case(
+                        models.When(is_latest, then=models.Value(self.is_admin_message)),
+                        default='last_message_by_admin',
+                    ),
+                    last_activity_at=models.Case(
+                        models.When(is_latest, then=models.Value(self.created_at)),
+                        default='last_activity_at',
+                    ),
+                )
+            else:
+                self.ticket.update_search_document()
+                Ticket.objects.filter(pk=self.ticket_id).refresh_activity()
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.ticket.update_search_document()
+            Ticket.objects.filter(pk=self.ticket_id).refresh_activity()
+            if self.attachment:
+                release_file(self.attachment.storage, self.attachment.name)
+        return result
+
+
+class TicketReadState(models.Model):
+    """How far a participant has read a ticket's conversation."""
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ticket_read_states')
+    # Messages with a higher id are unread; not a foreign key so deleting a message keeps the cursor
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    last_read_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'user'], name='unique_ticket_read_state'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} read Ticket #{self.ticket_id} up to message {self.last_read_message_id}"
+
+
+class StoredBlob(models.Model):
+    """File contents shared by every upload with the same SHA-256 (see tickets.storage)."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the last reference was dropped; the sweep waits a grace period after it
+    released_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['released_at'], condition=models.Q(ref_count=0), name='blob_unreferenced_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.ref_count} references)"
+    
+    @classmethod
+    def acquire(cls, sha256, size):
+        """Add a reference to a blob, creating its row on first use."""
+        referenced = cls.objects.filter(pk=sha256).update(ref_count=models.F('ref_count') + 1, released_at=None)
+        if referenced:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(sha256=sha256, size=size, ref_count=1)
+        except IntegrityError:
+            # Created concurrently by an identical upload
+            cls.objects.filter(pk=sha256).update(ref_count=models.F('ref_count') + 1, released_at=None)
+
+
+class UploadSession(models.Model):
+    """A file being uploaded in chunks (see tickets.uploads)."""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # Checksum the client declared; the assembled file must match it
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Expiry sweep (clear_upload_sessions)
+            models.Index(fields=['updated_at'], name='upload_session_updated_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Upload {self.filename} ({self.received}/{self.size} bytes)"
+
+
+class NotificationPreference(models.Model):
+    """How a user wants to hear about ticket activity (see tickets.notifications)."""
+    DIGEST_CHOICES = [
+        (0, 'Immediately'),
+        (15, 'Every 15 minutes'),
+        (60, 'Hourly'),
+        (1440, 'Daily'),
+    ]
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_preference')
+    email_status_changes = models.BooleanField(default=True)
+    email_messages = models.BooleanField(default=True)
+    digest_minutes = models.PositiveSmallIntegerField(choices=DIGEST_CHOICES, default=15)
+    
+    def __str__(self):
+        return f"Notification preferences of {self.user}"
+    
+    def wants(self, kind):
+        return self.email_status_changes if kind == 'status' else self.email_messages
+
+
+class TicketNotification(models.Model):
+    """A ticket event waiting to be mailed to one recipient in their next digest."""
+    KIND_CHOICES = [
+        ('status', 'Status change'),
+        ('message', 'New message'),
+    ]
+    
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ticket_notifications')
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    summary = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # End of the recipient's digest window; sent with everything else due by then
+    deliver_after = models.DateTimeField()
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['deliver_after'], condition=models.Q(sent_at__isnull=True), name='notification_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} on Ticket #{self.ticket_id} for {self.recipient}"
+
+
+class TicketStatusEventQuerySet(models.QuerySet):
+    def timeline(self):
+        """Events oldest first, each with ``ended_at``: when its ticket next changed status (or None)."""
+        return self.annotate(
+            ended_at=models.Window(
+                Lead('created_at'),
+                partition_by=[models.F('ticket_id')],
+                order_by=[models.F('created_at').asc(), models.F('id').asc()],
+            ),
+        ).order_by('created_at', 'id')
+    
+    def between(self, start, end):
+        """Events in [start, end)."""
+        return self.filter(created_at__gte=start, created_at__lt=end)
+    
+    def transition_counts(self):
+        """``[{'from_status', 'to_status', 'count'}]`` over the selected events."""
+        return list(
+            self.order_by('from_status', 'to_status').values('from_status', 'to_status').annotate(count=models.Count('id'))
+        )
+
+
+class TicketStatusEvent(models.Model):
+    """One status change of a ticket, written in the same transaction as the change.
+    
+    Rows are only ever added. ``from_status`` is blank for the event that
+    opened the ticket (or, for tickets older than the log, the one seeded by
+    "manage.py backfill_status_events").
+    """
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    objects = TicketStatusEventQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Per-ticket timelines
+            models.Index(fields=['ticket', 'created_at', 'id'], name='status_event_timeline_idx'),
+            # Transitions per period
+            models.Index(fields=['created_at', 'to_status'], name='status_event_period_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Ticket #{self.ticket_id}: {self.from_status or '-'} -> {self.to_status}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Status events cannot be changed once written.')
+        super().save(*args, **kwargs)
+
+
+class DailyStatsQuerySet(models.QuerySet):
+    def apply_deltas(self, deltas):
+        """Add ``{key_for(...): change}`` to the matching rollup rows, creating missing ones."""
+        # A fixed order keeps concurrent writers from deadlocking on each other's rows
+        for key, change in sorted(deltas.items()):
+            if not change:
+                continue
+            values = dict(zip(['day', *self.model.DIMENSIONS], key))
+            if self.filter(**values).update(count=models.F('count') + change):
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(count=change, **values)
+            except IntegrityError:
+                # Created by a concurrent transaction in the meantime
+                self.filter(**values).update(count=models.F('count') + change)
+    
+    def total(self):
+        return self.aggregate(total=Coalesce(models.Sum('count'), 0))['total']
+    
+    def breakdown(self, field):
+        """``[{field: value, 'count': n}]`` summed over days, like values(field).annotate(Count)."""
+        return list(
+            self.order_by(field).values(field).annotate(count=models.Sum('count')).filter(count__gt=0)
+        )
+
+
+class TicketDailyStatsQuerySet(DailyStatsQuerySet):
+    def status_counts(self):
+        """Totals shaped like TicketQuerySet.status_counts(), read from the rollup."""
+        aggregates = {'total': Coalesce(models.Sum('count'), 0)}
+        for status, _label in Ticket.STATUS_CHOICES:
+            aggregates[status] = Coalesce(models.Sum('count', filter=models.Q(status=status)), 0)
+        return self.order_by().aggregate(**aggregates)
+
+
+class UserDailyStatsQuerySet(DailyStatsQuerySet):
+    def user_counts(self):
+        """Total, admin, regular and superuser counts in one query."""
+        def total(**filters):
+            return Coalesce(models.Sum('count', filter=models.Q(**filters) if filters else None), 0)
+        return self.order_by().aggregate(
+            total=total(),
+            admin=total(role='admin'),
+            user=total(role='user'),
+            superuser=total(is_superuser=True),
+        )
+
+
+class DailyStats(models.Model):
+    """Base for rollups counting rows per day and combination of ``DIMENSIONS``."""
+    DIMENSIONS = []
+    
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    
+    objects = DailyStatsQuerySet.as_manager()
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def key_for(cls, instance):
+        """The ``(day, *dimensions)`` row an instance is counted in; nulls count as ''."""
+        values = [getattr(instance, field) for field in cls.DIMENSIONS]
+        day = timezone.localdate(getattr(instance, cls.DATE_FIELD))
+        return (day, *('' if value is None else value for value in values))
+
+
+class TicketDailyStats(DailyStats):
+    """Tickets created per day, by their current status, department, company and type.
+    
+    Kept in step by the ticket write paths (tickets.tracking), ticket deletion
+    (tickets.stats) and the bulk paths; "manage.py check_stats" verifies it
+    against the tickets table.
+    """
+    DATE_FIELD = 'date_created'
+    DIMENSIONS = STATS_FIELDS
+    
+    status = models.CharField(max_length=20)
+    department = models.CharField(max_length=20)
+    company = models.CharField(max_length=20, blank=True, default='')
+    nature_of_engagement = models.CharField(max_length=20)
+    
+    objects = TicketDailyStatsQuerySet.as_manager()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', *STATS_FIELDS], name='unique_ticket_daily_stats'),
+        ]
+    
+    def __str__(self):
+        return f"{self.count} {self.status} ticket(s) on {self.day}"
+
+
+class UserDailyStats(DailyStats):
+    """Users joined per day, by role, department and superuser flag (see tickets.stats)."""
+    DATE_FIELD = 'date_joined'
+    DIMENSIONS = ['role', 'department', 'is_superuser']
+    
+    role = models.CharField(max_length=10)
+    department = models.CharField(max_length=20, blank=True, default='')
+    is_superuser = models.BooleanField(default=False)
+    
+    objects = UserDailyStatsQuerySet.as_manager()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'role', 'department', 'is_superuser'], name='unique_user_daily_stats'),
+        ]
     
     def __str__(self):
-        return f"Message from {self.sender.username} on Ticket #{self.ticket.id}"
\ No newline at end of file
+        return f"{self.count} {self.role} user(s) on {self.day}"
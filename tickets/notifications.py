@@ -0,0 +1,164 @@
+"""
+Email notifications for ticket activity.
+
+Status changes and new messages are recorded as ``TicketNotification`` rows
+for each interested recipient rather than mailed on the spot. A recipient's
+rows are held until the end of their digest window (``digest_minutes`` in
+``NotificationPreference``) and then mailed together as one digest, so a
+burst of replies produces a single email. The ``send_notification_digests``
+task (tickets.tasks) sends every digest that is due over one SMTP
+connection; it is queued for each window end when the first event lands in
+it, and queued again for events committed after that window's job started.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import NotificationPreference, TicketNotification
+
+User = get_user_model()
+
+# Digests sent per SMTP connection before it is recycled
+SEND_BATCH_SIZE = 100
+
+
+def preferences_for(users):
+    """Preferences keyed by user id; users without a saved row get the defaults."""
+    saved = {pref.user_id: pref for pref in NotificationPreference.objects.filter(user__in=users)}
+    return {user.pk: saved.get(user.pk) or NotificationPreference(user=user) for user in users}
+
+
+def digest_window_end(now, minutes):
+    """The end of the digest window containing ``now``; windows align to the epoch."""
+    if not minutes:
+        return now
+    now = now.replace(microsecond=0)
+    width = minutes * 60
+    epoch = int(now.timestamp())
+    return now + timedelta(seconds=-epoch % width or width)
+
+
+def record(recipients, ticket, kind, summary):
+    """Queue a notification for each recipient who wants this kind of event."""
+    return record_many([(user, ticket, kind, summary) for user in recipients])
+
+
+def record_many(events):
+    """Queue ``(recipient, ticket, kind, summary)`` events with one INSERT."""
+    events = [event for event in events if event[0].is_active and event[0].email]
+    if not events:
+        return []
+    now = timezone.now()
+    preferences = preferences_for({event[0] for event in events})
+    notifications = [
+        TicketNotification(
+            recipient=user, ticket=ticket, kind=kind, summary=summary[:255],
+            deliver_after=digest_window_end(now, preferences[user.pk].digest_minutes),
+        )
+        for user, ticket, kind, summary in events if preferences[user.pk].wants(kind)
+    ]
+    TicketNotification.objects.bulk_create(notifications)
+
+    # One send job per window end; later events in the same window reuse it
+    for deliver_after in {notification.deliver_after for notification in notifications}:
+        transaction.on_commit(lambda deliver_after=deliver_after: enqueue_send(deliver_after))
+    return notifications
+
+
+def enqueue_send(deliver_after):
+    """Make sure a send job will run at or after ``deliver_after``."""
+    from jobs.models import Job
+    from jobs.queue import enqueue
+    from .tasks import send_notification_digests
+
+    idempotency_key = f'ticket-notifications:{deliver_after:%Y%m%dT%H%M%S.%f}'
+    while True:
+        job = enqueue(
+            send_notification_digests,
+            idempotency_key=idempotency_key,
+            delay=max(deliver_after - timezone.now(), timedelta(0)),
+        )
+        if job.status == Job.PENDING:
+            return job
+        # The window's job has started, and may have missed rows committed
+        # since; queue one more run after it
+        idempotency_key = f'ticket-notifications:after:{job.pk}'
+
+
+def notify_status_change(ticket, actor=None):
+    """Tell the requester their ticket changed status."""
+    return notify_status_changes([ticket], actor)
+
+
+def notify_status_changes(tickets, actor=None):
+    """Tell each ticket's requester about its new status, skipping the actor's own tickets."""
+    return record_many([
+        (ticket.user, ticket, 'status', f"Status changed to {ticket.get_status_display()}")
+        for ticket in tickets if ticket.user_id != getattr(actor, 'pk', None)
+    ])
+
+
+def notify_message(message):
+    """Tell the other side of the conversation about a new message.
+
+    Replies from the legal team go to the requester; replies from the
+    requester go to the assigned admin, or every legal admin while the ticket
+    is unassigned.
+    """
+    ticket = message.ticket
+    if message.is_admin_message:
+        recipients = [ticket.user]
+    elif ticket.assigned_to_id:
+        recipients = [ticket.assigned_to]
+    else:
+        recipients = list(User.objects.filter(role='admin', is_active=True))
+    recipients = [user for user in recipients if user.pk != message.sender_id]
+    sender = message.sender.get_full_name() or message.sender.username
+    return record(recipients, ticket, 'message', f"New message from {sender}")
+
+
+def build_digest(recipient, notifications):
+    """One email covering every pending notification for a recipient."""
+    tickets = {notification.ticket_id for notification in notifications}
+    if len(tickets) == 1:
+        subject = f"Update on ticket #{notifications[0].ticket_id}: {notifications[0].ticket.get_nature_of_engagement_display()}"
+    else:
+        subject = f"{len(notifications)} updates on {len(tickets)} of your legal tickets"
+    body = render_to_string('tickets/email/notification_digest.txt', {
+        'recipient': recipient,
+        'notifications': notifications,
+    })
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [recipient.email])
+
+
+def send_due_notifications(now=None, batch_size=SEND_BATCH_SIZE):
+    """Mail every digest that is due and return the number of emails sent."""
+    now = now or timezone.now()
+    pending = defaultdict(list)
+    due = (
+        TicketNotification.objects.filter(sent_at__isnull=True, deliver_after__lte=now)
+        .select_related('recipient', 'ticket').order_by('recipient_id', 'created_at', 'id')
+    )
+    for notification in due:
+        pending[notification.recipient].append(notification)
+    if not pending:
+        return 0
+
+    recipients = list(pending)
+    sent = 0
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start:start + batch_size]
+        with get_connection() as connection:
+            connection.send_messages([build_digest(user, pending[user]) for user in batch])
+        # Marked per batch, so a failure part-way only resends the failed batch
+        TicketNotification.objects.filter(
+            pk__in=[notification.pk for user in batch for notification in pending[user]]
+        ).update(sent_at=timezone.now())
+        sent += len(batch)
+    return sent
@@ -0,0 +1,186 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``OFFSET n`` each page seeks past the ordering key of the last row
+shown, so deep pages cost the same as the first one and rows inserted while
+someone is paging do not shift later pages. Cursors are opaque, URL-safe
+encodings of that ordering key.
+"""
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Query parameters that carry a cursor and are dropped from page links
+CURSOR_PARAMS = ('after', 'before', 'page')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def approximate_count(queryset):
+    """Estimate the number of rows from planner statistics.
+
+    PostgreSQL reads ``pg_class.reltuples`` for unfiltered querysets and the
+    planner's row estimate otherwise; other databases fall back to COUNT(*).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    queryset = queryset.order_by()
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been analyzed
+        if row and row[0] >= 0:
+            return row[0]
+        return queryset.count()
+
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def base_querystring(request):
+    """The current query string without cursor parameters, for building page links."""
+    query = request.GET.copy()
+    for param in CURSOR_PARAMS:
+        query.pop(param, None)
+    return query.urlencode()
+
+
+class KeysetPaginator:
+    """Paginate a queryset by seeking on a unique ordering such as (-date_created, -id)."""
+
+    def __init__(self, queryset, per_page, ordering=('-date_created', '-id'), approximate=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.approximate = approximate
+        self.names = [field.lstrip('-') for field in self.ordering]
+        # None for annotations such as a search rank, whose values go into cursors as-is
+        self.fields = [
+            None if name in queryset.query.annotations else queryset.model._meta.get_field(name)
+            for name in self.names
+        ]
+
+    @cached_property
+    def count(self):
+        """Total number of rows, estimated when ``approximate`` is set."""
+        if self.approximate:
+            return approximate_count(self.queryset)
+        return self.queryset.count()
+
+    def encode_cursor(self, obj):
+        values = [
+            getattr(obj, name) if field is None else field.value_to_string(obj)
+            for name, field in zip(self.names, self.fields)
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise InvalidCursor('Malformed cursor.')
+            return [self.decode_value(field, value) for field, value in zip(self.fields, values)]
+        except (binascii.Error, UnicodeError, ValueError, ValidationError) as e:
+            raise InvalidCursor('Malformed cursor.') from e
+
+    def decode_value(self, field, value):
+        if field is not None:
+            return field.to_python(value)
+        # Annotated keys are numbers (search ranks)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise InvalidCursor('Malformed cursor.')
+        return value
+
+    def _seek(self, values, backwards):
+        """Rows strictly after ``values`` in the ordering (before them if ``backwards``)."""
+        condition = Q()
+        for i, (ordering, name) in enumerate(zip(self.ordering, self.names)):
+            descending = ordering.startswith('-') != backwards
+            clause = Q(**{f'{name}__{"lt" if descending else "gt"}': values[i]})
+            for prev_name, prev_value in zip(self.names[:i], values[:i]):
+                clause &= Q(**{prev_name: prev_value})
+            condition |= clause
+        return condition
+
+    def page(self, after=None, before=None):
+        """Return the page following cursor ``after`` or preceding cursor ``before``."""
+        if before:
+            reversed_ordering = [
+                field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering
+            ]
+            queryset = self.queryset.filter(
+                self._seek(self.decode_cursor(before), backwards=True)
+            ).order_by(*reversed_ordering)
+        else:
+            queryset = self.queryset.order_by(*self.ordering)
+            if after:
+                queryset = queryset.filter(self._seek(self.decode_cursor(after), backwards=False))
+
+        # One extra row tells us whether another page exists
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if before:
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+        return KeysetPage(rows, self, has_next=has_more, has_previous=bool(after))
+
+    def get_page(self, after=None, before=None):
+        """Like page(), but fall back to the first page on a malformed cursor."""
+        try:
+            return self.page(after=after, before=before)
+        except InvalidCursor:
+            return self.page()
+
+
+class KeysetPage(Sequence):
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @cached_property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @cached_property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(self.object_list[0])
@@ -0,0 +1,254 @@
+"""
+Time-series ticket reports.
+
+A report splits a date range into day, week or month buckets and gives, per
+bucket, the tickets created, closed and reopened, the open backlog at the
+end of the bucket and the median and 90th percentile turnaround (creation
+to closing) per department and type.
+
+Closings come from the status history (TicketStatusEvent): a ticket closes
+when an event moves it into one of CLOSED_STATUSES and reopens when one
+moves it out again. Events are never changed, so later edits to a closed
+ticket do not move its closing into another bucket.
+
+Everything is computed in the database: buckets with ``Trunc`` and
+percentiles by nearest rank, keeping only the rows whose ``ROW_NUMBER()``
+within their group is the median or p90 rank.
+
+Buckets that have ended are cached one by one, so a report only recomputes
+the current bucket and those it has not seen within REPORT_CACHE_TIMEOUT.
+They are cached under a report generation, which write paths that date
+tickets or events before today (imports, backfills) replace through
+``bump_report_generation``, so those writes are never hidden by the cache.
+The backlog is not cached: it is worked out for every returned bucket from
+the open count at the start of the report and the buckets' own counts.
+"""
+import math
+from datetime import datetime, time, timedelta
+from time import time_ns
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, DateField, DurationField, ExpressionWrapper, F, Q, Window
+from django.db.models.functions import Ceil, RowNumber, Trunc
+from django.utils import timezone
+
+from .models import Ticket, TicketStatusEvent
+
+INTERVALS = ['day', 'week', 'month']
+
+CLOSED_STATUSES = ['completed', 'rejected']
+
+# Status events that close or reopen a ticket
+CLOSING = Q(to_status__in=CLOSED_STATUSES) & ~Q(from_status__in=CLOSED_STATUSES)
+REOPENING = Q(from_status__in=CLOSED_STATUSES) & ~Q(to_status__in=CLOSED_STATUSES)
+
+# Buckets returned when no start date is given, and the most allowed
+DEFAULT_BUCKETS = 12
+MAX_BUCKETS = 400
+
+# Seconds a finished bucket stays cached; later changes to old tickets' department or type show up after this
+REPORT_CACHE_TIMEOUT = 24 * 60 * 60
+
+REPORT_GENERATION_KEY = 'tickets:report:generation'
+
+PERCENTILES = {'median': 0.5, 'p90': 0.9}
+
+# Breakdown of the turnaround figures
+GROUP_FIELDS = ['department', 'nature_of_engagement']
+
+
+class ReportError(ValueError):
+    pass
+
+
+def bucket_start(day, interval):
+    """The first day of the bucket containing ``day``."""
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, interval):
+    if interval == 'week':
+        return start + timedelta(days=7)
+    if interval == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def previous_bucket(start, interval):
+    return bucket_start(start - timedelta(days=1), interval)
+
+
+def bucket_range(start, end, interval):
+    """Bucket start dates from the bucket containing ``start`` to the one containing ``end``."""
+    buckets = []
+    current = bucket_start(start, interval)
+    while current <= end:
+        buckets.append(current)
+        if len(buckets) > MAX_BUCKETS:
+            raise ReportError(f'A report covers at most {MAX_BUCKETS} buckets.')
+        current = next_bucket(current, interval)
+    return buckets
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def report_generation():
+    """The generation finished buckets are currently cached under."""
+    # A time-based value is never reused, even after the key is evicted
+    return cache.get_or_set(REPORT_GENERATION_KEY, time_ns, None)
+
+
+def bump_report_generation():
+    """Start a new report generation, now and again on commit."""
+    def bump():
+        cache.set(REPORT_GENERATION_KEY, time_ns(), None)
+
+    bump()
+    if connection.in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def before_today(moments):
+    """Whether any of ``moments`` is earlier than today, in a bucket that may already be cached."""
+    today = local_midnight(timezone.localdate())
+    return any(moment < today for moment in moments)
+
+
+def cache_key(interval, filters, start, generation):
+    scope = ':'.join(f'{field}={filters.get(field) or ""}' for field in GROUP_FIELDS)
+    return f'tickets:report:events:{generation}:{interval}:{scope}:{start.isoformat()}'
+
+
+def status_events(filters):
+    """Status events of the tickets matching the report's filters."""
+    return TicketStatusEvent.objects.filter(**{f'ticket__{field}': value for field, value in filters.items()})
+
+
+def open_at(filters, day):
+    """Tickets matching ``filters`` still open at the start of ``day``, in two queries."""
+    cutoff = local_midnight(day)
+    created = Ticket.objects.filter(**filters, date_created__lt=cutoff).count()
+    changes = status_events(filters).filter(created_at__lt=cutoff).order_by().aggregate(
+        closed=Count('pk', filter=CLOSING),
+        reopened=Count('pk', filter=REOPENING),
+    )
+    return created - changes['closed'] + changes['reopened']
+
+
+def bucket_counts(queryset, field, interval, start, end, **counts):
+    """``{bucket: {name: count}}`` for rows whose ``field`` is in [start, end)."""
+    rows = (
+        queryset.filter(**{f'{field}__gte': local_midnight(start), f'{field}__lt': local_midnight(end)})
+        .order_by().annotate(bucket=Trunc(field, interval, output_field=DateField()))
+        .values('bucket').annotate(**counts)
+    )
+    return {row.pop('bucket'): row for row in rows}
+
+
+def turnaround_rows(closings, interval, start, end):
+    """Yield ``(bucket, group values, group size, rank, turnaround)`` at each percentile rank."""
+    group_fields = [f'ticket__{field}' for field in GROUP_FIELDS]
+    group = [F('bucket'), *(F(field) for field in group_fields)]
+    took = ExpressionWrapper(F('created_at') - F('ticket__date_created'), output_field=DurationField())
+    rows = (
+        closings.filter(created_at__gte=local_midnight(start), created_at__lt=local_midnight(end))
+        .order_by().annotate(bucket=Trunc('created_at', interval, output_field=DateField()), took=took)
+        .annotate(
+            rank=Window(RowNumber(), partition_by=group, order_by=[F('took').asc(), F('pk').asc()]),
+            size=Window(Count('pk'), partition_by=group),
+        )
+        .filter(Q(*(Q(rank=Ceil(F('size') * share)) for share in PERCENTILES.values()), _connector=Q.OR))
+        .values_list('bucket', *group_fields, 'size', 'rank', 'took')
+    )
+    for bucket, *values, size, rank, took in rows:
+        yield bucket, tuple(values), size, rank, took
+
+
+def compute_buckets(filters, buckets, interval):
+    """Report rows, without the backlog, for consecutive buckets in three queries."""
+    start, end = buckets[0], next_bucket(buckets[-1], interval)
+    events = status_events(filters)
+    created = bucket_counts(Ticket.objects.filter(**filters), 'date_created', interval, start, end, created=Count('pk'))
+    changes = bucket_counts(
+        events, 'created_at', interval, start, end,
+        closed=Count('pk', filter=CLOSING), reopened=Count('pk', filter=REOPENING),
+    )
+
+    turnaround = {}
+    for bucket, values, size, rank, took in turnaround_rows(events.filter(CLOSING), interval, start, end):
+        entry = turnaround.setdefault(bucket, {}).setdefault(values, {
+            **dict(zip(GROUP_FIELDS, values)), 'closed': size,
+        })
+        hours = round(took.total_seconds() / 3600, 1)
+        for name, share in PERCENTILES.items():
+            if rank == math.ceil(size * share):
+                entry[f'{name}_hours'] = hours
+
+    return {
+        bucket: {
+            'start': bucket.isoformat(),
+            'created': created.get(bucket, {}).get('created', 0),
+            'closed': changes.get(bucket, {}).get('closed', 0),
+            'reopened': changes.get(bucket, {}).get('reopened', 0),
+            'turnaround': [turnaround[bucket][values] for values in sorted(turnaround.get(bucket, {}))],
+        }
+        for bucket in buckets
+    }
+
+
+def build_report(interval='week', start=None, end=None, filters=None):
+    """Created/closed counts, backlog and turnaround per bucket from ``start`` to ``end`` (dates).
+
+    ``filters`` may restrict the report to one department and/or type.
+    """
+    if interval not in INTERVALS:
+        raise ReportError('Interval must be day, week or month.')
+    filters = {field: value for field, value in (filters or {}).items() if field in GROUP_FIELDS and value}
+    today = timezone.localdate()
+    end = min(end or today, today)
+    if start is None:
+        start = bucket_start(end, interval)
+        for _ in range(DEFAULT_BUCKETS - 1):
+            start = previous_bucket(start, interval)
+    if start > end:
+        raise ReportError('The start date must not be after the end date.')
+    buckets = bucket_range(start, end, interval)
+
+    # Finished buckets come from the cache; the current one is always recomputed
+    current = bucket_start(today, interval)
+    generation = report_generation()
+    keys = {bucket: cache_key(interval, filters, bucket, generation) for bucket in buckets if bucket < current}
+    cached = cache.get_many(keys.values())
+    rows = {bucket: cached[key] for bucket, key in keys.items() if key in cached}
+    missing = [bucket for bucket in buckets if bucket not in rows]
+    if missing:
+        missing = bucket_range(missing[0], missing[-1], interval)
+        computed = compute_buckets(filters, missing, interval)
+        cache.set_many(
+            {keys[bucket]: row for bucket, row in computed.items() if bucket in keys and bucket not in rows},
+            REPORT_CACHE_TIMEOUT,
+        )
+        rows.update((bucket, row) for bucket, row in computed.items() if bucket not in rows)
+
+    # The backlog always comes from the current counts, cached buckets included
+    backlog = open_at(filters, buckets[0])
+    report_rows = []
+    for bucket in buckets:
+        row = rows[bucket]
+        backlog += row['created'] - row['closed'] + row['reopened']
+        report_rows.append({**row, 'backlog': backlog})
+
+    return {
+        'interval': interval,
+        'start': buckets[0].isoformat(),
+        'end': end.isoformat(),
+        'filters': filters,
+        'buckets': report_rows,
+    }
@@ -0,0 +1,60 @@
+"""
+Ticket search.
+
+Each ticket keeps a denormalized ``search_document`` holding the requester
+fields and every message body. On PostgreSQL it is matched through a GIN
+index on its ``tsvector`` and results are ranked; other databases (SQLite in
+development and tests) fall back to matching every search term with LIKE.
+"""
+from django.db import connection
+
+# Ticket fields copied into the search document
+SEARCH_FIELDS = ['name', 'last_name', 'email', 'remarks', 'details_of_contracting_party']
+
+# Text search configuration used by the query and the GIN index
+SEARCH_CONFIG = 'english'
+
+
+def build_search_document(ticket, message_bodies=()):
+    """Build the text indexed for a ticket from its fields and message bodies."""
+    parts = [getattr(ticket, field) or '' for field in SEARCH_FIELDS]
+    parts.extend(message_bodies)
+    return ' '.join(part for part in parts if part)
+
+
+def search_vector():
+    """The tsvector expression the PostgreSQL GIN index is built on."""
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('search_document', config=SEARCH_CONFIG)
+
+
+def parse_ticket_id(query):
+    """Return the ticket id for queries like ``42`` or ``#42``, otherwise None."""
+    value = query.strip().lstrip('#')
+    if value.isdigit():
+        return int(value)
+    return None
+
+
+def search_tickets(queryset, query):
+    """Filter a Ticket queryset by a free-text query, best matches first."""
+    query = query.strip()
+    if not query:
+        return queryset
+
+    # Exact ticket numbers skip text search entirely
+    ticket_id = parse_ticket_id(query)
+    if ticket_id is not None:
+        return queryset.filter(pk=ticket_id)
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.annotate(
+            search=search_vector(),
+            rank=SearchRank(search_vector(), search_query),
+        ).filter(search=search_query).order_by('-rank', '-date_created')
+
+    for term in query.split():
+        queryset = queryset.filter(search_document__icontains=term)
+    return queryset
@@ -0,0 +1,128 @@
+"""
+Materialized statistics.
+
+``TicketDailyStats`` and ``UserDailyStats`` hold row counts per day and
+combination of the columns the statistics pages break down by, so totals
+are sums over (days x combinations) instead of scans of the tickets and
+users tables. Each write path moves its rows between rollup rows in the
+same transaction: the ticket write paths (tickets.tracking), the bulk
+action and import paths, and the signal handlers below for users and for
+deletions (including cascades).
+
+``rebuild`` recomputes a rollup from the live tables and ``differences``
+compares the two; "manage.py check_stats" runs them.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Ticket, TicketDailyStats, UserDailyStats
+
+User = get_user_model()
+
+ROLLUPS = {
+    'tickets': (TicketDailyStats, Ticket),
+    'users': (UserDailyStats, User),
+}
+
+
+def count_deltas(rollup, instances, sign=1):
+    """``{key: change}`` for adding (or with ``sign=-1`` removing) instances."""
+    return Counter({key: sign * count for key, count in Counter(rollup.key_for(obj) for obj in instances).items()})
+
+
+def live_counts(rollup, source):
+    """Counts per rollup key computed from the source table."""
+    rows = (
+        source.objects.order_by()
+        .annotate(day=TruncDate(rollup.DATE_FIELD))
+        .values('day', *rollup.DIMENSIONS).annotate(count=Count('pk'))
+    )
+    counts = Counter()
+    for row in rows.iterator():
+        key = (row['day'], *('' if row[field] is None else row[field] for field in rollup.DIMENSIONS))
+        counts[key] += row['count']
+    return counts
+
+
+def stored_counts(rollup):
+    fields = ['day', *rollup.DIMENSIONS]
+    return Counter({
+        tuple(row[:-1]): row[-1]
+        for row in rollup.objects.order_by().values_list(*fields, 'count').iterator()
+        if row[-1]
+    })
+
+
+def differences(rollup, source):
+    """``[(key, stored, live)]`` for every key where the rollup disagrees with the table."""
+    stored = stored_counts(rollup)
+    live = live_counts(rollup, source)
+    return sorted(
+        (key, stored.get(key, 0), live.get(key, 0))
+        for key in stored.keys() | live.keys()
+        if stored.get(key, 0) != live.get(key, 0)
+    )
+
+
+def rebuild(rollup, source):
+    """Replace a rollup with counts recomputed from its source table; return the row count.
+
+    Changes committed while the rebuild runs can be missed; check again afterwards.
+    """
+    with transaction.atomic():
+        counts = live_counts(rollup, source)
+        rollup.objects.all().delete()
+        rollup.objects.bulk_create(
+            rollup(count=count, **dict(zip(['day', *rollup.DIMENSIONS], key))) for key, count in counts.items()
+        )
+    return len(counts)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    # Ticket.delete() sets the stored key; cascades pass freshly loaded rows
+    key = getattr(instance, '_stats_key', None) or TicketDailyStats.key_for(instance)
+    TicketDailyStats.objects.apply_deltas({key: -1})
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_user_stats_key(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._stats_key = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & {'date_joined', *UserDailyStats.DIMENSIONS}:
+        # Logins save only last_login; nothing counted changes
+        instance._stats_key = False
+        return
+    stored = sender.objects.filter(pk=instance.pk).only('date_joined', *UserDailyStats.DIMENSIONS).first()
+    if stored is not None:
+        instance._stats_key = UserDailyStats.key_for(stored)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, raw=False, **kwargs):
+    old_key = getattr(instance, '_stats_key', None)
+    if raw or old_key is False:
+        return
+    new_key = UserDailyStats.key_for(instance)
+    if new_key != old_key:
+        UserDailyStats.objects.apply_deltas({new_key: 1, **({old_key: -1} if old_key else {})})
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remember_deleted_user_stats_key(sender, instance, **kwargs):
+    stored = sender.objects.filter(pk=instance.pk).only('date_joined', *UserDailyStats.DIMENSIONS).first()
+    instance._stats_key = stored and UserDailyStats.key_for(stored)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    key = getattr(instance, '_stats_key', None) or UserDailyStats.key_for(instance)
+    UserDailyStats.objects.apply_deltas({key: -1})
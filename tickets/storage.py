@@ -0,0 +1,218 @@
+"""
+Content-addressed file storage.
+
+Every distinct upload is written once, under its SHA-256, and shared by all
+tickets and messages that attach the same bytes. Field values keep the form
+``<upload_to>/<stem>_<sha256><ext>`` so downloads still carry the original
+filename, while the bytes live in ``blobs/ab/cd/<sha256>``.
+``StoredBlob`` rows count the references to each blob; the sweep_blobs
+command reconciles those counts with the file fields and removes blobs
+nobody references any more. Names written before this storage was enabled
+are served from their own path.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.utils import timezone
+
+BLOB_DIR = 'blobs'
+
+# Longest original filename kept in a field value
+MAX_FILENAME_LENGTH = 100
+
+NAME_RE = re.compile(r'^(?:(?P<directory>.*)/)?(?P<stem>[^/]*)_(?P<sha256>[0-9a-f]{64})(?P<ext>\.[^/.]*)?$')
+
+
+def blob_path(sha256):
+    return posixpath.join(BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def hash_content(content):
+    """``(sha256, size)`` of an upload, read once and remembered on the upload."""
+    if getattr(content, 'content_hash', None) is None:
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            digest.update(chunk)
+            size += len(chunk)
+        content.content_hash = (digest.hexdigest(), size)
+    return content.content_hash
+
+
+def truncate_filename(filename):
+    if len(filename) <= MAX_FILENAME_LENGTH:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return stem[:MAX_FILENAME_LENGTH - len(ext)] + ext
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """A FileSystemStorage that deduplicates identical files by content hash."""
+
+    def content_hash(self, name):
+        """The SHA-256 encoded in a stored name, or None for names from before this storage."""
+        match = NAME_RE.match(name or '')
+        return match['sha256'] if match else None
+
+    def original_filename(self, name):
+        """The uploaded filename, without the content hash."""
+        match = NAME_RE.match(name or '')
+        if not match:
+            return posixpath.basename(name)
+        return match['stem'] + (match['ext'] or '')
+
+    def blob_name(self, name):
+        """The path, relative to the storage root, holding the bytes for ``name``."""
+        sha256 = self.content_hash(name)
+        return blob_path(sha256) if sha256 else name
+
+    def blob_full_path(self, sha256):
+        """Filesystem path of a blob, or of the blob directory when ``sha256`` is empty."""
+        return super().path(blob_path(sha256) if sha256 else BLOB_DIR)
+
+    def path(self, name):
+        return super().path(self.blob_name(name))
+
+    def url(self, name):
+        return super().url(self.blob_name(name))
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content, so identical uploads share one
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        sha256, size = hash_content(content)
+        with transaction.atomic():
+            StoredBlob.acquire(sha256, size)
+            full_path = self.blob_full_path(sha256)
+            if not os.path.exists(full_path):
+                self._write_blob(full_path, content)
+
+        directory, filename = posixpath.split(name)
+        stem, ext = posixpath.splitext(truncate_filename(filename))
+        return posixpath.join(directory, f'{stem}_{sha256}{ext}')
+
+    def _write_blob(self, full_path, content):
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, self.directory_permissions_mode or 0o777, exist_ok=True)
+        # Write beside the blob and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, name):
+        """Drop one reference to the blob; the bytes are removed by the sweep."""
+        from .models import StoredBlob
+
+        sha256 = self.content_hash(name)
+        if sha256 is None:
+            return super().delete(name)
+        StoredBlob.objects.filter(pk=sha256, ref_count__gt=0).update(
+            ref_count=models.F('ref_count') - 1, released_at=timezone.now(),
+        )
+
+
+def release_file(storage, name):
+    """Drop a reference to a file no longer attached, if its storage counts references."""
+    if isinstance(storage, ContentAddressedStorage):
+        storage.delete(name)
+
+
+def content_addressed_fields():
+    """Every model file field backed by a ContentAddressedStorage."""
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def count_references():
+    """Count references to each blob across all content-addressed file fields."""
+    counts = {}
+    for model, field in content_addressed_fields():
+        names = (
+            model._base_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            .values_list(field.name, flat=True).iterator(chunk_size=2000)
+        )
+        for name in names:
+            sha256 = field.storage.content_hash(name)
+            if sha256:
+                counts[sha256] = counts.get(sha256, 0) + 1
+    return counts
+
+
+def reconcile_ref_counts(dry_run=False):
+    """Correct stored reference counts that drifted from the file fields; return how many."""
+    from .models import StoredBlob
+
+    counts = count_references()
+    now = timezone.now()
+    stale = []
+    for blob in StoredBlob.objects.order_by().iterator(chunk_size=2000):
+        actual = counts.get(blob.sha256, 0)
+        if blob.ref_count != actual:
+            if actual == 0:
+                blob.released_at = now
+            blob.ref_count = actual
+            stale.append(blob)
+    if not dry_run:
+        StoredBlob.objects.bulk_update(stale, ['ref_count', 'released_at'], batch_size=500)
+    return len(stale)
+
+
+def sweep_blobs(storage, grace=timedelta(hours=24), dry_run=False):
+    """Remove blobs unreferenced for longer than ``grace`` and stray files under the blob directory.
+
+    Returns the number of bytes freed.
+    """
+    from .models import StoredBlob
+
+    cutoff = timezone.now() - grace
+    freed = 0
+    unreferenced = StoredBlob.objects.filter(ref_count=0, released_at__lt=cutoff)
+    for sha256, size in list(unreferenced.values_list('sha256', 'size')):
+        if dry_run:
+            freed += size
+            continue
+        with transaction.atomic():
+            # An upload may have claimed the blob again since it was listed
+            deleted, _ = StoredBlob.objects.filter(pk=sha256, ref_count=0).delete()
+            if deleted:
+                full_path = storage.blob_full_path(sha256)
+                if os.path.exists(full_path):
+                    os.remove(full_path)
+                freed += size
+
+    # Files with no row: interrupted uploads and blobs written by rolled back transactions
+    for directory, _dirs, files in os.walk(storage.blob_full_path('')):
+        if not files:
+            continue
+        known = set(StoredBlob.objects.filter(pk__in=files).values_list('pk', flat=True))
+        for name in files:
+            full_path = os.path.join(directory, name)
+            if name in known or os.path.getmtime(full_path) >= cutoff.timestamp():
+                continue
+            freed += os.path.getsize(full_path)
+            if not dry_run:
+                os.remove(full_path)
+    return freed
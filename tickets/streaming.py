@@ -0,0 +1,48 @@
+"""
+Streaming response bodies under ASGI.
+
+Under ASGI (lrms_project.asgi) Django cannot step a synchronous streaming
+iterator from the event loop, so it reads the whole iterator into a list
+with ``sync_to_async(list)`` before sending the first byte. Responses that
+stream large bodies (downloads, exports) therefore hand ASGI an asynchronous
+iterator instead: ``iterate_in_thread`` advances the synchronous one in a
+worker thread a few items at a time, so only those items are held in memory.
+Under WSGI the synchronous iterator is served as it is.
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+
+def is_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+
+async def iterate_in_thread(iterable, batch=1, thread_sensitive=True):
+    """Yield ``iterable``'s items, ``batch`` at a time from a worker thread.
+
+    Keep ``thread_sensitive`` for iterators reading the database: Django's
+    connections belong to the thread that opened them.
+    """
+    iterator = iter(iterable)
+    next_items = sync_to_async(lambda: list(islice(iterator, batch)), thread_sensitive=thread_sensitive)
+    try:
+        while True:
+            items = await next_items()
+            if not items:
+                return
+            for item in items:
+                yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            # Releases a server-side cursor when the client goes away mid-stream
+            await sync_to_async(close, thread_sensitive=thread_sensitive)()
+
+
+def streaming_content(request, iterable, **kwargs):
+    """``iterable`` as a streaming body suited to the server handling ``request``."""
+    if is_asgi(request):
+        return iterate_in_thread(iterable, **kwargs)
+    return iterable
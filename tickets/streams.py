@@ -0,0 +1,58 @@
+"""
+Server-Sent Events stream of a ticket's conversation and status changes.
+
+The stream holds its connection open, so it is only served by the ASGI
+application (lrms_project.asgi), which start.sh and render.yaml run under
+gunicorn's uvicorn worker. Under WSGI it answers 501 and the pages keep
+working without live updates. Every other view runs under the same server,
+so responses that stream large bodies go through tickets.streaming.
+"""
+import asyncio
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+
+from .events import get_broker, ticket_channel
+from .models import Ticket
+
+# Send a comment line this often so proxies keep idle streams open
+KEEPALIVE_SECONDS = 15
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(channel):
+    with get_broker().subscribe(channel) as subscription:
+        yield ': connected\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+            else:
+                yield format_event(event)
+
+
+async def ticket_events(request, ticket_id):
+    """Stream new messages and status changes for a ticket the user can see."""
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Live updates require the ASGI server.', status=501)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+
+    tickets = Ticket.objects.filter(id=ticket_id)
+    if not user.is_legal_admin():
+        tickets = tickets.filter(user=user)
+    if not await tickets.aexists():
+        raise Http404
+
+    response = StreamingHttpResponse(event_stream(ticket_channel(ticket_id)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
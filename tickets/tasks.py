@@ -0,0 +1,9 @@
+from jobs.queue import task
+
+from . import notifications
+
+
+@task(name='tickets.send_notification_digests', max_attempts=5, concurrency=1)
+def send_notification_digests():
+    """Mail every notification digest that is due (see tickets.notifications)."""
+    notifications.send_due_notifications()
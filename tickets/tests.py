@@ -1,10 +1,52 @@
-from django.test import TestCase, Client
+import asyncio
+import csv
+import hashlib
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.db import connection
+from django.db.models import F, Value
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
 from datetime import date, timedelta
-from .models import Ticket, TicketMessage
+from .models import (
+    Ticket, TicketMessage, TicketReadState, StoredBlob, UploadSession, NotificationPreference, TicketNotification,
+    TicketDailyStats, UserDailyStats, TicketStatusEvent,
+)
+from .uploads import MAX_CHUNK_SIZE
+from .search import search_tickets
+from .pagination import KeysetPaginator, InvalidCursor, approximate_count
+from .conversations import load_conversation, unread_messages, unread_total, count_unread_total
+from .events import PostgresBroker, get_broker, ticket_channel
+from .streaming import iterate_in_thread
+from .downloads import DocumentResponse
+from .notifications import digest_window_end, send_due_notifications
+from .bulk import BulkActionError, apply_bulk_action
+from .dashboard_cache import (
+    bump_tickets_generation, cached_dashboard, dashboard_cache_stats, reset_dashboard_cache_stats,
+)
+from . import dashboard_cache, exports
+from .stats import ROLLUPS, differences
+from .tracking import record_created, tracking_changes
+from .reports import bucket_start, build_report, local_midnight, report_generation
+from audit.log import audit_scope
+from jobs.models import Job
+from jobs.worker import Worker
 
 User = get_user_model()
 
@@ -536,16 +578,23 @@ class TicketConversationFunctionalTests(TestCase):
         # Verify user messages are marked as read
         user_message.refresh_from_db()
         self.assertTrue(user_message.is_read)
+        ticket = Ticket.objects.with_read_cursor(self.admin_user).get(pk=self.ticket.pk)
+        self.assertEqual(ticket.last_read_message_id, user_message.id)
+        self.assertFalse(unread_messages(ticket, self.admin_user).exists())
         
         # Test user viewing conversation (should mark admin messages as read)
         self.client.logout()
         self.client.login(username='deptuser', password='testpass123')
+        ticket = Ticket.objects.with_read_cursor(self.department_user).get(pk=self.ticket.pk)
+        self.assertEqual(list(unread_messages(ticket, self.department_user)), [admin_message])
         response = self.client.get(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]))
         self.assertEqual(response.status_code, 200)
         
         # Verify admin messages are marked as read
         admin_message.refresh_from_db()
         self.assertTrue(admin_message.is_read)
+        ticket = Ticket.objects.with_read_cursor(self.department_user).get(pk=self.ticket.pk)
+        self.assertFalse(unread_messages(ticket, self.department_user).exists())
     
     def test_user_cannot_access_other_user_ticket_conversation(self):
         """Test that users cannot access other users' ticket conversations"""
@@ -569,3 +618,2257 @@ class TicketConversationFunctionalTests(TestCase):
         self.client.login(username='deptuser', password='testpass123')
         response = self.client.get(reverse('tickets:user_ticket_conversation', args=[other_ticket.id]))
         self.assertEqual(response.status_code, 404)  # Should not be accessible
+
+
+class TicketStatisticsQueryTests(TestCase):
+    """Tests for the single-query ticket status counters"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        cache.clear()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            first_name='Department',
+            last_name='User',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            first_name='Admin',
+            last_name='User',
+            role='admin'
+        )
+        
+        for i, status in enumerate(['pending', 'pending', 'in_progress', 'completed', 'rejected']):
+            Ticket.objects.create(
+                user=self.department_user,
+                name=f'User{i}',
+                last_name='Test',
+                email=f'user{i}@example.com',
+                department='hr',
+                nature_of_engagement='for_copy',
+                status=status
+            )
+    
+    def test_status_counts_single_query(self):
+        """Test status_counts returns total and per-status counts in one query"""
+        with self.assertNumQueries(1):
+            counts = Ticket.objects.status_counts()
+        
+        self.assertEqual(counts, {
+            'total': 5,
+            'pending': 2,
+            'in_progress': 1,
+            'completed': 1,
+            'rejected': 1,
+        })
+    
+    def test_status_counts_respects_filters(self):
+        """Test status_counts only counts rows in the filtered queryset"""
+        counts = Ticket.objects.filter(status='pending').status_counts()
+        self.assertEqual(counts['total'], 2)
+        self.assertEqual(counts['pending'], 2)
+        self.assertEqual(counts['completed'], 0)
+        
+        counts = Ticket.objects.filter(user=self.admin_user).status_counts()
+        self.assertEqual(counts['total'], 0)
+    
+    def test_user_dashboard_query_count(self):
+        """Test user dashboard runs a fixed number of queries"""
+        self.client.login(username='deptuser', password='testpass123')
+        
+        # status counts, page of tickets, navbar unread total
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('tickets:user_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_tickets'], 5)
+        self.assertEqual(response.context['pending_tickets'], 2)
+        self.assertEqual(response.context['completed_tickets'], 1)
+    
+    def test_admin_dashboard_query_count(self):
+        """Test admin dashboard runs a fixed number of queries"""
+        self.client.login(username='admin', password='testpass123')
+        
+        # status counts, page of tickets, bulk assignee choices, navbar unread total
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('tickets:admin_dashboard'), {'department': 'hr'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_tickets'], 5)
+        self.assertEqual(response.context['pending_tickets'], 2)
+        self.assertEqual(response.context['in_progress_tickets'], 1)
+        self.assertEqual(response.context['completed_tickets'], 1)
+        self.assertEqual(response.context['rejected_tickets'], 1)
+
+
+class TicketIndexUsageTests(TestCase):
+    """EXPLAIN-based checks that the dashboard queries are served by indexes"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        """Seed enough tickets for the planner to prefer indexes"""
+        cls.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        cls.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        statuses = [status for status, _ in Ticket.STATUS_CHOICES]
+        departments = [department for department, _ in Ticket.DEPARTMENT_CHOICES]
+        natures = [nature for nature, _ in Ticket.NATURE_CHOICES]
+        Ticket.objects.bulk_create([
+            Ticket(
+                user=cls.department_user if i % 10 == 0 else other_user,
+                name=f'User{i}',
+                last_name='Test',
+                email=f'user{i}@example.com',
+                department=departments[i % len(departments)],
+                company='company_a' if i % 3 else 'company_b',
+                nature_of_engagement=natures[i % len(natures)],
+                status=statuses[i % len(statuses)],
+                assigned_to=cls.admin_user if i % 5 == 0 else None,
+                date_created=timezone.now() - timedelta(hours=i),
+            )
+            for i in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    
+    def assertUsesIndex(self, queryset):
+        """Fail if the ticket table is read with a sequential scan"""
+        table = Ticket._meta.db_table
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+        else:
+            plan = queryset.explain()
+            for line in plan.splitlines():
+                if f'SCAN {table}' in line:
+                    self.assertIn('USING', line, plan)
+    
+    def test_user_dashboard_uses_index(self):
+        """Test a requester's ticket list is served by an index"""
+        tickets = Ticket.objects.filter(user=self.department_user).order_by('-date_created')
+        self.assertUsesIndex(tickets[:10])
+    
+    def test_admin_dashboard_uses_index(self):
+        """Test the unfiltered admin listing is served by an index"""
+        self.assertUsesIndex(Ticket.objects.order_by('-date_created')[:15])
+    
+    def test_admin_filters_use_index(self):
+        """Test each admin dashboard filter is served by an index"""
+        for lookup in [
+            {'status': 'pending'},
+            {'department': 'finance'},
+            {'company': 'company_b'},
+            {'nature_of_engagement': 'for_access'},
+        ]:
+            with self.subTest(lookup=lookup):
+                tickets = Ticket.objects.filter(**lookup).order_by('-date_created')
+                self.assertUsesIndex(tickets[:15])
+    
+    def test_assigned_workload_uses_index(self):
+        """Test the per-admin workload query is served by an index"""
+        tickets = Ticket.objects.filter(assigned_to=self.admin_user, status='in_progress')
+        self.assertUsesIndex(tickets)
+
+
+class TicketSearchTests(TestCase):
+    """Tests for ticket full-text search"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.ticket1 = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_review',
+            details_of_contracting_party='Acme Logistics supply agreement',
+            remarks='Renewal of the warehouse lease'
+        )
+        
+        self.ticket2 = Ticket.objects.create(
+            user=self.department_user,
+            name='Jane',
+            last_name='Smith',
+            email='jane@example.com',
+            department='finance',
+            nature_of_engagement='for_copy'
+        )
+    
+    def test_search_document_maintained(self):
+        """Test the search document tracks ticket fields and messages"""
+        self.assertIn('Acme Logistics', self.ticket1.search_document)
+        self.assertIn('john@example.com', self.ticket1.search_document)
+        
+        message = TicketMessage.objects.create(
+            ticket=self.ticket2,
+            sender=self.admin_user,
+            message='Please attach the signed indemnity clause',
+            is_admin_message=True
+        )
+        self.ticket2.refresh_from_db()
+        self.assertIn('indemnity', self.ticket2.search_document)
+        
+        message.delete()
+        self.ticket2.refresh_from_db()
+        self.assertNotIn('indemnity', self.ticket2.search_document)
+        self.assertIn('Jane', self.ticket2.search_document)
+    
+    def test_rebuild_after_queryset_update(self):
+        """Test search documents are rebuilt for writes that bypass save()"""
+        TicketMessage.objects.create(ticket=self.ticket2, sender=self.department_user, message='Board resolution')
+        Ticket.objects.filter(pk=self.ticket2.pk).update(remarks='Trademark filing')
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'trademark')), [])
+        
+        self.assertEqual(Ticket.objects.filter(pk=self.ticket2.pk).rebuild_search_documents(), 1)
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'trademark resolution')), [self.ticket2])
+    
+    def test_migration_backfill_in_batches(self):
+        """Test the migration builds documents a batch of tickets at a time"""
+        migration = importlib.import_module('tickets.migrations.0007_ticket_search_document')
+        TicketMessage.objects.create(ticket=self.ticket2, sender=self.department_user, message='Board resolution')
+        Ticket.objects.update(search_document='')
+        
+        with mock.patch.object(migration, 'BATCH_SIZE', 1), self.assertNumQueries(7):
+            # Per ticket: the batch, its messages and the UPDATE; then the empty batch
+            migration.backfill_search_document(django_apps, None)
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'acme lease')), [self.ticket1])
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'jane resolution')), [self.ticket2])
+    
+    def test_search_ticket_fields(self):
+        """Test search matches requester and request details"""
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'acme lease')), [self.ticket1])
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'jane@example.com')), [self.ticket2])
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'acme smith')), [])
+    
+    def test_search_message_bodies(self):
+        """Test search matches conversation messages"""
+        TicketMessage.objects.create(
+            ticket=self.ticket2,
+            sender=self.department_user,
+            message='Need a certified copy of the board resolution'
+        )
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'resolution')), [self.ticket2])
+    
+    def test_search_ticket_id_short_circuit(self):
+        """Test numeric queries fetch the ticket by primary key only"""
+        with self.assertNumQueries(1) as context:
+            results = list(search_tickets(Ticket.objects.all(), f'#{self.ticket2.id}'))
+        self.assertEqual(results, [self.ticket2])
+        self.assertNotIn('LIKE', context.captured_queries[0]['sql'])
+    
+    def test_admin_dashboard_search(self):
+        """Test admin dashboard search uses ticket search"""
+        self.client.login(username='admin', password='testpass123')
+        
+        response = self.client.get(reverse('tickets:admin_dashboard'), {'search': 'warehouse'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'John Doe')
+        self.assertNotContains(response, 'Jane Smith')
+        
+        response = self.client.get(reverse('tickets:admin_dashboard'), {'search': str(self.ticket2.id)})
+        self.assertContains(response, 'Jane Smith')
+        self.assertNotContains(response, 'John Doe')
+
+
+class KeysetPaginationTests(TestCase):
+    """Tests for keyset (cursor) pagination of ticket lists"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        cache.clear()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        # Pairs of tickets share a timestamp so the id tie-breaker matters
+        now = timezone.now()
+        Ticket.objects.bulk_create([
+            Ticket(
+                user=self.department_user,
+                name=f'User{i}',
+                last_name='Test',
+                email=f'user{i}@example.com',
+                department='hr',
+                nature_of_engagement='for_copy',
+                date_created=now - timedelta(minutes=i // 2),
+            )
+            for i in range(25)
+        ])
+        self.expected = list(Ticket.objects.order_by('-date_created', '-id'))
+    
+    def test_pages_cover_every_ticket_once(self):
+        """Test following next cursors visits each ticket exactly once in order"""
+        paginator = KeysetPaginator(Ticket.objects.all(), 10)
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(after=page.next_cursor)
+            seen.extend(page)
+        
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+    
+    def test_previous_cursor(self):
+        """Test before cursors return the preceding page"""
+        paginator = KeysetPaginator(Ticket.objects.all(), 10)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        
+        previous = paginator.page(before=second.previous_cursor)
+        self.assertEqual(list(previous), list(first))
+        self.assertFalse(previous.has_previous())
+        self.assertTrue(previous.has_next())
+    
+    def test_stable_under_concurrent_inserts(self):
+        """Test new tickets do not shift or duplicate rows on later pages"""
+        paginator = KeysetPaginator(Ticket.objects.all(), 10)
+        first = paginator.page()
+        
+        Ticket.objects.create(
+            user=self.department_user,
+            name='Newest',
+            last_name='Ticket',
+            email='newest@example.com',
+            department='hr',
+            nature_of_engagement='for_copy'
+        )
+        
+        second = KeysetPaginator(Ticket.objects.all(), 10).page(after=first.next_cursor)
+        self.assertEqual(list(second), self.expected[10:20])
+    
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        """Test get_page ignores cursors it cannot decode"""
+        paginator = KeysetPaginator(Ticket.objects.all(), 10)
+        with self.assertRaises(InvalidCursor):
+            paginator.page(after='not-a-cursor')
+        self.assertEqual(list(paginator.get_page(after='not-a-cursor')), self.expected[:10])
+    
+    def test_annotation_ordering(self):
+        """Test pages can seek on an annotation such as a search rank"""
+        ranked = Ticket.objects.annotate(rank=(F('id') % 3) / Value(4.0))
+        expected = list(ranked.order_by('-rank', '-id'))
+        paginator = KeysetPaginator(ranked, 10, ordering=('-rank', '-id'))
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(after=page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, expected)
+        self.assertEqual(list(paginator.page(before=page.previous_cursor)), expected[10:20])
+    
+    def test_admin_dashboard_keeps_search_rank(self):
+        """Test ranked search results are paged in relevance order"""
+        self.client.login(username='admin', password='testpass123')
+        ranked = Ticket.objects.annotate(rank=(F('id') % 3) / Value(4.0))
+        expected = list(ranked.order_by('-rank', '-id'))
+        
+        with mock.patch('tickets.forms.search_tickets', side_effect=lambda tickets, query: tickets.annotate(
+            rank=(F('id') % 3) / Value(4.0)
+        ).order_by('-rank', '-date_created')):
+            response = self.client.get(reverse('tickets:admin_dashboard'), {'search': 'user'})
+            self.assertEqual(list(response.context['tickets']), expected[:15])
+            response = self.client.get(
+                reverse('tickets:admin_dashboard'), {'search': 'user', 'after': response.context['tickets'].next_cursor}
+            )
+        self.assertEqual(list(response.context['tickets']), expected[15:])
+    
+    def test_approximate_count(self):
+        """Test the approximate count falls back to COUNT(*) without planner estimates"""
+        if connection.vendor == 'postgresql':
+            self.skipTest('PostgreSQL returns planner estimates')
+        paginator = KeysetPaginator(Ticket.objects.all(), 10, approximate=True)
+        self.assertEqual(paginator.count, 25)
+        self.assertEqual(approximate_count(Ticket.objects.filter(name='User0')), 1)
+    
+    def test_admin_dashboard_deep_page(self):
+        """Test admin dashboard pages by cursor with a constant number of queries"""
+        self.client.login(username='admin', password='testpass123')
+        
+        response = self.client.get(reverse('tickets:admin_dashboard'), {'department': 'hr'})
+        page = response.context['tickets']
+        self.assertEqual(list(page), self.expected[:15])
+        self.assertEqual(response.context['page_query'], 'department=hr')
+        self.assertContains(response, f'?department=hr&after={page.next_cursor}')
+        
+        # status counts, page of tickets, bulk assignee choices (navbar total is cached)
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse('tickets:admin_dashboard'),
+                {'department': 'hr', 'after': page.next_cursor}
+            )
+        self.assertEqual(list(response.context['tickets']), self.expected[15:])
+
+
+class ConversationLoaderTests(TestCase):
+    """Query-count regression tests for conversation views"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        cache.clear()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            first_name='Department',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            first_name='Admin',
+            role='admin'
+        )
+        
+        self.ticket = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_copy',
+            assigned_to=self.admin_user
+        )
+    
+    def add_messages(self, count):
+        """Create alternating admin/user messages, oldest first"""
+        now = timezone.now()
+        TicketMessage.objects.bulk_create([
+            TicketMessage(
+                ticket=self.ticket,
+                sender=self.admin_user if i % 2 else self.department_user,
+                is_admin_message=bool(i % 2),
+                message=f'Message {i}',
+            )
+            for i in range(count)
+        ])
+        # created_at is auto_now_add, so spread the rows out after insertion
+        for i, message in enumerate(TicketMessage.objects.filter(ticket=self.ticket).order_by('id')):
+            TicketMessage.objects.filter(pk=message.pk).update(created_at=now - timedelta(minutes=count - i))
+    
+    def test_load_conversation_window(self):
+        """Test the loader returns the newest window in chronological order"""
+        self.add_messages(60)
+        
+        with self.assertNumQueries(1):
+            conversation = load_conversation(self.ticket, limit=50)
+            senders = [message.sender.first_name for message in conversation]
+        
+        self.assertEqual(len(conversation), 50)
+        self.assertEqual(conversation.messages[0].message, 'Message 10')
+        self.assertEqual(conversation.messages[-1].message, 'Message 59')
+        self.assertEqual(set(senders), {'Admin', 'Department'})
+        self.assertTrue(conversation.has_older)
+        
+        older = load_conversation(self.ticket, limit=50, older_than=conversation.older_cursor)
+        self.assertEqual([m.message for m in older], [f'Message {i}' for i in range(10)])
+        self.assertFalse(older.has_older)
+    
+    def test_admin_conversation_query_count(self):
+        """Test the admin thread costs the same number of queries for any length"""
+        self.client.login(username='admin', password='testpass123')
+        self.add_messages(5)
+        
+        # ticket + assignee, message window, read cursor, is_read, navbar unread total
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('tickets:ticket_conversation', args=[self.ticket.id]))
+        self.assertEqual(response.status_code, 200)
+        
+        self.add_messages(200)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('tickets:ticket_conversation', args=[self.ticket.id]))
+        self.assertEqual(len(response.context['conversation_messages']), 50)
+        self.assertContains(response, 'Load older messages')
+    
+    def test_user_conversation_query_count(self):
+        """Test the requester thread costs the same number of queries for any length"""
+        self.client.login(username='deptuser', password='testpass123')
+        self.add_messages(200)
+        
+        # ticket + assignee, message window, read cursor, is_read, navbar unread total
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]))
+        self.assertEqual(response.status_code, 200)
+        
+        cursor = response.context['conversation'].older_cursor
+        response = self.client.get(
+            reverse('tickets:user_ticket_conversation', args=[self.ticket.id]),
+            {'older': cursor}
+        )
+        self.assertEqual(len(response.context['conversation_messages']), 50)
+        self.assertEqual(response.context['conversation_messages'][-1].message, 'Message 149')
+
+    
+    def test_viewing_read_thread_does_not_write(self):
+        """Test re-opening an already read thread runs no UPDATE or INSERT"""
+        self.client.login(username='admin', password='testpass123')
+        self.add_messages(3)
+        url = reverse('tickets:ticket_conversation', args=[self.ticket.id])
+        self.client.get(url)
+        
+        state = TicketReadState.objects.get(ticket=self.ticket, user=self.admin_user)
+        self.assertEqual(state.last_read_message_id, self.ticket.messages.order_by('-id')[0].id)
+        
+        # ticket + assignee + read cursor, message window (navbar total is cached)
+        with self.assertNumQueries(2) as context:
+            self.client.get(url)
+        for query in context.captured_queries:
+            self.assertTrue(query['sql'].startswith('SELECT'), query['sql'])
+        
+        # A new reply from the requester is unread until the admin looks again
+        reply = TicketMessage.objects.create(ticket=self.ticket, sender=self.department_user, message='Thanks')
+        ticket = Ticket.objects.with_read_cursor(self.admin_user).get(pk=self.ticket.pk)
+        self.assertEqual(list(unread_messages(ticket, self.admin_user)), [reply])
+        
+        self.client.get(url)
+        state.refresh_from_db()
+        self.assertEqual(state.last_read_message_id, reply.id)
+        self.assertEqual(TicketReadState.objects.filter(ticket=self.ticket).count(), 1)
+    
+    def test_reading_marks_messages_read(self):
+        """Test the cursor takes the highest id shown and is_read follows it"""
+        self.add_messages(4)
+        # The newest message by id is shown first by date
+        newest = self.ticket.messages.order_by('-id')[0]
+        TicketMessage.objects.filter(pk=newest.pk).update(created_at=timezone.now() - timedelta(days=1))
+    
+        self.client.login(username='deptuser', password='testpass123')
+        self.client.get(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]))
+    
+        state = TicketReadState.objects.get(ticket=self.ticket, user=self.department_user)
+        self.assertEqual(state.last_read_message_id, newest.id)
+        self.assertEqual(
+            set(self.ticket.messages.filter(is_admin_message=True).values_list('is_read', flat=True)), {True}
+        )
+        self.assertEqual(
+            set(self.ticket.messages.filter(is_admin_message=False).values_list('is_read', flat=True)), {False}
+        )
+    
+    def test_unread_counts_per_ticket(self):
+        """Test unread badges for every listed ticket come from the listing query"""
+        other = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_review'
+        )
+        self.add_messages(4)  # two from each side
+        TicketMessage.objects.create(ticket=other, sender=self.admin_user, message='Hi', is_admin_message=True)
+        
+        with self.assertNumQueries(1):
+            counts = dict(Ticket.objects.with_unread_count(self.department_user).values_list('id', 'unread_count'))
+        self.assertEqual(counts, {self.ticket.id: 2, other.id: 1})
+        
+        counts = dict(Ticket.objects.with_unread_count(self.admin_user).values_list('id', 'unread_count'))
+        self.assertEqual(counts, {self.ticket.id: 2, other.id: 0})
+        
+        self.client.login(username='deptuser', password='testpass123')
+        self.client.get(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]))
+        response = self.client.get(reverse('tickets:user_dashboard'))
+        unread = {ticket.id: ticket.unread_count for ticket in response.context['tickets']}
+        self.assertEqual(unread, {self.ticket.id: 0, other.id: 1})
+    
+    def test_navbar_unread_total_is_cached(self):
+        """Test the navbar total is computed once and refreshed when the user reads"""
+        self.add_messages(4)
+        self.assertEqual(count_unread_total(self.department_user), 2)
+        self.assertEqual(count_unread_total(self.admin_user), 2)
+        
+        self.client.login(username='deptuser', password='testpass123')
+        response = self.client.get(reverse('tickets:user_dashboard'))
+        self.assertEqual(response.context['unread_message_total'], 2)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_total(self.department_user), 2)
+        
+        self.client.get(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]))
+        response = self.client.get(reverse('tickets:user_dashboard'))
+        self.assertEqual(response.context['unread_message_total'], 0)
+        self.assertNotContains(response, 'title="Unread messages"')
+
+class TicketActivityCounterTests(TestCase):
+    """Tests for the denormalized message counters on Ticket"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        cache.clear()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            first_name='Department',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            first_name='Admin',
+            role='admin'
+        )
+        
+        self.ticket = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_copy'
+        )
+    
+    def test_counters_follow_messages(self):
+        """Test creating and deleting messages keeps the counters in step"""
+        self.assertEqual(self.ticket.message_count, 0)
+        self.assertIsNone(self.ticket.last_message_at)
+        self.assertEqual(self.ticket.last_activity_at, self.ticket.date_created)
+        
+        first = TicketMessage.objects.create(ticket=self.ticket, sender=self.department_user, message='Hello')
+        reply = TicketMessage.objects.create(
+            ticket=self.ticket, sender=self.admin_user, message='Hi', is_admin_message=True
+        )
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.message_count, 2)
+        self.assertEqual(self.ticket.last_message_at, reply.created_at)
+        self.assertTrue(self.ticket.last_message_by_admin)
+        self.assertEqual(self.ticket.last_activity_at, reply.created_at)
+        
+        reply.delete()
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.message_count, 1)
+        self.assertEqual(self.ticket.last_message_at, first.created_at)
+        self.assertFalse(self.ticket.last_message_by_admin)
+        
+        first.delete()
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.message_count, 0)
+        self.assertIsNone(self.ticket.last_message_at)
+        self.assertIsNone(self.ticket.last_message_by_admin)
+        self.assertEqual(self.ticket.last_activity_at, self.ticket.date_created)
+        self.assertFalse(Ticket.objects.with_stale_activity().exists())
+    
+    def test_recompute_command_repairs_and_verifies(self):
+        """Test the management command finds and fixes drifted counters"""
+        # bulk_create bypasses TicketMessage.save, leaving the counters stale
+        TicketMessage.objects.bulk_create([
+            TicketMessage(ticket=self.ticket, sender=self.department_user, message=f'Message {i}')
+            for i in range(3)
+        ])
+        self.assertEqual(list(Ticket.objects.with_stale_activity()), [self.ticket])
+        
+        with self.assertRaisesMessage(CommandError, '1 ticket(s) have stale activity counters: #%d' % self.ticket.id):
+            call_command('recompute_ticket_activity', '--check', stdout=StringIO())
+        
+        out = StringIO()
+        call_command('recompute_ticket_activity', '--batch-size', '1', stdout=out)
+        self.assertIn('Recomputed activity counters for 1 ticket(s).', out.getvalue())
+        
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.message_count, 3)
+        self.assertFalse(self.ticket.last_message_by_admin)
+        call_command('recompute_ticket_activity', '--check', stdout=out)
+        self.assertIn('up to date', out.getvalue())
+    
+    def test_dashboard_sorts_by_recent_activity(self):
+        """Test the activity sort puts the most recently discussed ticket first"""
+        newer = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_review'
+        )
+        TicketMessage.objects.create(ticket=self.ticket, sender=self.department_user, message='Any update?')
+        
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('tickets:admin_dashboard'))
+        self.assertEqual([ticket.id for ticket in response.context['tickets']], [newer.id, self.ticket.id])
+        
+        response = self.client.get(reverse('tickets:admin_dashboard'), {'sort': 'activity'})
+        self.assertEqual([ticket.id for ticket in response.context['tickets']], [self.ticket.id, newer.id])
+        self.assertContains(response, '1 message')
+        
+        self.client.login(username='deptuser', password='testpass123')
+        response = self.client.get(reverse('tickets:user_dashboard'), {'sort': 'activity'})
+        self.assertEqual([ticket.id for ticket in response.context['tickets']], [self.ticket.id, newer.id])
+    
+    def test_activity_sort_uses_index(self):
+        """Test the activity ordering can be served by ticket_activity_idx"""
+        plan = Ticket.objects.order_by('-last_activity_at', '-id')[:15].explain()
+        self.assertIn('ticket_activity_idx', plan)
+
+
+class DocumentDownloadTests(TestCase):
+    """Tests for ranged, conditional and offloaded document downloads"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.content = bytes(range(256)) * 40
+        self.ticket = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_review',
+            document_attached=SimpleUploadedFile('contract.pdf', self.content, content_type='application/pdf')
+        )
+        self.url = reverse('tickets:download_document', args=[self.ticket.id])
+        self.etag = '"%s"' % hashlib.sha256(self.content).hexdigest()
+        self.client.login(username='admin', password='testpass123')
+    
+    def test_hash_stored_on_upload(self):
+        """Test the content hash is stored when a document is uploaded or replaced"""
+        self.assertEqual(self.ticket.document_attached_sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(self.ticket.reviewed_document_sha256, '')
+        
+        self.ticket.reviewed_document = SimpleUploadedFile('reviewed.pdf', b'reviewed', content_type='application/pdf')
+        self.ticket.save(update_fields=['reviewed_document'])
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.reviewed_document_sha256, hashlib.sha256(b'reviewed').hexdigest())
+    
+    def test_full_download(self):
+        """Test a plain GET streams the whole file with validators"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertIn('attachment', response['Content-Disposition'])
+    
+    def test_if_none_match(self):
+        """Test a matching If-None-Match answers 304 without reading the file"""
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], self.etag)
+    
+    def test_range_requests(self):
+        """Test single byte ranges, suffix ranges and unsatisfiable ranges"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/%d' % len(self.content))
+        self.assertEqual(response['Content-Length'], '100')
+        
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        
+        response = self.client.get(self.url, HTTP_RANGE='bytes=%d-' % len(self.content))
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */%d' % len(self.content))
+        
+        # A stale If-Range validator gets the whole, current file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content)), len(self.content))
+    
+    async def test_asgi_download_streams(self):
+        """Test ASGI downloads are streamed block by block instead of read whole"""
+        await self.async_client.aforce_login(self.admin_user)
+        with mock.patch.object(DocumentResponse, 'block_size', 1000):
+            response = await self.async_client.get(self.url, headers={'Range': 'bytes=100-4099'})
+            self.assertEqual(response.status_code, 206)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b''.join(chunks), self.content[100:4100])
+    
+    def test_proxy_offload(self):
+        """Test the proxy is told which file to send after the permission check"""
+        with override_settings(TICKET_DOWNLOAD_OFFLOAD='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}')
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response.content, b'')
+        
+        with override_settings(TICKET_DOWNLOAD_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.ticket.document_attached.path)
+        
+        self.client.login(username='deptuser', password='testpass123')
+        with override_settings(TICKET_DOWNLOAD_OFFLOAD='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Tests for deduplicated, reference-counted upload storage"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        self.content = b'%PDF-1.4 standard contract template'
+        self.sha256 = hashlib.sha256(self.content).hexdigest()
+    
+    def create_ticket(self, content, filename='contract.pdf'):
+        return Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_review',
+            document_attached=SimpleUploadedFile(filename, content, content_type='application/pdf')
+        )
+    
+    def blob_files(self):
+        return [name for _dir, _dirs, files in os.walk(os.path.join(self.media_root, 'blobs')) for name in files]
+    
+    def test_identical_uploads_share_one_blob(self):
+        """Test repeated uploads are stored once and keep their own filenames"""
+        first = self.create_ticket(self.content)
+        second = self.create_ticket(self.content, filename='copy of contract.pdf')
+        
+        self.assertEqual(first.document_attached.name, f'documents/contract_{self.sha256}.pdf')
+        self.assertEqual(second.get_document_filename(), 'copy_of_contract.pdf')
+        self.assertEqual(self.blob_files(), [self.sha256])
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+        self.assertEqual(second.document_attached_sha256, self.sha256)
+        self.assertEqual(first.document_attached.path, second.document_attached.path)
+        with second.document_attached.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        
+        self.client.login(username='deptuser', password='testpass123')
+        response = self.client.get(reverse('tickets:user_download_document', args=[second.id]))
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['ETag'], f'"{self.sha256}"')
+        self.assertIn('copy_of_contract.pdf', response['Content-Disposition'])
+    
+    def test_upload_hashed_once(self):
+        """Test a new upload is read once for both its hash column and its blob"""
+        upload = SimpleUploadedFile('contract.pdf', self.content, content_type='application/pdf')
+        with mock.patch.object(SimpleUploadedFile, 'chunks', wraps=upload.chunks) as chunks:
+            ticket = Ticket(
+                user=self.department_user,
+                name='John',
+                last_name='Doe',
+                email='john@example.com',
+                department='hr',
+                nature_of_engagement='for_review',
+                document_attached=upload
+            )
+            ticket.save()
+        # Once to hash, once to write the blob
+        self.assertEqual(chunks.call_count, 2)
+        self.assertEqual(ticket.document_attached_sha256, self.sha256)
+        self.assertEqual(ticket.document_attached.name, f'documents/contract_{self.sha256}.pdf')
+    
+    def test_release_and_sweep(self):
+        """Test dropped references are counted down and unreferenced blobs swept"""
+        first = self.create_ticket(self.content)
+        second = self.create_ticket(self.content)
+        
+        first.document_attached = SimpleUploadedFile('signed.pdf', b'signed', content_type='application/pdf')
+        first.save()
+        self.assertEqual(StoredBlob.objects.get(pk=self.sha256).ref_count, 1)
+        
+        second.delete()
+        blob = StoredBlob.objects.get(pk=self.sha256)
+        self.assertEqual(blob.ref_count, 0)
+        self.assertIsNotNone(blob.released_at)
+        
+        # Still inside the grace period
+        call_command('sweep_blobs', stdout=StringIO())
+        self.assertIn(self.sha256, self.blob_files())
+        
+        out = StringIO()
+        call_command('sweep_blobs', '--grace-hours', '0', stdout=out)
+        self.assertIn('Freed', out.getvalue())
+        self.assertEqual(self.blob_files(), [hashlib.sha256(b'signed').hexdigest()])
+        self.assertFalse(StoredBlob.objects.filter(pk=self.sha256).exists())
+    
+    def test_sweep_repairs_drifted_counts(self):
+        """Test the sweep recounts references missed by queryset deletes"""
+        ticket = self.create_ticket(self.content)
+        self.create_ticket(self.content)
+        # Queryset deletes bypass Ticket.delete()
+        Ticket.objects.filter(pk=ticket.pk).delete()
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+        
+        call_command('sweep_blobs', '--grace-hours', '0', stdout=StringIO())
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertEqual(self.blob_files(), [self.sha256])
+    
+    def test_legacy_names_served_from_their_own_path(self):
+        """Test files stored before content addressing still resolve"""
+        os.makedirs(os.path.join(self.media_root, 'documents'))
+        with open(os.path.join(self.media_root, 'documents', 'old.pdf'), 'wb') as f:
+            f.write(self.content)
+        ticket = self.create_ticket(self.content)
+        Ticket.objects.filter(pk=ticket.pk).update(document_attached='documents/old.pdf')
+        ticket.refresh_from_db()
+        
+        self.assertEqual(ticket.document_attached.path, os.path.join(self.media_root, 'documents', 'old.pdf'))
+        self.assertEqual(ticket.document_attached.size, len(self.content))
+
+
+class ChunkedUploadTests(TestCase):
+    """Tests for chunked, resumable uploads"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        media_root = tempfile.mkdtemp()
+        upload_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.addCleanup(shutil.rmtree, upload_root)
+        paths = override_settings(MEDIA_ROOT=media_root, TICKET_UPLOAD_TEMP_DIR=upload_root)
+        paths.enable()
+        self.addCleanup(paths.disable)
+        self.upload_root = upload_root
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.ticket = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_review'
+        )
+        self.content = b'reviewed contract ' * 1000
+        self.client.login(username='admin', password='testpass123')
+    
+    def start_upload(self, content, filename='reviewed.pdf'):
+        response = self.client.post(reverse('tickets:create_upload'), {
+            'filename': filename,
+            'size': len(content),
+            'sha256': hashlib.sha256(content).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+    
+    def put_chunk(self, session, content, first, last):
+        return self.client.put(
+            session['url'], content[first:last + 1], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{len(content)}',
+        )
+    
+    def test_resumable_upload_attached_to_ticket(self):
+        """Test chunks resume from the stored offset and the result attaches to a ticket"""
+        session = self.start_upload(self.content)
+        self.assertEqual(session['offset'], 0)
+        
+        response = self.put_chunk(session, self.content, 0, 9999)
+        self.assertEqual(response.json()['offset'], 10000)
+        
+        # A resent or skipped chunk is refused with the offset to continue from
+        response = self.put_chunk(session, self.content, 0, 9999)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 10000)
+        
+        # Completing early is refused
+        response = self.client.post(session['url'] + 'complete/')
+        self.assertEqual(response.status_code, 409)
+        
+        # The client reconnects and asks where to resume
+        self.assertEqual(self.client.get(session['url']).json()['offset'], 10000)
+        response = self.put_chunk(session, self.content, 10000, len(self.content) - 1)
+        self.assertEqual(response.json()['offset'], len(self.content))
+        
+        response = self.client.post(session['url'] + 'complete/')
+        self.assertEqual(response.json()['status'], 'complete')
+        
+        response = self.client.post(reverse('tickets:admin_ticket_detail', args=[self.ticket.id]), {
+            'status': 'completed',
+            'priority': 'medium',
+            'reviewed_document_upload': session['id'],
+        })
+        self.assertEqual(response.status_code, 302)
+        
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.get_reviewed_document_filename(), 'reviewed.pdf')
+        with self.ticket.reviewed_document.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(self.ticket.reviewed_document_sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(self.upload_root), [])
+    
+    def test_upload_attached_to_message(self):
+        """Test a completed upload can be attached to a conversation message"""
+        content = b'signed copy'
+        session = self.start_upload(content, filename='signed.pdf')
+        self.put_chunk(session, content, 0, len(content) - 1)
+        self.client.post(session['url'] + 'complete/')
+        
+        self.client.post(reverse('tickets:ticket_conversation', args=[self.ticket.id]), {
+            'message': 'Signed copy attached',
+            'attachment_upload': session['id'],
+        })
+        message = TicketMessage.objects.get()
+        with message.attachment.open('rb') as f:
+            self.assertEqual(f.read(), content)
+    
+    def test_invalid_form_closes_upload(self):
+        """Test a rejected form closes the upload it opened and keeps it for the next try"""
+        content = b'signed copy'
+        session = self.start_upload(content, filename='signed.pdf')
+        self.put_chunk(session, content, 0, len(content) - 1)
+        self.client.post(session['url'] + 'complete/')
+        url = reverse('tickets:ticket_conversation', args=[self.ticket.id])
+        
+        response = self.client.post(url, {'message': '', 'attachment_upload': session['id']})
+        self.assertEqual(response.status_code, 200)
+        [(_session, upload)] = response.context['form'].upload_sessions
+        self.assertTrue(upload.closed)
+        self.assertTrue(UploadSession.objects.filter(pk=session['id']).exists())
+        
+        self.client.post(url, {'message': 'Signed copy attached', 'attachment_upload': session['id']})
+        with TicketMessage.objects.get().attachment.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertFalse(UploadSession.objects.exists())
+    
+    def test_checksum_mismatch_resets_upload(self):
+        """Test an upload whose bytes do not match the declared checksum starts over"""
+        session = self.start_upload(self.content)
+        corrupted = b'x' + self.content[1:]
+        self.put_chunk(session, corrupted, 0, len(corrupted) - 1)
+        
+        response = self.client.post(session['url'] + 'complete/')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertEqual(UploadSession.objects.get().status, 'open')
+    
+    def test_uploads_are_private(self):
+        """Test users cannot see, extend or attach each other's uploads"""
+        session = self.start_upload(self.content)
+        self.put_chunk(session, self.content, 0, len(self.content) - 1)
+        self.client.post(session['url'] + 'complete/')
+        
+        self.client.login(username='deptuser', password='testpass123')
+        self.assertEqual(self.client.get(session['url']).status_code, 404)
+        response = self.client.post(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]), {
+            'message': 'Trying to attach',
+            'attachment_upload': session['id'],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(TicketMessage.objects.exists())
+    
+    def test_chunks_are_bounded(self):
+        """Test oversized chunks and ranges outside the file are refused"""
+        session = self.start_upload(self.content)
+        response = self.client.put(
+            session['url'], b'', content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-{MAX_CHUNK_SIZE}/{len(self.content)}',
+        )
+        self.assertEqual(response.status_code, 416)
+        
+        with override_settings(TICKET_UPLOAD_MAX_SIZE=100):
+            response = self.client.post(reverse('tickets:create_upload'), {
+                'filename': 'big.pdf', 'size': 101, 'sha256': '0' * 64,
+            })
+        self.assertEqual(response.status_code, 400)
+    
+    def test_expired_sessions_cleared(self):
+        """Test abandoned sessions and their partial files are removed"""
+        session = self.start_upload(self.content)
+        self.put_chunk(session, self.content, 0, 99)
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        
+        out = StringIO()
+        call_command('clear_upload_sessions', stdout=out)
+        self.assertIn('Cleared 1 upload session(s).', out.getvalue())
+        self.assertEqual(os.listdir(self.upload_root), [])
+
+
+class TicketEventStreamTests(TestCase):
+    """Tests for live ticket events over Server-Sent Events"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            first_name='Department',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.ticket = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_copy'
+        )
+    
+    def test_posting_message_publishes_once_on_commit(self):
+        """Test a new message is fanned out once after the transaction commits"""
+        self.client.login(username='deptuser', password='testpass123')
+        
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse('tickets:user_ticket_conversation', args=[self.ticket.id]),
+                    {'message': 'Any update?'}
+                )
+        
+        publish.assert_called_once()
+        channel, event = publish.call_args[0]
+        self.assertEqual(channel, ticket_channel(self.ticket.id))
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['message'], 'Any update?')
+        self.assertEqual(event['sender'], 'Department')
+        self.assertIsNone(event['attachment'])
+    
+    def test_message_event_describes_attachment(self):
+        """Test live message events carry the attachment's name and link"""
+        self.client.login(username='admin', password='testpass123')
+        
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('tickets:ticket_conversation', args=[self.ticket.id]), {
+                    'message': 'Signed copy attached',
+                    'attachment': SimpleUploadedFile('signed.pdf', b'signed', content_type='application/pdf'),
+                })
+        
+        event = publish.call_args[0][1]
+        message = TicketMessage.objects.get()
+        url = reverse('tickets:download_message_attachment', args=[self.ticket.id, message.id])
+        self.assertEqual(event['attachment'], {'name': 'signed.pdf', 'url': url})
+        
+        # The link checks who is asking
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'signed')
+        self.client.login(username='deptuser', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        User.objects.create_user(username='other', email='other@example.com', password='testpass123', role='user')
+        self.client.login(username='other', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 404)
+    
+    async def test_streamed_bodies_step_in_thread(self):
+        """Test ASGI bodies are stepped from a worker thread and closed when abandoned"""
+        closed = []
+        
+        def numbers():
+            try:
+                yield from range(5)
+            finally:
+                closed.append(True)
+        
+        stream = iterate_in_thread(numbers(), batch=2)
+        self.assertEqual([await anext(stream) for _ in range(3)], [0, 1, 2])
+        await stream.aclose()
+        self.assertEqual(closed, [True])
+    
+    def test_postgres_broker_notifies(self):
+        """Test the PostgreSQL broker sends events through NOTIFY, trimming oversized ones"""
+        broker = PostgresBroker()
+        with mock.patch('tickets.events.connections') as connections:
+            cursor = connections['default'].cursor.return_value.__enter__.return_value
+            broker.publish('ticket:1', {'type': 'message', 'message': 'Hi'})
+            broker.publish('ticket:1', {'type': 'message', 'message': 'x' * 10000})
+        
+        (sql, (channel, payload)), _ = cursor.execute.call_args_list[0]
+        self.assertEqual((sql, channel), ('SELECT pg_notify(%s, %s)', 'ticket_events'))
+        self.assertEqual(json.loads(payload), {'channel': 'ticket:1', 'event': {'type': 'message', 'message': 'Hi'}})
+        payload = json.loads(cursor.execute.call_args_list[1][0][1][1])
+        self.assertEqual(payload['event'], {'type': 'message', 'truncated': True})
+    
+    def test_status_change_publishes_event(self):
+        """Test changing the status from the admin detail page publishes it"""
+        self.client.login(username='admin', password='testpass123')
+        
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse('tickets:admin_ticket_detail', args=[self.ticket.id]),
+                    {'status': 'completed', 'priority': 'medium'}
+                )
+        
+        publish.assert_called_once_with(ticket_channel(self.ticket.id), {
+            'type': 'status',
+            'ticket': self.ticket.id,
+            'status': 'completed',
+            'status_display': 'Completed',
+        })
+    
+    def test_stream_requires_asgi(self):
+        """Test the stream is refused under WSGI instead of pinning a worker"""
+        self.client.login(username='deptuser', password='testpass123')
+        response = self.client.get(reverse('tickets:ticket_events', args=[self.ticket.id]))
+        self.assertEqual(response.status_code, 501)
+    
+    async def test_stream_delivers_events(self):
+        """Test subscribers receive events published from sync code"""
+        await self.async_client.aforce_login(self.department_user)
+        response = await self.async_client.get(reverse('tickets:ticket_events', args=[self.ticket.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b': connected\n\n')
+        
+        get_broker().publish(ticket_channel(self.ticket.id), {'type': 'status', 'status': 'completed'})
+        chunk = await asyncio.wait_for(anext(content), 5)
+        self.assertEqual(chunk, b'event: status\ndata: {"type": "status", "status": "completed"}\n\n')
+        await content.aclose()
+    
+    async def test_stream_checks_ticket_access(self):
+        """Test users cannot subscribe to other users' tickets"""
+        other_user = await User.objects.acreate(username='otheruser', email='other@example.com', role='user')
+        await self.async_client.aforce_login(other_user)
+        response = await self.async_client.get(reverse('tickets:ticket_events', args=[self.ticket.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class TicketNotificationTests(TestCase):
+    """Tests for batched email notification digests"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            first_name='Department',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.ticket = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_copy'
+        )
+    
+    def post_admin_messages(self, *texts):
+        self.client.login(username='admin', password='testpass123')
+        for text in texts:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('tickets:ticket_conversation', args=[self.ticket.id]), {'message': text})
+    
+    def test_burst_is_sent_as_one_digest(self):
+        """Test several events in one window reach the requester as a single email"""
+        self.post_admin_messages('First reply', 'Second reply')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('tickets:admin_ticket_detail', args=[self.ticket.id]),
+                {'status': 'completed', 'priority': 'medium'}
+            )
+        self.assertEqual(TicketNotification.objects.filter(recipient=self.department_user).count(), 3)
+        # One send job for the window, not one per event
+        self.assertEqual(Job.objects.filter(task='tickets.send_notification_digests').count(), 1)
+        
+        Worker().run(burst=True)
+        self.assertEqual(mail.outbox, [])  # Not due until the window closes
+        
+        Job.objects.update(run_after=timezone.now())
+        TicketNotification.objects.update(deliver_after=timezone.now())
+        Worker().run(burst=True)
+        
+        self.assertEqual(len(mail.outbox), 1)
+        digest = mail.outbox[0]
+        self.assertEqual(digest.to, ['dept@example.com'])
+        self.assertIn(f'ticket #{self.ticket.id}', digest.subject)
+        self.assertIn('3 updates', digest.body)
+        self.assertIn('Status changed to Completed', digest.body)
+        self.assertFalse(TicketNotification.objects.filter(sent_at__isnull=True).exists())
+        
+        # Sent notifications are not mailed again
+        self.assertEqual(send_due_notifications(), 0)
+    
+    def test_late_notification_is_sent(self):
+        """Test an event committed after its window's job ran gets a send job of its own"""
+        self.post_admin_messages('First reply')
+        Job.objects.update(run_after=timezone.now())
+        TicketNotification.objects.update(deliver_after=timezone.now())
+        Worker().run(burst=True)
+        self.assertEqual(len(mail.outbox), 1)
+        
+        # A reply in the same window whose transaction committed late
+        window_end = TicketNotification.objects.get().deliver_after
+        with mock.patch('tickets.notifications.digest_window_end', return_value=window_end):
+            self.post_admin_messages('Late reply')
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+        
+        Worker().run(burst=True)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(TicketNotification.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(Job.objects.filter(task='tickets.send_notification_digests').count(), 2)
+    
+    def test_digests_share_one_connection(self):
+        """Test every due digest is sent over a single backend connection"""
+        other_user = User.objects.create_user(username='other', email='other@example.com', role='user')
+        other_ticket = Ticket.objects.create(
+            user=other_user, name='Jane', last_name='Roe', email='jane@example.com',
+            department='it', nature_of_engagement='for_copy'
+        )
+        for ticket in (self.ticket, other_ticket):
+            TicketMessage.objects.create(ticket=ticket, sender=self.admin_user, message='Hi', is_admin_message=True)
+            TicketNotification.objects.create(
+                recipient=ticket.user, ticket=ticket, kind='message', summary='New message', deliver_after=timezone.now()
+            )
+        
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open_connection:
+            self.assertEqual(send_due_notifications(), 2)
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['dept@example.com', 'other@example.com'])
+    
+    def test_user_message_notifies_admins(self):
+        """Test requester messages go to the assignee, or every admin while unassigned"""
+        other_admin = User.objects.create_user(username='admin2', email='admin2@example.com', role='admin')
+        self.client.login(username='deptuser', password='testpass123')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]), {'message': 'Any news?'})
+        self.assertCountEqual(
+            TicketNotification.objects.values_list('recipient__username', flat=True), ['admin', 'admin2']
+        )
+        
+        TicketNotification.objects.all().delete()
+        self.ticket.assigned_to = other_admin
+        self.ticket.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]), {'message': 'Hello?'})
+        self.assertEqual(list(TicketNotification.objects.values_list('recipient__username', flat=True)), ['admin2'])
+    
+    def test_preferences(self):
+        """Test users can opt out of event kinds and choose their digest interval"""
+        self.client.login(username='deptuser', password='testpass123')
+        response = self.client.post(reverse('tickets:notification_preferences'), {
+            'email_status_changes': 'on',
+            'digest_minutes': 0,
+        })
+        self.assertRedirects(response, reverse('tickets:notification_preferences'))
+        preference = NotificationPreference.objects.get(user=self.department_user)
+        self.assertFalse(preference.email_messages)
+        
+        self.post_admin_messages('Ignored reply')
+        self.assertFalse(TicketNotification.objects.exists())
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('tickets:admin_ticket_detail', args=[self.ticket.id]),
+                {'status': 'completed', 'priority': 'medium'}
+            )
+        # Immediate delivery: the send job is due straight away
+        Worker().run(burst=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Status changed to Completed', mail.outbox[0].body)
+    
+    def test_digest_window_end(self):
+        """Test windows end on interval boundaries and immediate delivery is not delayed"""
+        now = timezone.now().replace(hour=10, minute=7, second=30)
+        self.assertEqual(digest_window_end(now, 15), now.replace(minute=15, second=0, microsecond=0))
+        self.assertEqual(digest_window_end(now.replace(minute=15, second=0, microsecond=0), 15), now.replace(minute=30, second=0, microsecond=0))
+        self.assertEqual(digest_window_end(now, 0), now)
+
+
+class BulkTicketActionTests(TestCase):
+    """Tests for bulk ticket actions"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.tickets = [
+            Ticket.objects.create(
+                user=self.department_user,
+                name='John',
+                last_name='Doe',
+                email='john@example.com',
+                department='hr',
+                nature_of_engagement='for_copy',
+                status=status
+            )
+            for status in ('pending', 'pending', 'completed')
+        ]
+        record_created(self.tickets)
+        self.ids = [ticket.id for ticket in self.tickets]
+    
+    def test_status_change_is_one_update(self):
+        """Test a bulk status change writes only the changed rows in one UPDATE"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            # Lock, UPDATE, status event INSERT, two rollup UPDATEs, reload, preferences and
+            # notification INSERT inside a savepoint; audit entries wait for the end of the request
+            with audit_scope(), self.assertNumQueries(10):
+                results = apply_bulk_action(self.ids + [999999], 'close', actor=self.admin_user)
+        
+        self.assertEqual(results, {
+            self.ids[0]: 'updated', self.ids[1]: 'updated', self.ids[2]: 'unchanged', 999999: 'not_found',
+        })
+        self.assertEqual(Ticket.objects.filter(pk__in=self.ids, status='completed').count(), 3)
+        # Notifications for the two changed tickets, queued with a single INSERT
+        self.assertEqual(TicketNotification.objects.filter(kind='status').count(), 2)
+        # Two live status events, one send job, the owners' dashboard invalidation, the two
+        # audit entries joining the buffer and the buffer's write
+        self.assertEqual(len(callbacks), 7)
+    
+    def test_invalid_actions(self):
+        """Test invalid actions and values are rejected before anything is written"""
+        with self.assertRaises(BulkActionError):
+            apply_bulk_action(self.ids, 'status', 'archived')
+        with self.assertRaises(BulkActionError):
+            apply_bulk_action(self.ids, 'assign', self.department_user.pk)
+        with self.assertRaises(BulkActionError):
+            apply_bulk_action(self.ids, 'delete')
+        with self.assertRaises(BulkActionError):
+            apply_bulk_action([], 'close')
+        self.assertEqual(Ticket.objects.filter(status='pending').count(), 2)
+    
+    def test_dashboard_bulk_reassign(self):
+        """Test admins can reassign selected tickets from the dashboard"""
+        self.client.login(username='admin', password='testpass123')
+        next_url = reverse('tickets:admin_dashboard') + '?status=pending'
+        response = self.client.post(reverse('tickets:admin_bulk_update'), {
+            'tickets': self.ids[:2],
+            'action': 'assign',
+            'assigned_to': self.admin_user.pk,
+            'next': next_url,
+        }, follow=True)
+        
+        self.assertRedirects(response, next_url)
+        self.assertContains(response, '2 ticket(s) updated, 0 already up to date.')
+        self.assertEqual(Ticket.objects.filter(assigned_to=self.admin_user).count(), 2)
+        
+        response = self.client.post(reverse('tickets:admin_bulk_update'), {
+            'tickets': self.ids, 'action': 'priority', 'priority': 'high', 'next': 'https://example.com/',
+        })
+        self.assertRedirects(response, reverse('tickets:admin_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(Ticket.objects.filter(priority='high').count(), 3)
+    
+    def test_dashboard_bulk_requires_admin(self):
+        """Test department users cannot run bulk actions"""
+        self.client.login(username='deptuser', password='testpass123')
+        self.client.post(reverse('tickets:admin_bulk_update'), {'tickets': self.ids, 'action': 'close'})
+        self.assertEqual(Ticket.objects.filter(status='completed').count(), 1)
+
+
+class TicketExportTests(TestCase):
+    """Tests for streaming ticket exports"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        for index, status in enumerate(['pending', 'completed', 'pending']):
+            Ticket.objects.create(
+                user=self.department_user,
+                name=f'Requester{index}',
+                last_name='Doe, Jr.',
+                email='john@example.com',
+                department='hr',
+                nature_of_engagement='for_copy',
+                status=status,
+                assigned_to=self.admin_user if index == 0 else None
+            )
+    
+    def test_csv_export_streams_filtered_tickets(self):
+        """Test the CSV export applies the dashboard filters and streams display values"""
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('tickets:export_tickets'), {'status': 'pending', 'format': 'csv'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['Ticket #', 'Status', 'Priority'])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row[1] for row in rows[1:]}, {'Pending'})
+        self.assertEqual(rows[2][5], 'Doe, Jr.')
+        self.assertEqual(rows[2][10], 'admin')
+    
+    def test_ndjson_export(self):
+        """Test the NDJSON export writes one JSON object per ticket"""
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('tickets:export_tickets'), {'format': 'ndjson'})
+        
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        record = json.loads(lines[-1])
+        self.assertEqual(record['name'], 'Requester0')
+        self.assertEqual(record['assigned_to_username'], 'admin')
+        self.assertEqual(record['status'], 'Pending')
+    
+    async def test_asgi_export_streams(self):
+        """Test ASGI exports are handed over buffer by buffer instead of read whole"""
+        await self.async_client.aforce_login(self.admin_user)
+        with mock.patch.object(exports, 'FLUSH_SIZE', 1):
+            response = await self.async_client.get(reverse('tickets:export_tickets'), {'format': 'csv'})
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        # The header, then one buffer per ticket
+        self.assertEqual(len(chunks), 4)
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual([row[4] for row in rows[1:]], ['Requester2', 'Requester1', 'Requester0'])
+    
+    def test_export_reads_in_chunks(self):
+        """Test rows are fetched through the iterator in fixed-size chunks"""
+        with mock.patch.object(exports, 'CHUNK_SIZE', 2):
+            with mock.patch('django.db.models.query.QuerySet.iterator', autospec=True,
+                            side_effect=lambda qs, chunk_size=None: iter(list(qs))) as iterator:
+                rows = list(exports.export_rows(Ticket.objects.order_by('id')))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(iterator.call_args.kwargs, {'chunk_size': 2})
+    
+    def test_xlsx_without_xlsxwriter(self):
+        """Test the XLSX export explains when its optional dependency is missing"""
+        self.client.login(username='admin', password='testpass123')
+        with mock.patch.dict('sys.modules', {'xlsxwriter': None}):
+            response = self.client.get(reverse('tickets:export_tickets'), {'format': 'xlsx'}, follow=True)
+        self.assertContains(response, 'XLSX export requires the XlsxWriter package.')
+    
+    def test_formulas_are_neutralized(self):
+        """Test free text that looks like a formula is exported as plain text"""
+        Ticket.objects.filter(name='Requester0').update(
+            name='=HYPERLINK("http://example.com")', remarks='+1 call back', admin_comments='@SUM(A1)'
+        )
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('tickets:export_tickets'), {'format': 'csv'})
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        row = next(row for row in rows if 'HYPERLINK' in row[4])
+        self.assertEqual(row[4], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(row[16], "'+1 call back")
+        self.assertEqual(row[17], "'@SUM(A1)")
+        self.assertEqual(row[5], 'Doe, Jr.')
+        
+        xlsxwriter = mock.MagicMock()
+        with mock.patch.dict('sys.modules', {'xlsxwriter': xlsxwriter}):
+            exports.write_xlsx(Ticket.objects.filter(name__startswith='='), io.BytesIO())
+        sheet = xlsxwriter.Workbook.return_value.add_worksheet.return_value
+        self.assertIn(mock.call(1, 4, '\'=HYPERLINK("http://example.com")'), sheet.write_string.call_args_list)
+        self.assertIn(mock.call(1, 17, "'@SUM(A1)"), sheet.write_string.call_args_list)
+    
+    def test_export_requires_admin(self):
+        """Test department users cannot export tickets"""
+        self.client.login(username='deptuser', password='testpass123')
+        response = self.client.get(reverse('tickets:export_tickets'))
+        self.assertNotEqual(response.status_code, 200)
+
+
+class StatisticsRollupTests(TestCase):
+    """Tests for the materialized daily statistics"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user',
+            department='hr'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+    
+    def create_ticket(self, **kwargs):
+        fields = {
+            'user': self.department_user,
+            'name': 'John',
+            'last_name': 'Doe',
+            'email': 'john@example.com',
+            'department': 'hr',
+            'nature_of_engagement': 'for_copy',
+        }
+        fields.update(kwargs)
+        ticket = Ticket(**fields)
+        with tracking_changes(ticket):
+            ticket.save()
+        return ticket
+    
+    def assertRollupsMatch(self):
+        for name, (rollup, source) in ROLLUPS.items():
+            self.assertEqual(differences(rollup, source), [], name)
+    
+    def test_ticket_changes_move_counts(self):
+        """Test creating, editing and deleting tickets keeps the rollup equal to the table"""
+        first = self.create_ticket()
+        second = self.create_ticket(department='finance', nature_of_engagement='for_review')
+        self.assertEqual(TicketDailyStats.objects.status_counts()['pending'], 2)
+        
+        first.status = 'in_progress'
+        with tracking_changes(first):
+            first.save()
+        second.department = 'it'
+        with tracking_changes(second, fields=['department']):
+            second.save(update_fields=['department'])
+        self.assertRollupsMatch()
+        self.assertEqual(TicketDailyStats.objects.status_counts()['in_progress'], 1)
+        
+        # Saving an uncounted field reads nothing back: just the UPDATE in a savepoint
+        first.priority = 'high'
+        with self.assertNumQueries(3):
+            with tracking_changes(first, fields=['priority']):
+                first.save(update_fields=['priority'])
+        # Ticket.save() alone never touches the rollup or the status history:
+        # the search document's message bodies and the UPDATE in a savepoint
+        first.status = 'pending'
+        with self.assertNumQueries(4):
+            first.save()
+        first.status = 'in_progress'
+        first.save()
+        self.assertEqual(first.status_events.count(), 2)
+        
+        apply_bulk_action([first.id, second.id], 'close', actor=self.admin_user)
+        self.assertRollupsMatch()
+        self.assertEqual(TicketDailyStats.objects.status_counts()['completed'], 2)
+        
+        first.delete()
+        self.assertRollupsMatch()
+        # Deleting the requester cascades to their tickets
+        self.department_user.delete()
+        self.assertRollupsMatch()
+        self.assertEqual(TicketDailyStats.objects.total(), 0)
+        self.assertEqual(UserDailyStats.objects.user_counts()['admin'], 1)
+    
+    def test_user_changes_move_counts(self):
+        """Test role changes and logins keep the user rollup in step"""
+        self.assertEqual(UserDailyStats.objects.user_counts(), {'total': 2, 'admin': 1, 'user': 1, 'superuser': 0})
+        self.department_user.role = 'admin'
+        self.department_user.save()
+        self.assertEqual(UserDailyStats.objects.user_counts()['admin'], 2)
+        
+        with self.assertNumQueries(1):
+            self.department_user.save(update_fields=['last_login'])
+        self.assertRollupsMatch()
+    
+    def test_check_stats_detects_and_repairs_drift(self):
+        """Test the command reports a drifted rollup and rebuilds it"""
+        self.create_ticket()
+        out = StringIO()
+        call_command('check_stats', stdout=out)
+        self.assertIn('Statistics rollups are consistent.', out.getvalue())
+        
+        # update() bypasses the write paths
+        Ticket.objects.update(status='completed')
+        with self.assertRaisesMessage(CommandError, 'Rollups out of date: tickets.'):
+            call_command('check_stats', stdout=StringIO())
+        
+        out = StringIO()
+        call_command('check_stats', '--repair', stdout=out)
+        self.assertIn('tickets: rebuilt rollup (1 rows).', out.getvalue())
+        self.assertRollupsMatch()
+        self.assertEqual(TicketDailyStats.objects.status_counts()['completed'], 1)
+
+
+class TicketReportTests(TestCase):
+    """Tests for the time-series ticket report"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        cache.clear()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        # Four whole weeks ago, so every reported bucket has ended
+        self.week = bucket_start(timezone.localdate(), 'week') - timedelta(weeks=4)
+        start = local_midnight(self.week) + timedelta(hours=1)
+        # (created, hours to close or None, status, department, type)
+        for created, hours, status, department, nature in [
+            (start - timedelta(days=7), None, 'pending', 'hr', 'for_copy'),
+            (start, 10, 'completed', 'hr', 'for_copy'),
+            (start, 20, 'completed', 'hr', 'for_copy'),
+            (start, 30, 'rejected', 'hr', 'for_copy'),
+            (start + timedelta(days=1), 168, 'completed', 'finance', 'for_review'),
+            (start + timedelta(days=8), None, 'pending', 'hr', 'for_copy'),
+        ]:
+            ticket = Ticket.objects.create(
+                user=self.department_user,
+                name='John',
+                last_name='Doe',
+                email='john@example.com',
+                department=department,
+                nature_of_engagement=nature,
+                status=status
+            )
+            updated = created + timedelta(hours=hours or 0)
+            Ticket.objects.filter(pk=ticket.pk).update(date_created=created, date_updated=updated)
+            TicketStatusEvent.objects.create(ticket=ticket, to_status='pending', created_at=created)
+            if hours:
+                TicketStatusEvent.objects.create(
+                    ticket=ticket, from_status='pending', to_status=status, created_at=updated
+                )
+    
+    def test_weekly_report(self):
+        """Test created, closed, backlog and turnaround per week"""
+        end = self.week + timedelta(days=20)
+        with self.assertNumQueries(5):
+            report = build_report('week', self.week, end)
+        
+        self.assertEqual(
+            [(row['start'], row['created'], row['closed'], row['backlog']) for row in report['buckets']],
+            [
+                (self.week.isoformat(), 4, 3, 2),
+                ((self.week + timedelta(weeks=1)).isoformat(), 1, 1, 2),
+                ((self.week + timedelta(weeks=2)).isoformat(), 0, 0, 2),
+            ]
+        )
+        self.assertEqual(report['buckets'][0]['turnaround'], [
+            {'department': 'hr', 'nature_of_engagement': 'for_copy', 'closed': 3, 'median_hours': 20.0, 'p90_hours': 30.0},
+        ])
+        self.assertEqual(report['buckets'][1]['turnaround'], [
+            {'department': 'finance', 'nature_of_engagement': 'for_review', 'closed': 1,
+             'median_hours': 168.0, 'p90_hours': 168.0},
+        ])
+        
+        # Finished buckets are served from the cache; only the backlog is recounted
+        with self.assertNumQueries(2):
+            self.assertEqual(build_report('week', self.week, end), report)
+        
+        # Editing a closed ticket later does not move its closing
+        Ticket.objects.filter(status='rejected').update(date_updated=timezone.now())
+        cache.clear()
+        self.assertEqual(build_report('week', self.week, end), report)
+        
+        filtered = build_report('week', self.week, end, filters={'department': 'finance'})
+        self.assertEqual([row['created'] for row in filtered['buckets']], [1, 0, 0])
+        self.assertEqual([row['backlog'] for row in filtered['buckets']], [1, 0, 0])
+    
+    def test_reopened_ticket(self):
+        """Test a reopened ticket is back in the backlog of cached buckets"""
+        end = self.week + timedelta(days=20)
+        build_report('week', self.week, end)
+        TicketStatusEvent.objects.create(
+            ticket=Ticket.objects.get(status='rejected'), from_status='rejected', to_status='in_progress',
+            created_at=local_midnight(self.week + timedelta(days=2)),
+        )
+        
+        # The later buckets come from the cache, but their backlog is worked out afresh
+        report = build_report('week', self.week + timedelta(weeks=1), end)
+        self.assertEqual([row['backlog'] for row in report['buckets']], [3, 3])
+        
+        cache.clear()
+        report = build_report('week', self.week, end)
+        self.assertEqual([row['reopened'] for row in report['buckets']], [1, 0, 0])
+        self.assertEqual([row['backlog'] for row in report['buckets']], [3, 3, 3])
+    
+    def test_backdated_writes_refresh_cached_buckets(self):
+        """Test imported tickets and backfilled events show up in buckets already cached"""
+        end = self.week + timedelta(days=20)
+        build_report('week', self.week, end)
+        moment = local_midnight(self.week) + timedelta(days=2)
+        
+        def legacy_ticket(status):
+            ticket = Ticket(
+                user=self.department_user, name='John', last_name='Doe', email='john@example.com',
+                department='hr', nature_of_engagement='for_copy', status=status,
+                date_created=moment, last_activity_at=moment,
+            )
+            Ticket.objects.bulk_create([ticket])
+            Ticket.objects.filter(pk=ticket.pk).update(date_updated=moment)
+            return ticket
+        
+        # As an import records its tickets
+        record_created([legacy_ticket('pending')])
+        report = build_report('week', self.week, end)
+        self.assertEqual([row['created'] for row in report['buckets']], [5, 1, 0])
+        
+        # As backfill_status_events seeds a closed ticket's history
+        legacy_ticket('completed')
+        call_command('backfill_status_events', stdout=StringIO())
+        report = build_report('week', self.week, end)
+        self.assertEqual([row['closed'] for row in report['buckets']], [4, 1, 0])
+        
+        # Tickets created today leave the cached buckets alone
+        generation = report_generation()
+        record_created([Ticket.objects.create(
+            user=self.department_user, name='John', last_name='Doe', email='john@example.com',
+            nature_of_engagement='for_copy',
+        )])
+        self.assertEqual(report_generation(), generation)
+    
+    def test_report_view(self):
+        """Test the report endpoint returns JSON to admins only"""
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('tickets:ticket_report'), {
+            'interval': 'month', 'start': self.week.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['interval'], 'month')
+        month = local_midnight(bucket_start(self.week, 'month'))
+        self.assertEqual(data['start'], bucket_start(self.week, 'month').isoformat())
+        self.assertEqual(
+            sum(row['created'] for row in data['buckets']), Ticket.objects.filter(date_created__gte=month).count()
+        )
+        self.assertEqual(data['buckets'][-1]['backlog'], 2)
+        
+        response = self.client.get(reverse('tickets:ticket_report'), {'interval': 'year'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('interval', response.json()['errors'])
+        
+        self.client.login(username='deptuser', password='testpass123')
+        response = self.client.get(reverse('tickets:ticket_report'))
+        self.assertRedirects(response, reverse('tickets:user_dashboard'), fetch_redirect_response=False)
+
+
+class TicketStatusEventTests(TestCase):
+    """Tests for the ticket status history"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.ticket = Ticket(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_copy'
+        )
+        with tracking_changes(self.ticket):
+            self.ticket.save()
+    
+    def test_changes_are_logged(self):
+        """Test creation and each status change append one event"""
+        self.ticket.status = 'in_progress'
+        with tracking_changes(self.ticket, changed_by=self.admin_user):
+            self.ticket.save()
+        # Saves that leave the status alone log nothing
+        self.ticket.priority = 'high'
+        with tracking_changes(self.ticket):
+            self.ticket.save()
+        apply_bulk_action([self.ticket.id], 'close', actor=self.admin_user)
+        
+        events = list(self.ticket.status_events.timeline())
+        self.assertEqual(
+            [(event.from_status, event.to_status, event.changed_by) for event in events],
+            [('', 'pending', self.department_user), ('pending', 'in_progress', self.admin_user),
+             ('in_progress', 'completed', self.admin_user)]
+        )
+        self.assertEqual(events[0].created_at, self.ticket.date_created)
+        self.assertEqual([event.ended_at for event in events], [events[1].created_at, events[2].created_at, None])
+        
+        now = timezone.now()
+        self.assertEqual(TicketStatusEvent.objects.between(now - timedelta(hours=1), now).transition_counts(), [
+            {'from_status': '', 'to_status': 'pending', 'count': 1},
+            {'from_status': 'in_progress', 'to_status': 'completed', 'count': 1},
+            {'from_status': 'pending', 'to_status': 'in_progress', 'count': 1},
+        ])
+        
+        with self.assertRaises(ValueError):
+            events[0].save()
+    
+    def test_actor_is_not_kept_between_saves(self):
+        """Test a later save is credited to its own actor, not the previous one"""
+        self.ticket.status = 'in_progress'
+        with tracking_changes(self.ticket, changed_by=self.admin_user):
+            self.ticket.save()
+        self.ticket.status = 'completed'
+        with tracking_changes(self.ticket):
+            self.ticket.save()
+        self.ticket.status = 'pending'
+        with tracking_changes(self.ticket, changed_by=self.department_user):
+            self.ticket.save()
+    
+        self.assertEqual(
+            [event.changed_by for event in self.ticket.status_events.timeline()][1:],
+            [self.admin_user, None, self.department_user]
+        )
+    
+    def test_admin_form_records_changes(self):
+        """Test the admin update form logs status changes and moves the rollup"""
+        self.client.login(username='admin', password='testpass123')
+        url = reverse('tickets:admin_ticket_detail', args=[self.ticket.id])
+        self.client.post(url, {'status': 'in_progress', 'priority': 'medium'})
+        event = self.ticket.status_events.timeline().last()
+        self.assertEqual((event.from_status, event.to_status, event.changed_by), ('pending', 'in_progress', self.admin_user))
+        self.assertEqual(TicketDailyStats.objects.status_counts()['in_progress'], 1)
+        
+        self.client.post(url, {'status': 'in_progress', 'priority': 'high'})
+        self.assertEqual(self.ticket.status_events.count(), 2)
+        self.assertEqual(differences(TicketDailyStats, Ticket), [])
+    
+    def test_timeline_uses_index(self):
+        """Test a ticket's timeline can be served by status_event_timeline_idx"""
+        plan = TicketStatusEvent.objects.filter(ticket=self.ticket).order_by('created_at', 'id').explain()
+        self.assertIn('status_event_timeline_idx', plan)
+    
+    def test_backfill_command(self):
+        """Test tickets without history get one seeded event, once"""
+        TicketStatusEvent.objects.all().delete()
+        Ticket.objects.filter(pk=self.ticket.pk).update(status='completed')
+        
+        out = StringIO()
+        call_command('backfill_status_events', '--batch-size', '1', stdout=out)
+        self.assertIn('Seeded status events for 1 ticket(s).', out.getvalue())
+        event = TicketStatusEvent.objects.get()
+        self.assertEqual((event.from_status, event.to_status), ('', 'completed'))
+        self.assertEqual(event.created_at, Ticket.objects.get(pk=self.ticket.pk).date_updated)
+        
+        call_command('backfill_status_events', stdout=out)
+        self.assertIn('Seeded status events for 0 ticket(s).', out.getvalue())
+        self.assertEqual(TicketStatusEvent.objects.count(), 1)
+
+
+class DashboardCacheTests(TestCase):
+    """Tests for the per-user dashboard cache"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        cache.clear()
+        reset_dashboard_cache_stats()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.ticket = self.create_ticket(self.department_user)
+        self.client.login(username='deptuser', password='testpass123')
+        self.client.get(reverse('tickets:user_dashboard'))
+    
+    def create_ticket(self, user):
+        return Ticket.objects.create(
+            user=user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_copy'
+        )
+    
+    def test_repeat_load_is_served_from_cache(self):
+        """Test an unchanged dashboard is rendered without queries"""
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('tickets:user_dashboard'))
+        self.assertEqual(response.context['total_tickets'], 1)
+        self.assertEqual(list(response.context['tickets']), [self.ticket])
+        self.assertEqual(dashboard_cache_stats(), {'enabled': True, 'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+        
+        # Other users' tickets leave the entry alone
+        self.create_ticket(self.admin_user)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('tickets:user_dashboard'))
+    
+    def test_ticket_changes_invalidate(self):
+        """Test saving or bulk-updating the user's tickets shows on the next load"""
+        self.ticket.status = 'in_progress'
+        self.ticket.save()
+        response = self.client.get(reverse('tickets:user_dashboard'))
+        self.assertEqual(response.context['pending_tickets'], 0)
+        
+        apply_bulk_action([self.ticket.id], 'close', actor=self.admin_user)
+        response = self.client.get(reverse('tickets:user_dashboard'))
+        self.assertEqual(response.context['completed_tickets'], 1)
+        self.assertEqual(dashboard_cache_stats()['hits'], 0)
+    
+    def test_workers_share_generations(self):
+        """Test a generation bumped by one worker process is seen by another"""
+        user_id = self.department_user.pk
+        cached_dashboard(user_id, 'page', lambda: {'total_tickets': 1})
+        # Another connection to the same shared cache, as another worker holds
+        with mock.patch.object(dashboard_cache, 'cache', caches.create_connection('default')):
+            self.assertEqual(cached_dashboard(user_id, 'page', lambda: {}), {'total_tickets': 1})
+            bump_tickets_generation([user_id])
+        self.assertEqual(cached_dashboard(user_id, 'page', lambda: {'total_tickets': 2}), {'total_tickets': 2})
+        self.assertEqual(dashboard_cache_stats(), {'enabled': True, 'hits': 1, 'misses': 3, 'hit_rate': 0.25})
+    
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'dashboard_test_cache',
+    }})
+    def test_database_cache_is_not_used(self):
+        """Test dashboards skip the database cache, where a lookup costs as much as the dashboard"""
+        call_command('createcachetable', verbosity=0)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('tickets:user_dashboard'))
+            self.ticket.status = 'in_progress'
+            self.ticket.save()
+        self.assertEqual(response.context['total_tickets'], 1)
+        dashboard_keys = ('tickets:dashboard:', 'tickets:generation:')
+        self.assertFalse([query for query in queries if any(key in query['sql'] for key in dashboard_keys)])
+        self.assertEqual(dashboard_cache_stats()['enabled'], False)
+    
+    def test_messages_and_reads_invalidate(self):
+        """Test new messages and reading them update the unread badges"""
+        TicketMessage.objects.create(ticket=self.ticket, sender=self.admin_user, message='Hi', is_admin_message=True)
+        response = self.client.get(reverse('tickets:user_dashboard'))
+        self.assertEqual(response.context['tickets'][0].unread_count, 1)
+        
+        self.client.get(reverse('tickets:user_ticket_conversation', args=[self.ticket.id]))
+        response = self.client.get(reverse('tickets:user_dashboard'))
+        self.assertEqual(response.context['tickets'][0].unread_count, 0)
+
+
+class ConditionalGetTests(TestCase):
+    """Tests for ETag/Last-Modified on the ticket detail pages"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        cache.clear()
+        
+        self.department_user = User.objects.create_user(
+            username='deptuser',
+            email='dept@example.com',
+            password='testpass123',
+            role='user'
+        )
+        
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        
+        self.ticket = Ticket.objects.create(
+            user=self.department_user,
+            name='John',
+            last_name='Doe',
+            email='john@example.com',
+            department='hr',
+            nature_of_engagement='for_copy'
+        )
+    
+    def test_unchanged_ticket_is_not_modified(self):
+        """Test a matching If-None-Match gets a 304 without rendering the page"""
+        self.client.login(username='deptuser', password='testpass123')
+        url = reverse('tickets:ticket_detail', args=[self.ticket.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+        self.assertEqual(response['ETag'], etag)
+        
+        # A new message changes the validator
+        TicketMessage.objects.create(ticket=self.ticket, sender=self.department_user, message='Any news?')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_admin_detail_validators(self):
+        """Test the admin page honours If-Modified-Since and changes with the ticket"""
+        self.client.login(username='admin', password='testpass123')
+        url = reverse('tickets:admin_ticket_detail', args=[self.ticket.id])
+        response = self.client.get(url)
+        etag = response['ETag']
+        
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        
+        self.ticket.status = 'in_progress'
+        self.ticket.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        
+        # Another user never gets the admin's validator
+        response = self.client.get(reverse('tickets:admin_ticket_detail', args=[self.ticket.id]))
+        self.client.login(username='deptuser', password='testpass123')
+        other = self.client.get(reverse('tickets:ticket_detail', args=[self.ticket.id]))
+        self.assertNotEqual(other['ETag'], response['ETag'])
+    
+    def test_pending_flash_messages_are_rendered(self):
+        """Test a page with waiting messages is rendered even if the client's copy matches"""
+        self.client.login(username='admin', password='testpass123')
+        url = reverse('tickets:admin_ticket_detail', args=[self.ticket.id])
+        # The first page sets the CSRF cookie the form is signed with
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        
+        # Queues "No document attached" without touching the ticket
+        response = self.client.get(reverse('tickets:download_document', args=[self.ticket.id]))
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'No document attached')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
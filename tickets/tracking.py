@@ -0,0 +1,74 @@
+"""
+Counted ticket changes.
+
+Creating a ticket, or changing a column the daily rollup counts it by
+(STATS_FIELDS), moves it between TicketDailyStats rows, and creating it or
+changing its status appends a TicketStatusEvent. Ticket.save() does
+neither, so saves that change nothing counted cost nothing extra. The write
+paths that do make such changes record them here, in the same transaction:
+``tracking_changes`` around a single save and ``record_created`` after a
+bulk insert. The bulk actions (tickets.bulk) record their own. Tickets
+dated before today, as imports create them, land in report buckets that may
+already be cached, so ``record_created`` starts a new report generation
+(tickets.reports) for them.
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import STATS_FIELDS, Ticket, TicketDailyStats, TicketStatusEvent
+from .reports import before_today, bump_report_generation
+from .stats import count_deltas
+
+# Columns that decide which rollup row a ticket is counted in
+COUNTED_FIELDS = {'date_created', *STATS_FIELDS}
+
+
+def record_created(tickets):
+    """Count newly inserted tickets and log their opening status."""
+    TicketStatusEvent.objects.bulk_create(
+        TicketStatusEvent(ticket=ticket, to_status=ticket.status, changed_by_id=ticket.user_id,
+                          created_at=ticket.date_created)
+        for ticket in tickets
+    )
+    TicketDailyStats.objects.apply_deltas(count_deltas(TicketDailyStats, tickets))
+    if before_today(ticket.date_created for ticket in tickets):
+        bump_report_generation()
+
+
+@contextmanager
+def tracking_changes(ticket, changed_by=None, fields=None):
+    """Record what saving ``ticket`` inside the block changes, crediting ``changed_by``.
+
+    ``fields`` names what the block may change; when none of them is counted,
+    nothing is read or recorded. Otherwise the stored row is read and locked
+    first, so the change is counted from what was actually stored.
+    """
+    if fields is not None and not COUNTED_FIELDS & set(fields):
+        yield
+        return
+
+    with transaction.atomic():
+        adding = ticket._state.adding
+        stored = None
+        if not adding:
+            stored = Ticket.objects.select_for_update().filter(pk=ticket.pk).only(*COUNTED_FIELDS).first()
+        yield
+        if adding:
+            record_created([ticket])
+            return
+        if stored is None:
+            return
+        old_key = TicketDailyStats.key_for(stored)
+        new_key = TicketDailyStats.key_for(ticket)
+        if new_key != old_key:
+            TicketDailyStats.objects.apply_deltas({old_key: -1, new_key: 1})
+        if stored.status != ticket.status:
+            TicketStatusEvent.objects.create(
+                ticket=ticket,
+                from_status=stored.status,
+                to_status=ticket.status,
+                changed_by=changed_by,
+                created_at=timezone.now(),
+            )
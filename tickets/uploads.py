@@ -0,0 +1,203 @@
+"""
+Chunked, resumable uploads.
+
+Large documents are sent as a series of short PUT requests instead of one
+multipart POST, so no worker is held for a whole slow upload and a dropped
+connection resumes from the last stored byte. Chunks are streamed straight
+to a temporary file in fixed-size reads, whatever their size. Once complete
+and matching the declared SHA-256, the upload is referenced by its id from
+the ticket or message form, which attaches it like a regular file.
+
+Protocol::
+
+    POST   /uploads/                 filename, size, sha256  -> 201 {id, offset, ...}
+    GET    /uploads/<id>/            -> {offset, ...}, to resume
+    PUT    /uploads/<id>/            chunk body, Content-Range: bytes <first>-<last>/<size>
+    POST   /uploads/<id>/complete/   -> {status: "complete"} once the checksum matches
+"""
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.files import File
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
+
+from .models import UploadSession
+
+# Bytes read from the request per iteration; bounds memory use per chunk
+READ_BLOCK_SIZE = 64 * 1024
+
+# Largest chunk accepted in one request
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def upload_dir():
+    return getattr(settings, 'TICKET_UPLOAD_TEMP_DIR', os.path.join(settings.MEDIA_ROOT, 'partial_uploads'))
+
+
+def upload_path(session):
+    return os.path.join(upload_dir(), str(session.pk))
+
+
+def max_upload_size():
+    return getattr(settings, 'TICKET_UPLOAD_MAX_SIZE', 100 * 1024 * 1024)
+
+
+def session_state(session):
+    return {
+        'id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.received,
+        'status': session.status,
+        'chunk_size': MAX_CHUNK_SIZE,
+        'url': reverse('tickets:upload_session', args=[session.pk]),
+    }
+
+
+def error(message, status=400, session=None):
+    data = {'error': message}
+    if session is not None:
+        data['offset'] = session.received
+    return JsonResponse(data, status=status)
+
+
+def write_chunk(session, stream, start, length):
+    """Copy ``length`` bytes from ``stream`` into the session's file at ``start``; return bytes written."""
+    with open(upload_path(session), 'r+b') as f:
+        f.seek(start)
+        remaining = length
+        while remaining:
+            block = stream.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            f.write(block)
+            remaining -= len(block)
+    return length - remaining
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def open_upload(session):
+    """The assembled file of a complete session, ready to assign to a FileField."""
+    return File(open(upload_path(session), 'rb'), name=session.filename)
+
+
+def discard_upload(session):
+    """Delete a session and its temporary file."""
+    try:
+        os.remove(upload_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def clear_expired_uploads(max_age=timedelta(days=1)):
+    """Discard sessions untouched for longer than ``max_age``; return how many."""
+    expired = UploadSession.objects.filter(updated_at__lt=timezone.now() - max_age)
+    count = 0
+    for session in expired.iterator(chunk_size=500):
+        discard_upload(session)
+        count += 1
+    return count
+
+
+@login_required
+@require_POST
+def create_upload(request):
+    """Start an upload session for a file of known size and checksum."""
+    filename = os.path.basename(request.POST.get('filename', '').strip())[:255]
+    sha256 = request.POST.get('sha256', '').lower()
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return error('size must be an integer.')
+    if not filename:
+        return error('filename is required.')
+    if not SHA256_RE.match(sha256):
+        return error('sha256 must be a hex SHA-256 digest.')
+    if size <= 0 or size > max_upload_size():
+        return error(f'size must be between 1 and {max_upload_size()} bytes.')
+
+    session = UploadSession.objects.create(user=request.user, filename=filename, size=size, sha256=sha256)
+    os.makedirs(upload_dir(), exist_ok=True)
+    with open(upload_path(session), 'wb'):
+        pass
+    return JsonResponse(session_state(session), status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def upload_session(request, upload_id):
+    """Report how much of an upload is stored (GET) or append the next chunk (PUT)."""
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method == 'GET':
+        return JsonResponse(session_state(session))
+
+    if session.status != 'open':
+        return error('The upload is already complete.', status=409, session=session)
+    match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+    if not match:
+        return error('A Content-Range header of the form "bytes first-last/size" is required.')
+    first, last, total = (int(value) for value in match.groups())
+    length = last - first + 1
+    if total != session.size or last >= session.size or length <= 0:
+        return error('Content-Range does not fit the upload.', status=416, session=session)
+    if length > MAX_CHUNK_SIZE:
+        return error(f'Chunks may be at most {MAX_CHUNK_SIZE} bytes.', status=413, session=session)
+    if first != session.received:
+        # Resend from the stored offset
+        return error('Chunk does not start at the current offset.', status=409, session=session)
+
+    written = write_chunk(session, request, first, length)
+    if written != length:
+        return error('The chunk was shorter than its Content-Range.', session=session)
+
+    # Only advance if no other request stored this range meanwhile
+    advanced = UploadSession.objects.filter(pk=session.pk, received=first, status='open').update(
+        received=first + length, updated_at=timezone.now(),
+    )
+    if not advanced:
+        session.refresh_from_db()
+        return error('Chunk does not start at the current offset.', status=409, session=session)
+    session.received = first + length
+    return JsonResponse(session_state(session))
+
+
+@login_required
+@require_POST
+def complete_upload(request, upload_id):
+    """Verify the assembled file against the declared checksum."""
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if session.status == 'complete':
+        return JsonResponse(session_state(session))
+    if session.received != session.size:
+        return error('The upload is incomplete.', status=409, session=session)
+
+    if file_checksum(upload_path(session)) != session.sha256:
+        # The stored bytes are unusable; start over
+        with open(upload_path(session), 'wb'):
+            pass
+        UploadSession.objects.filter(pk=session.pk).update(received=0, updated_at=timezone.now())
+        session.received = 0
+        return error('Checksum mismatch; the upload has been reset.', status=422, session=session)
+
+    session.status = 'complete'
+    session.save(update_fields=['status', 'updated_at'])
+    return JsonResponse(session_state(session))
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, streams, uploads
 
 app_name = 'tickets'
 
@@ -8,9 +8,22 @@ urlpatterns = [
     path('dashboard/', views.user_dashboard, name='user_dashboard'),
     path('create/', views.create_ticket, name='create_ticket'),
     path('ticket/<int:ticket_id>/', views.ticket_detail, name='ticket_detail'),
+    path('ticket/<int:ticket_id>/document/', views.user_download_document, name='user_download_document'),
+    path('ticket/<int:ticket_id>/reviewed-document/', views.user_download_reviewed_document, name='user_download_reviewed_document'),
     path('ticket/<int:ticket_id>/conversation/', views.user_ticket_conversation, name='user_ticket_conversation'),
+    path('ticket/<int:ticket_id>/events/', streams.ticket_events, name='ticket_events'),
+    path('ticket/<int:ticket_id>/messages/<int:message_id>/attachment/', views.download_message_attachment,
+         name='download_message_attachment'),
+    path('notifications/', views.notification_preferences, name='notification_preferences'),
+    # Chunked uploads (tickets.uploads)
+    path('uploads/', uploads.create_upload, name='create_upload'),
+    path('uploads/<uuid:upload_id>/', uploads.upload_session, name='upload_session'),
+    path('uploads/<uuid:upload_id>/complete/', uploads.complete_upload, name='complete_upload'),
     # Legal team admin routes
     path('legal/', views.admin_dashboard, name='admin_dashboard'),
+    path('legal/export/', views.export_tickets, name='export_tickets'),
+    path('legal/reports/', views.ticket_report, name='ticket_report'),
+    path('legal/bulk/', views.admin_bulk_update, name='admin_bulk_update'),
     path('legal/ticket/<int:ticket_id>/', views.admin_ticket_detail, name='admin_ticket_detail'),
     path('legal/ticket/<int:ticket_id>/conversation/', views.ticket_conversation, name='ticket_conversation'),
     path('legal/ticket/<int:ticket_id>/download/', views.download_document, name='download_document'),
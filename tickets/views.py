@@ -1,11 +1,37 @@
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Ticket, TicketMessage
-from .forms import TicketForm, TicketUpdateForm, TicketFilterForm, TicketMessageForm
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+from audit.log import diff, record, snapshot
+from audit.models import AuditEntry
+from .models import NotificationPreference, Ticket, TicketMessage
+from .forms import (
+    TicketForm, TicketUpdateForm, TicketFilterForm, TicketMessageForm, TicketBulkActionForm, NotificationPreferenceForm,
+    TicketReportForm,
+)
 from .decorators import user_required, admin_required
+from .pagination import KeysetPage, KeysetPaginator, base_querystring
+from .conversations import load_conversation, mark_conversation_read
+from .dashboard_cache import cached_dashboard
+from .conditional import add_validators, not_modified, page_vary, ticket_validators
+from .events import publish_message, publish_status
+from .notifications import notify_message, notify_status_change
+from .bulk import NOT_FOUND, UNCHANGED, UPDATED, BulkActionError, apply_bulk_action
+from .downloads import serve_document
+from .exports import FORMATS as EXPORT_FORMATS, ExportUnavailable, export_response
+from .reports import ReportError, build_report
+from .tracking import tracking_changes
+
+# Keyset orderings the dashboards can sort by (?sort=)
+DASHBOARD_ORDERINGS = {
+    '': ('-date_created', '-id'),
+    'activity': ('-last_activity_at', '-id'),
+}
+
+# Keyset ordering of ranked search results (PostgreSQL, see tickets.search)
+SEARCH_ORDERING = ('-rank', '-id')
 
 
 def home(request):
@@ -34,16 +60,33 @@ def user_dashboard(request):
     """Department user dashboard showing their tickets."""
     tickets = Ticket.objects.filter(user=request.user).order_by('-date_created')
     
-    # Pagination
-    paginator = Paginator(tickets, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    sort = request.GET.get('sort', '')
+    if sort not in DASHBOARD_ORDERINGS:
+        sort = ''
+    after, before = request.GET.get('after'), request.GET.get('before')
+    paginator = KeysetPaginator(tickets.with_unread_count(request.user), 10, ordering=DASHBOARD_ORDERINGS[sort])
+    
+    def load():
+        counts = tickets.status_counts()
+        # Keyset pagination (reuse the aggregate total instead of a second COUNT)
+        paginator.count = counts['total']
+        page = paginator.get_page(after=after, before=before)
+        return {'counts': counts, 'rows': page.object_list,
+                'has_next': page.has_next(), 'has_previous': page.has_previous()}
+    
+    # Served from the cache until one of the user's tickets changes (tickets.dashboard_cache)
+    data = cached_dashboard(request.user.pk, (sort, after, before), load)
+    counts = data['counts']
+    paginator.count = counts['total']
+    page_obj = KeysetPage(data['rows'], paginator, data['has_next'], data['has_previous'])
     
     context = {
         'tickets': page_obj,
-        'total_tickets': tickets.count(),
-        'pending_tickets': tickets.filter(status='pending').count(),
-        'completed_tickets': tickets.filter(status='completed').count(),
+        'sort': sort,
+        'page_query': base_querystring(request),
+        'total_tickets': counts['total'],
+        'pending_tickets': counts['pending'],
+        'completed_tickets': counts['completed'],
     }
     return render(request, 'tickets/user_dashboard.html', context)
 
@@ -67,8 +110,11 @@ def create_ticket(request):
             else:
                 # If user doesn't have department, set a default or show error
                 messages.error(request, 'Please update your profile with a department before creating tickets.')
+                form.close_uploads()
                 return render(request, 'tickets/create_ticket.html', {'form': form})
-            ticket.save()
+            with tracking_changes(ticket):
+                ticket.save()
+            form.discard_uploads()
             messages.success(request, 'Ticket created successfully!')
             return redirect('tickets:user_dashboard')
     else:
@@ -84,8 +130,45 @@ def create_ticket(request):
 @user_required
 def ticket_detail(request, ticket_id):
     """View ticket details for department users."""
+    ticket = get_object_or_404(Ticket.objects.with_latest_message_id(), id=ticket_id, user=request.user)
+    etag, last_modified = ticket_validators(ticket, *page_vary(request), weak=True)
+    return not_modified(request, etag, last_modified) or add_validators(
+        render(request, 'tickets/ticket_detail.html', {'ticket': ticket}), etag, last_modified
+    )
+
+
+@login_required
+@user_required
+def user_download_document(request, ticket_id):
+    """Download the document attached to one of the user's tickets."""
     ticket = get_object_or_404(Ticket, id=ticket_id, user=request.user)
-    return render(request, 'tickets/ticket_detail.html', {'ticket': ticket})
+    if ticket.document_attached:
+        return serve_document(request, ticket.document_attached, ticket.document_attached_sha256)
+    else:
+        messages.error(request, 'No document attached to this ticket.')
+        return redirect('tickets:ticket_detail', ticket_id=ticket_id)
+
+
+@login_required
+def download_message_attachment(request, ticket_id, message_id):
+    """Download a conversation attachment from a ticket the user can see."""
+    attachments = TicketMessage.objects.filter(id=message_id, ticket_id=ticket_id).exclude(attachment='')
+    if not request.user.is_legal_admin():
+        attachments = attachments.filter(ticket__user=request.user)
+    message = get_object_or_404(attachments)
+    return serve_document(request, message.attachment)
+
+
+@login_required
+@user_required
+def user_download_reviewed_document(request, ticket_id):
+    """Download the reviewed document of one of the user's tickets."""
+    ticket = get_object_or_404(Ticket, id=ticket_id, user=request.user)
+    if ticket.reviewed_document:
+        return serve_document(request, ticket.reviewed_document, ticket.reviewed_document_sha256)
+    else:
+        messages.error(request, 'No reviewed document available.')
+        return redirect('tickets:ticket_detail', ticket_id=ticket_id)
 
 
 @login_required
@@ -95,56 +178,122 @@ def admin_dashboard(request):
     tickets = Ticket.objects.all().order_by('-date_created')
     
     # Apply filters
+    sort = ''
     filter_form = TicketFilterForm(request.GET)
     if filter_form.is_valid():
-        status = filter_form.cleaned_data.get('status')
-        department = filter_form.cleaned_data.get('department')
-        company = filter_form.cleaned_data.get('company')
-        nature = filter_form.cleaned_data.get('nature_of_engagement')
-        search = filter_form.cleaned_data.get('search')
-        
-        if status:
-            tickets = tickets.filter(status=status)
-        if department:
-            tickets = tickets.filter(department=department)
-        if company:
-            tickets = tickets.filter(company=company)
-        if nature:
-            tickets = tickets.filter(nature_of_engagement=nature)
-        if search:
-            tickets = tickets.filter(
-                Q(id__icontains=search) | 
-                Q(name__icontains=search) | 
-                Q(last_name__icontains=search)
-            )
+        sort = filter_form.cleaned_data.get('sort')
+        tickets = filter_form.filter_queryset(tickets)
+    
+    counts = tickets.status_counts()
     
-    # Pagination
-    paginator = Paginator(tickets, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Ranked search results keep their relevance order unless another sort is chosen
+    ordering = DASHBOARD_ORDERINGS[sort]
+    if not sort and 'rank' in tickets.query.annotations:
+        ordering = SEARCH_ORDERING
+    
+    # Keyset pagination (reuse the aggregate total instead of a second COUNT)
+    paginator = KeysetPaginator(tickets.with_unread_count(request.user), 15, ordering=ordering)
+    paginator.count = counts['total']
+    page_obj = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
     
     context = {
         'tickets': page_obj,
         'filter_form': filter_form,
-        'total_tickets': tickets.count(),
-        'pending_tickets': tickets.filter(status='pending').count(),
-        'in_progress_tickets': tickets.filter(status='in_progress').count(),
-        'completed_tickets': tickets.filter(status='completed').count(),
-        'rejected_tickets': tickets.filter(status='rejected').count(),
+        'page_query': base_querystring(request),
+        'total_tickets': counts['total'],
+        'pending_tickets': counts['pending'],
+        'in_progress_tickets': counts['in_progress'],
+        'completed_tickets': counts['completed'],
+        'rejected_tickets': counts['rejected'],
+        'bulk_form': TicketBulkActionForm(),
     }
     return render(request, 'tickets/admin_dashboard.html', context)
 
 
+@login_required
+@admin_required
+def export_tickets(request):
+    """Stream the tickets matching the dashboard filters as CSV, NDJSON or XLSX."""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        messages.error(request, 'Unknown export format.')
+        return redirect('tickets:admin_dashboard')
+    
+    tickets = Ticket.objects.order_by('-date_created', '-id')
+    filter_form = TicketFilterForm(request.GET)
+    if filter_form.is_valid():
+        tickets = filter_form.filter_queryset(tickets)
+    
+    try:
+        return export_response(request, tickets, export_format)
+    except ExportUnavailable as e:
+        messages.error(request, str(e))
+        return redirect('tickets:admin_dashboard')
+
+
+@login_required
+@admin_required
+def ticket_report(request):
+    """Created/closed counts, backlog and turnaround per day, week or month, as JSON."""
+    form = TicketReportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        return JsonResponse(build_report(**form.report_options()))
+    except ReportError as e:
+        return JsonResponse({'errors': {'__all__': [str(e)]}}, status=400)
+
+
+@login_required
+@admin_required
+@require_POST
+def admin_bulk_update(request):
+    """Apply one action to the tickets selected on the admin dashboard."""
+    form = TicketBulkActionForm(request.POST)
+    if form.is_valid():
+        try:
+            results = apply_bulk_action(
+                request.POST.getlist('tickets'), form.cleaned_data['action'], form.action_value(), actor=request.user
+            )
+        except BulkActionError as e:
+            messages.error(request, str(e))
+        else:
+            outcomes = list(results.values())
+            summary = f"{outcomes.count(UPDATED)} ticket(s) updated, {outcomes.count(UNCHANGED)} already up to date"
+            if NOT_FOUND in outcomes:
+                summary += f", {outcomes.count(NOT_FOUND)} not found"
+            messages.success(request, summary + '.')
+    else:
+        messages.error(request, ' '.join(error for errors in form.errors.values() for error in errors))
+    
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('tickets:admin_dashboard')
+
+
 @login_required
 @admin_required
 def admin_ticket_detail(request, ticket_id):
     """Admin view for processing tickets."""
-    ticket = get_object_or_404(Ticket, id=ticket_id)
+    ticket = get_object_or_404(Ticket.objects.with_latest_message_id(), id=ticket_id)
+    etag, last_modified = ticket_validators(ticket, *page_vary(request), weak=True)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
     
     if request.method == 'POST':
-        form = TicketUpdateForm(request.POST, request.FILES, instance=ticket)
+        # Taken before the form writes the submitted values onto the ticket
+        before = snapshot(ticket)
+        form = TicketUpdateForm(request.POST, request.FILES, instance=ticket, user=request.user)
         if form.is_valid():
-            form.save()
+            with tracking_changes(ticket, changed_by=request.user, fields=form.changed_data):
+                ticket = form.save()
+            record(AuditEntry.UPDATE, ticket, diff(before, snapshot(ticket)))
+            form.discard_uploads()
+            if 'status' in form.changed_data:
+                publish_status(ticket)
+                notify_status_change(ticket, request.user)
             messages.success(request, 'Ticket updated successfully!')
             return redirect('tickets:admin_ticket_detail', ticket_id=ticket_id)
     else:
@@ -154,7 +303,10 @@ def admin_ticket_detail(request, ticket_id):
         'ticket': ticket,
         'form': form,
     }
-    return render(request, 'tickets/admin_ticket_detail.html', context)
+    response = render(request, 'tickets/admin_ticket_detail.html', context)
+    if request.method == 'GET':
+        add_validators(response, etag, last_modified)
+    return response
 
 
 @login_required
@@ -163,8 +315,7 @@ def download_document(request, ticket_id):
     """Download attached document."""
     ticket = get_object_or_404(Ticket, id=ticket_id)
     if ticket.document_attached:
-        from django.http import FileResponse
-        return FileResponse(ticket.document_attached, as_attachment=True)
+        return serve_document(request, ticket.document_attached, ticket.document_attached_sha256)
     else:
         messages.error(request, 'No document attached to this ticket.')
         return redirect('tickets:admin_ticket_detail', ticket_id=ticket_id)
@@ -176,8 +327,7 @@ def download_reviewed_document(request, ticket_id):
     """Download reviewed document."""
     ticket = get_object_or_404(Ticket, id=ticket_id)
     if ticket.reviewed_document:
-        from django.http import FileResponse
-        return FileResponse(ticket.reviewed_document, as_attachment=True)
+        return serve_document(request, ticket.reviewed_document, ticket.reviewed_document_sha256)
     else:
         messages.error(request, 'No reviewed document available.')
         return redirect('tickets:admin_ticket_detail', ticket_id=ticket_id)
@@ -188,28 +338,36 @@ def download_reviewed_document(request, ticket_id):
 @admin_required
 def ticket_conversation(request, ticket_id):
     """View and manage conversation thread for a ticket."""
-    ticket = get_object_or_404(Ticket, id=ticket_id)
-    conversation_messages = ticket.messages.all().order_by('created_at')
+    ticket = get_object_or_404(
+        Ticket.objects.select_related('assigned_to').with_read_cursor(request.user),
+        id=ticket_id
+    )
     
     if request.method == 'POST':
-        form = TicketMessageForm(request.POST, request.FILES)
+        form = TicketMessageForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             message = form.save(commit=False)
             message.ticket = ticket
             message.sender = request.user
             message.is_admin_message = True
             message.save()
+            form.discard_uploads()
+            publish_message(message)
+            notify_message(message)
             messages.success(request, 'Message sent successfully!')
             return redirect('tickets:ticket_conversation', ticket_id=ticket_id)
     else:
         form = TicketMessageForm()
     
-    # Mark messages as read
-    conversation_messages.filter(is_admin_message=False).update(is_read=True)
+    conversation = load_conversation(ticket, older_than=request.GET.get('older'))
+    
+    # Advance the read cursor (one upsert, skipped when nothing is new)
+    mark_conversation_read(ticket, request.user, conversation)
     
     context = {
         'ticket': ticket,
-        'conversation_messages': conversation_messages,
+        'conversation': conversation,
+        'conversation_messages': conversation.messages,
         'form': form,
     }
     return render(request, 'tickets/ticket_conversation.html', context)
@@ -219,28 +377,53 @@ def ticket_conversation(request, ticket_id):
 @user_required
 def user_ticket_conversation(request, ticket_id):
     """View conversation thread for department users."""
-    ticket = get_object_or_404(Ticket, id=ticket_id, user=request.user)
-    conversation_messages = ticket.messages.all().order_by('created_at')
+    ticket = get_object_or_404(
+        Ticket.objects.select_related('assigned_to').with_read_cursor(request.user),
+        id=ticket_id, user=request.user
+    )
     
     if request.method == 'POST':
-        form = TicketMessageForm(request.POST, request.FILES)
+        form = TicketMessageForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             message = form.save(commit=False)
             message.ticket = ticket
             message.sender = request.user
             message.is_admin_message = False
             message.save()
+            form.discard_uploads()
+            publish_message(message)
+            notify_message(message)
             messages.success(request, 'Message sent successfully!')
             return redirect('tickets:user_ticket_conversation', ticket_id=ticket_id)
     else:
         form = TicketMessageForm()
     
-    # Mark admin messages as read
-    conversation_messages.filter(is_admin_message=True).update(is_read=True)
+    conversation = load_conversation(ticket, older_than=request.GET.get('older'))
+    
+    # Advance the read cursor (one upsert, skipped when nothing is new)
+    mark_conversation_read(ticket, request.user, conversation)
     
     context = {
         'ticket': ticket,
-        'conversation_messages': conversation_messages,
+        'conversation': conversation,
+        'conversation_messages': conversation.messages,
         'form': form,
     }
-    return render(request, 'tickets/user_ticket_conversation.html', context)
\ No newline at end of file
+    return render(request, 'tickets/user_ticket_conversation.html', context)
+
+
+@login_required
+def notification_preferences(request):
+    """Let a user choose which ticket emails they get and how often."""
+    preference = NotificationPreference.objects.filter(user=request.user).first() or NotificationPreference(user=request.user)
+    
+    if request.method == 'POST':
+        form = NotificationPreferenceForm(request.POST, instance=preference)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Notification settings updated successfully!')
+            return redirect('tickets:notification_preferences')
+    else:
+        form = NotificationPreferenceForm(instance=preference)
+    
+    return render(request, 'tickets/notification_preferences.html', {'form': form})